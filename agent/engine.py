@@ -0,0 +1,82 @@
+"""
+Async engine: runs many agent tasks concurrently on one Chromium instance.
+
+Each task gets its own browser context (cookies, storage, tabs) and its own
+ToolState, so tasks are fully isolated while sharing a single browser process.
+Agents spend most of their time waiting on the model, so overlapping tasks
+gives close to linear throughput. Contexts come pre-warmed from a ContextPool
+seeded with the logged-in session snapshot.
+"""
+
+import asyncio
+from typing import Optional
+from playwright.async_api import async_playwright, Browser, Playwright
+from agent.supervisor import run_agent, RunStats
+from agent.tools import bind_page, register_selector_engines
+from agent.pool import ContextPool, ensure_storage_state
+from config import MAX_CONCURRENT_TASKS
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",  # Avoid detection
+]
+
+
+async def launch_browser(pw: Playwright, headless: bool = True, slow_mo: Optional[int] = None) -> Browser:
+    """Launch the shared Chromium instance that task contexts are created from."""
+    await register_selector_engines(pw)
+    return await pw.chromium.launch(headless=headless, slow_mo=slow_mo, args=LAUNCH_ARGS)
+
+
+async def start_pool(pw: Playwright, browser: Browser, size: int) -> ContextPool:
+    """Context pool seeded from the session snapshot (taken from the profile on first use)."""
+    storage_state = await ensure_storage_state(pw)
+    return await ContextPool(browser, size, storage_state).start()
+
+
+async def run_task(
+    pool: ContextPool,
+    task: str,
+    label: str = "",
+    stats: Optional[RunStats] = None,
+    interactive: bool = True,
+    template: Optional[str] = None,
+) -> str:
+    """Run one task in a fresh, isolated browser context taken from the pool."""
+    stats = stats if stats is not None else RunStats()
+    warm = await pool.acquire()
+    stats.pool_wait_s = warm.wait_s
+    stats.startup_saved_s = max(0.0, warm.startup_s - warm.wait_s)
+    try:
+        bind_page(warm.page, interactive=interactive, resources=warm.resources)
+        return await run_agent(task, label=label, stats=stats, template=template)
+    finally:
+        await pool.release(warm)
+
+
+async def run_tasks(
+    tasks: list[str],
+    concurrency: int = MAX_CONCURRENT_TASKS,
+    headless: bool = True,
+    slow_mo: Optional[int] = None,
+) -> list[str]:
+    """Run tasks concurrently (at most `concurrency` at a time). Results keep input order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with async_playwright() as pw:
+        browser = await launch_browser(pw, headless=headless, slow_mo=slow_mo)
+        pool = await start_pool(pw, browser, min(concurrency, len(tasks)) or 1)
+
+        async def worker(index: int, task: str) -> str:
+            async with semaphore:
+                return await run_task(pool, task, label=f"[task {index}] ")
+
+        try:
+            results = await asyncio.gather(
+                *(worker(i, task) for i, task in enumerate(tasks, 1)),
+                return_exceptions=True,
+            )
+        finally:
+            await pool.close()
+            await browser.close()
+
+    return [f"Error: {r}" if isinstance(r, BaseException) else r for r in results]
@@ -0,0 +1,143 @@
+"""
+Token-budgeted history compaction.
+
+History is measured in (estimated) tokens rather than messages: one page dump
+can cost as much as dozens of clicks. When the history goes over budget, old
+bulky tool results are replaced with short stubs first (screenshots, page
+dumps), and only then are whole old turns dropped. A turn is always an
+assistant tool_use message plus the user message with its tool_results, so
+pairs are never split.
+"""
+
+import json
+
+CHARS_PER_TOKEN = 4          # rough estimate, good enough for budgeting
+IMAGE_TOKENS = 1600          # ~ (width * height) / 750 for a 1400x700 screenshot
+STUB_MIN_CHARS = 1500        # tool results shorter than this are not worth stubbing
+LOW_WATER_RATIO = 0.75       # compact down to 75% of budget so it doesn't run every step
+
+
+def estimate_tokens(content) -> int:
+    """Estimate tokens of a message content (str, block list or single block)."""
+    if content is None:
+        return 0
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN + 1
+    if isinstance(content, list):
+        return sum(estimate_tokens(block) for block in content)
+    if isinstance(content, dict):
+        block_type = content.get("type")
+        if block_type == "image":
+            return IMAGE_TOKENS
+        if block_type == "text":
+            return estimate_tokens(content.get("text"))
+        if block_type == "tool_result":
+            return estimate_tokens(content.get("content")) + 10
+        if block_type == "tool_use":
+            return estimate_tokens(json.dumps(content.get("input", {}), ensure_ascii=False)) + 10
+        return estimate_tokens(json.dumps(content, ensure_ascii=False))
+    return estimate_tokens(str(content))
+
+
+def history_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+TRIM_NOTE = "[Earlier steps were removed from the history to save tokens]"
+
+
+def _tool_names_by_id(messages: list) -> dict:
+    """tool_use_id -> tool name for every tool_use in the history."""
+    names = {}
+    for message in messages:
+        if message["role"] != "assistant" or isinstance(message["content"], str):
+            continue
+        for block in message["content"]:
+            if block.get("type") == "tool_use":
+                names[block["id"]] = block["name"]
+    return names
+
+
+def _summarize(text: str) -> str:
+    """Keep the identifying head of a page dump (URL/TITLE lines), drop the rest."""
+    keep = [line for line in text.splitlines() if line.startswith(("URL:", "TITLE:"))]
+    return " | ".join(keep[:2]) if keep else text[:150].replace("\n", " ")
+
+
+def _stub_result(block: dict, names: dict) -> dict:
+    """Return a compacted copy of a tool_result block, or the block itself if small."""
+    name = names.get(block.get("tool_use_id"), "tool")
+    content = block.get("content")
+
+    if isinstance(content, list):
+        if not any(part.get("type") == "image" for part in content):
+            return block
+        stub = "[old screenshot removed to save tokens]"
+    elif isinstance(content, str) and len(content) >= STUB_MIN_CHARS:
+        stub = f"[old {name} result compacted ({len(content)} chars): {_summarize(content)}]"
+    else:
+        return block
+
+    return {**block, "content": stub}
+
+
+def compact_history(messages: list, budget: int, keep_recent: int = 6) -> tuple[list, str]:
+    """
+    Bring the history under `budget` tokens.
+
+    messages[0] (the task) and the last `keep_recent` messages are never
+    touched. Returns the (possibly new) message list and a short report,
+    empty if nothing had to be done.
+    """
+    before = history_tokens(messages)
+    if before <= budget:
+        return messages, ""
+
+    target = int(budget * LOW_WATER_RATIO)
+    names = _tool_names_by_id(messages)
+    messages = list(messages)
+    total = before
+    stubbed = 0
+
+    # 1. Stub old screenshots and page dumps, oldest first
+    recent_start = max(1, len(messages) - keep_recent)
+    for i in range(1, recent_start):
+        if total <= target:
+            break
+        message = messages[i]
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        new_content = [
+            _stub_result(block, names) if block.get("type") == "tool_result" else block
+            for block in message["content"]
+        ]
+        changed = sum(new is not old for new, old in zip(new_content, message["content"]))
+        if changed:
+            stubbed += changed
+            total -= estimate_tokens(message["content"]) - estimate_tokens(new_content)
+            messages[i] = {**message, "content": new_content}
+
+    # 2. Drop whole old turns (assistant tool_use + user tool_result), oldest first
+    dropped = 0
+    while total > target and len(messages) - 2 >= 1 + keep_recent:
+        if messages[1]["role"] != "assistant" or messages[2]["role"] != "user":
+            break
+        total -= history_tokens(messages[1:3])
+        del messages[1:3]
+        dropped += 1
+
+    if dropped:
+        # Tell the model why the history has a gap (once)
+        first = messages[0]
+        content = first["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        if not any(block.get("text") == TRIM_NOTE for block in content):
+            messages[0] = {**first, "content": content + [{"type": "text", "text": TRIM_NOTE}]}
+
+    report = f"Compacted history: ~{before} -> ~{history_tokens(messages)} tokens"
+    if stubbed:
+        report += f", {stubbed} old results stubbed"
+    if dropped:
+        report += f", {dropped} old steps dropped"
+    return messages, report
@@ -0,0 +1,239 @@
+"""
+Pluggable Anthropic client with record/replay cassettes.
+
+  live   - plain AsyncAnthropic (needs ANTHROPIC_API_KEY)
+  record - live client that appends every request/response pair to a cassette
+  replay - serves responses from a cassette, no network and no key needed
+
+A cassette is JSONL, one {"key", "loose_key", "request", "response"} per model
+request. Replay looks a request up by its key, a hash of the normalized
+request. Re-running a trajectory with faster browser code changes tool results
+(timings, snapshot formatting), so when the exact key misses, replay falls
+back to the loose key: the request without tool results, i.e. the task plus
+the model's own turns so far. That still pins the position in the trajectory.
+
+Cassettes never hold secrets: text the model sends to password, one-time-code
+or card fields is redacted in its tool calls, and everything typed into such
+fields is redacted wherever it reappears (history, "Typed '...'" results).
+Replaying such a run types the redaction marker, so logins need a live model.
+
+The client is created on first use, so importing the agent never needs a key.
+stream_message() streams from clients that support it (live, record) and falls
+back to a single create() for the rest (replay, scripted stand-ins).
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from anthropic import AsyncAnthropic
+from anthropic.types import Message
+from agent.tools import current_state, redact_secret_inputs, redact_secrets
+from config import ANTHROPIC_API_KEY, LLM_MODE, CASSETTE_PATH
+
+# Timings and counters inside tool results vary run to run
+VOLATILE_NUMBERS = re.compile(r"\d+(?:\.\d+)?")
+
+
+class CassetteMiss(LookupError):
+    """Replay got a request the cassette has no response for."""
+
+
+def _normalize(value, in_tool_result: bool = False):
+    """
+    Request without cache breakpoints (they move every step) and with numbers
+    masked inside tool results. The task and the model's tool inputs keep
+    theirs: "open order 1234" and "open order 5678" are different requests.
+    """
+    if isinstance(value, dict):
+        in_tool_result = in_tool_result or value.get("type") == "tool_result"
+        return {k: _normalize(v, in_tool_result) for k, v in value.items() if k != "cache_control"}
+    if isinstance(value, list):
+        return [_normalize(v, in_tool_result) for v in value]
+    if isinstance(value, str) and in_tool_result:
+        return VOLATILE_NUMBERS.sub("#", value)
+    return value
+
+
+def _strip_tool_results(messages: list) -> list:
+    stripped = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            content = [block for block in content if block.get("type") != "tool_result"]
+        stripped.append({"role": message["role"], "content": content})
+    return stripped
+
+
+def _digest(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:24]
+
+
+def request_keys(request: dict) -> tuple[str, str]:
+    """(exact key, loose key) of a messages.create request."""
+    base = {key: request.get(key) for key in ("model", "system", "tools", "max_tokens", "temperature")}
+    exact = _digest(_normalize({**base, "messages": request["messages"]}))
+    loose = _digest(_normalize({**base, "messages": _strip_tool_results(request["messages"])}))
+    return exact, loose
+
+
+class _Messages:
+    def __init__(self, create, stream=None):
+        self.create = create
+        if stream is not None:
+            self.stream = stream
+
+
+class RecordingClient:
+    """Live client that appends each request/response pair to a cassette, secrets redacted."""
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.path = path
+        self.redacted_inputs = {}  # tool_use id -> input as recorded, so later requests match replay
+        self.messages = _Messages(self._create, self._stream)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    async def _create(self, **request):
+        response = await self.inner.messages.create(**request)
+        await self._record(request, response)
+        return response
+
+    @asynccontextmanager
+    async def _stream(self, **request):
+        async with self.inner.messages.stream(**request) as stream:
+            yield stream
+            response = await stream.get_final_message()
+        await self._record(request, response)
+
+    async def _redact(self, request: dict, response: dict) -> tuple[dict, dict]:
+        """Request and response with secret field input redacted (see the module docstring)."""
+        try:
+            state = current_state()
+        except LookupError:  # no task bound (a bare client): nothing was typed
+            return request, response
+        for block in response["content"]:
+            if block["type"] == "tool_use":
+                # Decided on the page the model saw; the tool hasn't typed anything yet
+                block["input"] = await redact_secret_inputs(state.page, block["input"])
+                self.redacted_inputs[block["id"]] = block["input"]
+        messages = []
+        for message in request["messages"]:
+            content = message["content"]
+            if message["role"] == "assistant" and isinstance(content, list):
+                content = [
+                    {**block, "input": self.redacted_inputs.get(block.get("id"), block.get("input"))}
+                    if block.get("type") == "tool_use" else block
+                    for block in content
+                ]
+            messages.append({**message, "content": content})
+        request = {**request, "messages": messages}
+        return redact_secrets(request, state.secrets), redact_secrets(response, state.secrets)
+
+    async def _record(self, request: dict, response) -> None:
+        request = {k: v for k, v in request.items() if k != "extra_headers"}
+        request, response_data = await self._redact(request, response.model_dump(mode="json"))
+        exact, loose = request_keys(request)
+        record = {
+            "key": exact,
+            "loose_key": loose,
+            "request": request,
+            "response": response_data,
+        }
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class ReplayClient:
+    """Serves recorded responses; identical requests get their responses in recorded order."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exact = defaultdict(deque)
+        self.loose = defaultdict(deque)
+        self.stats = {"exact": 0, "loose": 0}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.exact[record["key"]].append(record)
+                    self.loose[record["loose_key"]].append(record)
+        self.messages = _Messages(self._create)
+
+    def _take(self, index: dict, key: str, other: dict, other_key: str) -> Optional[dict]:
+        if not index[key]:
+            return None
+        record = index[key].popleft()
+        try:
+            other[record[other_key]].remove(record)  # served once, whichever index found it
+        except ValueError:
+            pass
+        return record
+
+    async def _create(self, **request):
+        exact, loose = request_keys(request)
+        record = self._take(self.exact, exact, self.loose, "loose_key")
+        if record is not None:
+            self.stats["exact"] += 1
+        else:
+            record = self._take(self.loose, loose, self.exact, "key")
+            if record is None:
+                raise CassetteMiss(f"no recorded response for request {exact} (loose {loose}) in {self.path}")
+            self.stats["loose"] += 1
+        return Message.model_validate(record["response"])
+
+    def summary(self) -> str:
+        return f"cassette replay: {self.stats['exact']} exact, {self.stats['loose']} loose matches"
+
+
+async def stream_message(client, request: dict, on_text: Callable[[str], None], on_block: Callable) -> Message:
+    """
+    Send one request, calling on_text(delta) as text arrives and on_block(block)
+    as soon as each content block is complete; returns the final message.
+    """
+    if not hasattr(client.messages, "stream"):
+        response = await client.messages.create(**request)
+        for block in response.content:
+            if block.type == "text":
+                on_text(block.text)
+            on_block(block)
+        return response
+
+    async with client.messages.stream(**request) as stream:
+        async for event in stream:
+            if event.type == "text":
+                on_text(event.text)
+            elif event.type == "content_block_stop":
+                on_block(event.content_block)
+        return await stream.get_final_message()
+
+
+_client = None
+
+
+def create_client(mode: str = LLM_MODE, cassette: str = CASSETTE_PATH):
+    if mode == "replay":
+        return ReplayClient(cassette)
+    if not ANTHROPIC_API_KEY:
+        raise ValueError("ANTHROPIC_API_KEY environment variable is required (or replay a cassette: AGENT_LLM_MODE=replay)")
+    live = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    if mode == "record":
+        return RecordingClient(live, cassette)
+    return live
+
+
+def get_client():
+    """The client run_agent talks to, created from config on first use."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def set_client(client) -> None:
+    """Plug in a client (a cassette client, a scripted stand-in, ...) for all later requests."""
+    global _client
+    _client = client
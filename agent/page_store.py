@@ -0,0 +1,142 @@
+"""
+Per-tab store of the last full page extraction.
+
+get_page_content keeps everything it extracted here, split into sections
+under the page's headings, and only returns what fits its token budget plus an
+outline of section IDs. search_page and get_page_section then read the rest
+from memory: no DOM walk, no re-scrolling, and only the needed part goes to the
+model. Refs in stored lines stay valid until the page navigates, as usual.
+
+The outline uses the deepest heading level (h1-h3) that keeps it within
+OUTLINE_MAX_SECTIONS; items under deeper headings belong to the enclosing
+section. Pages whose every card has its own <h3> still get a short outline.
+When even the shallowest heading level on the page has more sections than
+that, it is used anyway and outline() lists the first OUTLINE_MAX_SECTIONS.
+"""
+
+from collections import defaultdict
+from typing import Optional
+from agent.history import estimate_tokens
+from agent.relevance import tokenize, bm25_scores
+
+OUTLINE_MAX_SECTIONS = 40
+OUTLINE_TITLE_CHARS = 60
+OUTLINE_PREVIEW_CHARS = 60
+ITEM_KINDS = (("interactive", "controls"), ("blocks", "blocks"), ("text", "text"))
+
+
+def _display(kind: str, line: str) -> str:
+    return f"• {line}" if kind == "blocks" else line
+
+
+class PageSection:
+    def __init__(self, section_id: str, title: str):
+        self.id = section_id
+        self.title = title
+        self.items = []  # (kind, line) in document order
+
+    def describe(self) -> str:
+        counts = defaultdict(int)
+        for kind, _ in self.items:
+            counts[kind] += 1
+        kinds = ", ".join(f"{counts[kind]} {label}" for kind, label in ITEM_KINDS if counts[kind])
+        preview = self.items[0][1][:OUTLINE_PREVIEW_CHARS] if self.items else ""
+        return f"[{self.id}] {self.title[:OUTLINE_TITLE_CHARS]} - {len(self.items)} items ({kinds}): {preview}"
+
+
+class PageStore:
+    """Everything one get_page_content call extracted from a tab, by page section."""
+
+    def __init__(self, snapshot: dict, step: int):
+        self.url = snapshot["url"]
+        self.title = snapshot["title"]
+        self.step = step
+        titles = snapshot.get("sections") or [[0, "(top of page)"]]
+        places = snapshot.get("places") or {}
+        self.truncated = snapshot.get("truncated") or {}  # kind -> extraction cap it hit
+
+        # Pick the outline level, then map every heading to its enclosing outline section.
+        # Entry 0 is the text before the first heading, not a heading: it doesn't count.
+        levels = sorted({heading_level for heading_level, _ in titles[1:] if 1 <= heading_level <= 3})
+        level = levels[0] if levels else 1
+        for candidate in reversed(levels):
+            if sum(1 for heading_level, _ in titles[1:] if heading_level <= candidate) <= OUTLINE_MAX_SECTIONS:
+                level = candidate
+                break
+        parent, owner = 0, []
+        for index, (heading_level, _) in enumerate(titles):
+            if heading_level <= level:
+                parent = index
+            owner.append(parent)
+
+        placed = defaultdict(list)  # outline section -> [(document order, kind, line)]
+        for kind, _ in ITEM_KINDS:
+            lines = snapshot.get(kind) or []
+            kind_places = places.get(kind) or [[0, i] for i in range(len(lines))]
+            for line, (section_index, position) in zip(lines, kind_places):
+                placed[owner[section_index]].append((position, kind, line))
+
+        self.sections = {}
+        for number, section_index in enumerate(sorted(placed), 1):
+            section = PageSection(f"s{number}", titles[section_index][1])
+            section.items = [(kind, line) for _, kind, line in sorted(placed[section_index])]
+            self.sections[section.id] = section
+
+    @property
+    def item_count(self) -> int:
+        return sum(len(section.items) for section in self.sections.values())
+
+    def truncation_note(self) -> str:
+        """Says which kinds of items the extraction cap cut off, "" if none."""
+        caps = ", ".join(f"{self.truncated[kind]} {label}" for kind, label in ITEM_KINDS if kind in self.truncated)
+        if not caps:
+            return ""
+        return (f"\n(extraction truncated at {caps}: items further down the page were not stored - "
+                f"use find_element for them)")
+
+    def outline(self, max_sections: int = OUTLINE_MAX_SECTIONS, budget_tokens: Optional[int] = None) -> str:
+        """One line per section, at most max_sections lines and (if given) about budget_tokens."""
+        sections = list(self.sections.values())
+        lines, left = [], budget_tokens
+        for section in sections[:max_sections]:
+            line = section.describe()
+            if left is not None:
+                left -= estimate_tokens(line) + 1
+                if left < 0 and lines:
+                    break
+            lines.append(line)
+        if len(sections) > len(lines):
+            lines.append(f"... {len(sections) - len(lines)} more sections (search_page finds items in any of them)")
+        return "\n".join(lines)
+
+    def read_section(self, section_id: str, offset: int, budget_tokens: int) -> str:
+        section = self.sections.get(section_id)
+        if section is None:
+            return f"Error: no section '{section_id}' on this page (sections: {', '.join(self.sections) or 'none'})"
+        if not 0 <= offset < max(1, len(section.items)):
+            return f"Error: offset {offset} is out of range, section {section_id} has {len(section.items)} items"
+
+        lines, end, left = [], offset, budget_tokens
+        for kind, line in section.items[offset:]:
+            cost = estimate_tokens(line) + 1
+            if cost > left and lines:
+                break
+            lines.append(_display(kind, line))
+            left -= cost
+            end += 1
+        header = f"SECTION [{section.id}] {section.title} - items {offset}-{end - 1} of {len(section.items)}"
+        if end < len(section.items):
+            lines.append(f"--- more: get_page_section(\"{section.id}\", offset={end})")
+        return header + "\n" + "\n".join(lines)
+
+    def search(self, query: str) -> list[tuple[str, int, str]]:
+        """Items matching `query`, best first, as (section id, index in section, display line)."""
+        terms = {term: 1.0 for term in tokenize(query)}
+        entries = [
+            (section.id, index, _display(kind, line))
+            for section in self.sections.values()
+            for index, (kind, line) in enumerate(section.items)
+        ]
+        scores = bm25_scores([line for _, _, line in entries], terms)
+        ranked = sorted((-score, order) for order, score in enumerate(scores) if score > 0)
+        return [entries[order] for _, order in ranked]
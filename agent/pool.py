@@ -0,0 +1,174 @@
+"""
+Warm browser context pool.
+
+Creating a context, installing the resource policy and loading START_URL takes
+a second or more per task. The pool does that ahead of time: it keeps `size`
+contexts warm, each seeded from a storage-state snapshot of the logged-in
+profile (see save_storage_state), and hands them
+out to tasks. A replacement starts warming as soon as one is handed out; used
+contexts are closed rather than reset, so no state leaks between tasks.
+
+Unlike the persistent profile in .browser_session/, a snapshot can seed any
+number of contexts in any number of processes at once.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+from playwright.async_api import Browser, BrowserContext, Page, Playwright
+from agent.resources import ResourcePolicy
+from config import (
+    BROWSER_WIDTH, BROWSER_HEIGHT, START_URL, RESOURCE_BLOCKING, USER_DATA_DIR, STORAGE_STATE_PATH,
+)
+
+
+def save_storage_state(state: dict, path: str = STORAGE_STATE_PATH) -> str:
+    """
+    Merge a context's storage state into the snapshot at `path`.
+
+    storage_state() returns every cookie of the profile, but localStorage only
+    for origins that have a page open. Overwriting the snapshot with it would
+    drop the localStorage of every site not open at that moment, so cookies are
+    merged by (name, domain, path) and localStorage by origin, the new state
+    winning. Expired cookies are dropped.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+
+    now = time.time()
+    cookies = {}
+    for cookie in saved.get("cookies", []) + state.get("cookies", []):
+        if 0 <= cookie.get("expires", -1) < now:
+            continue
+        cookies[(cookie["name"], cookie["domain"], cookie["path"])] = cookie
+    origins = {entry["origin"]: entry for entry in saved.get("origins", []) + state.get("origins", [])}
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"cookies": list(cookies.values()), "origins": list(origins.values())}, f, ensure_ascii=False, indent=2)
+    return path
+
+
+async def snapshot_storage_state(pw: Playwright, path: str = STORAGE_STATE_PATH) -> Optional[str]:
+    """
+    Merge the persistent profile's cookies into the snapshot at `path`.
+
+    Cookies only: the profile is opened without pages, so no localStorage comes
+    with it; that is saved by main.py and login_helper.py while their pages are
+    open. Opens the profile headless, so it fails while either of them has it
+    open; returns None then (or when there is no profile yet).
+    """
+    if not os.path.isdir(USER_DATA_DIR):
+        return None
+    try:
+        context = await pw.chromium.launch_persistent_context(user_data_dir=USER_DATA_DIR, headless=True)
+    except Exception:
+        return None
+    try:
+        return save_storage_state(await context.storage_state(), path)
+    finally:
+        await context.close()
+
+
+async def ensure_storage_state(pw: Playwright) -> Optional[str]:
+    """The snapshot to seed pool contexts from, taking one from the profile if there is none yet."""
+    if os.path.exists(STORAGE_STATE_PATH):
+        return STORAGE_STATE_PATH
+    return await snapshot_storage_state(pw)
+
+
+class PooledContext:
+    """A warm context with its first page already on START_URL."""
+
+    def __init__(self, context: BrowserContext, page: Page, resources: Optional[ResourcePolicy], startup_s: float):
+        self.context = context
+        self.page = page
+        self.resources = resources
+        self.startup_s = startup_s  # what preparing it took, i.e. what a cold start would cost
+        self.wait_s = 0.0           # how long the task waited for it
+
+
+class ContextPool:
+    """Keeps `size` browser contexts warm and hands them out to tasks."""
+
+    def __init__(self, browser: Browser, size: int, storage_state: Optional[str] = None):
+        self.browser = browser
+        self.size = size
+        self.storage_state = storage_state
+        self.ready: asyncio.Queue = asyncio.Queue()
+        self.warming: set[asyncio.Task] = set()
+        self.closed = False
+        self.stats = {"acquired": 0, "warm": 0, "wait_s": 0.0, "startup_saved_s": 0.0}
+
+    async def start(self) -> "ContextPool":
+        for _ in range(self.size):
+            self._spawn()
+        return self
+
+    def _spawn(self) -> None:
+        task = asyncio.create_task(self._warm())
+        self.warming.add(task)
+        task.add_done_callback(self.warming.discard)
+
+    async def _warm(self) -> None:
+        started = time.monotonic()
+        try:
+            context = await self.browser.new_context(
+                viewport={"width": BROWSER_WIDTH, "height": BROWSER_HEIGHT},
+                storage_state=self.storage_state,
+            )
+            resources = await ResourcePolicy.install(context) if RESOURCE_BLOCKING else None
+            page = await context.new_page()
+            if resources:
+                await resources.attach(page)
+        except Exception as e:
+            await self.ready.put(e)  # surfaces in acquire() instead of hanging it
+            return
+        try:
+            await page.goto(START_URL, wait_until="domcontentloaded")
+        except Exception:
+            pass  # the agent can still navigate from about:blank
+        await self.ready.put(PooledContext(context, page, resources, time.monotonic() - started))
+
+    async def acquire(self) -> PooledContext:
+        """Take a warm context (waiting for one if all are in use) and start warming its replacement."""
+        started = time.monotonic()
+        warm = not self.ready.empty()
+        item = await self.ready.get()
+        if not self.closed:
+            self._spawn()
+        if isinstance(item, Exception):
+            raise item
+
+        item.wait_s = time.monotonic() - started
+        self.stats["acquired"] += 1
+        self.stats["warm"] += warm
+        self.stats["wait_s"] += item.wait_s
+        self.stats["startup_saved_s"] += max(0.0, item.startup_s - item.wait_s)
+        return item
+
+    async def release(self, item: PooledContext) -> None:
+        """Recycle a used context: close it (its replacement is already warming)."""
+        try:
+            await item.context.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        self.closed = True
+        for task in list(self.warming):
+            task.cancel()
+        await asyncio.gather(*self.warming, return_exceptions=True)
+        while not self.ready.empty():
+            item = self.ready.get_nowait()
+            if isinstance(item, PooledContext):
+                await self.release(item)
+
+    def summary(self) -> str:
+        acquired = self.stats["acquired"]
+        return (f"context pool: {acquired} handed out, {self.stats['warm']} already warm, "
+                f"waited {self.stats['wait_s']:.1f}s total, startup saved ~{self.stats['startup_saved_s']:.1f}s")
@@ -0,0 +1,135 @@
+"""
+Query-aware ranking of page content within a token budget.
+
+A page snapshot often holds far more than one tool result can carry. Instead
+of keeping its head, get_page_content scores every item (heading, control,
+content block, text) against the task and the arguments of the latest tool
+calls, and keeps the best-scoring items that fit PAGE_CONTENT_TOKEN_BUDGET.
+Kept items stay in page order; the result says how much was left out.
+
+Scoring is BM25 over the snapshot's items, with crude prefix stemming so that
+"вакансии"/"вакансия" or "orders"/"order" meet, plus a small prior by section
+and position: with no matching words the ranking degrades to "top of page
+first", like the old truncation, but spread across sections.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Iterable
+from agent.history import estimate_tokens
+
+K1, B = 1.2, 0.75
+STEM_LENGTH = 6  # longer words are cut to this prefix
+SECTION_PRIOR = 0.6  # prior of the first section's first item; later sections/items get less
+FORM_CONTROL_BONUS = 0.5  # inputs are what the agent acts on, keep them over plain links
+RECENT_INPUT_WEIGHT = 2.0  # terms of the latest tool call; older calls fade by RECENT_INPUT_DECAY
+RECENT_INPUT_DECAY = 0.7
+
+TOKEN = re.compile(r"[^\W_]+")
+FORM_CONTROL = re.compile(r"<(?:input|textarea|select)\b")
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "into", "onto", "then", "than", "all", "any", "are",
+    "was", "were", "you", "your", "its", "our", "out", "not", "but", "can", "find", "open", "show", "get",
+    "http", "https", "www", "com", "org", "net", "html", "ru",
+    "и", "в", "во", "на", "по", "с", "со", "к", "ко", "из", "за", "от", "до", "для", "не", "что", "это",
+    "как", "или", "а", "но", "мне", "все", "его", "её", "их", "там", "тут", "найди", "открой", "покажи",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, stemmed word tokens; refs (e42) and stopwords dropped."""
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if token.isdigit():
+            tokens.append(token)
+        elif len(token) >= 2 and not (token[0] == "e" and token[1:].isdigit()):  # e42 is a ref
+            tokens.append(token[:STEM_LENGTH])
+    return tokens
+
+
+def _strings(value) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def query_terms(task: str, recent_inputs: Iterable[dict]) -> dict[str, float]:
+    """Term weights from the task text and recent tool inputs (newest last)."""
+    terms = {term: 1.0 for term in tokenize(task)}
+    weight = RECENT_INPUT_WEIGHT
+    for tool_input in reversed(list(recent_inputs)):
+        for term in tokenize(" ".join(_strings(tool_input))):
+            terms[term] = max(terms.get(term, 0.0), weight)
+        weight *= RECENT_INPUT_DECAY
+    return terms
+
+
+def bm25_scores(items: list[str], terms: dict[str, float]) -> list[float]:
+    """BM25 score of each item for the weighted query terms (items are the corpus)."""
+    docs = [Counter(tokenize(item)) for item in items]
+    avg_len = sum(sum(tf.values()) for tf in docs) / max(1, len(docs))
+    df = Counter(term for tf in docs for term in tf if term in terms)
+    scores = []
+    for tf in docs:
+        length = sum(tf.values())
+        score = 0.0
+        for term, weight in terms.items():
+            if term in tf:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                score += weight * idf * tf[term] * (K1 + 1) / (tf[term] + K1 * (1 - B + B * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def rank_items(
+    sections: dict,
+    terms: dict[str, float],
+    budget_tokens: int,
+) -> tuple[dict, dict]:
+    """
+    Keep the most relevant items of `sections` (key -> items, in output order)
+    that fit in budget_tokens. Returns (kept items per key in original order,
+    omitted count per key). Everything is kept when it all fits.
+    """
+    cost = {key: [estimate_tokens(item) + 1 for item in items] for key, items in sections.items()}
+    if sum(sum(costs) for costs in cost.values()) <= budget_tokens:
+        return {key: list(items) for key, items in sections.items()}, {}
+
+    scored = []
+    for section_index, (key, items) in enumerate(sections.items()):
+        prior = SECTION_PRIOR / (section_index + 1)
+        for i, item in enumerate(items):
+            scored.append([prior * (1 - 0.5 * i / len(items)), key, i])
+    all_items = [item for items in sections.values() for item in items]
+    for entry, item, score in zip(scored, all_items, bm25_scores(all_items, terms)):
+        entry[0] += score
+        if FORM_CONTROL.search(item):
+            entry[0] += FORM_CONTROL_BONUS
+
+    keep = set()
+    left = budget_tokens
+    for _, key, i in sorted(scored, key=lambda entry: -entry[0]):
+        if cost[key][i] <= left:
+            keep.add((key, i))
+            left -= cost[key][i]
+
+    kept = {key: [item for i, item in enumerate(items) if (key, i) in keep] for key, items in sections.items()}
+    omitted = {key: len(items) - len(kept[key]) for key, items in sections.items() if len(items) > len(kept[key])}
+    return kept, omitted
+
+
+def format_omitted(omitted: dict[str, int], totals: dict[str, int], terms: dict[str, float]) -> str:
+    """One-line note on what rank_items left out (omitted/totals keyed by section title)."""
+    parts = ", ".join(f"{title} {count}/{totals[title]}" for title, count in omitted.items())
+    top = [term for term, _ in sorted(terms.items(), key=lambda item: -item[1])[:8]]
+    ranked_by = f"ranked by relevance to: {' '.join(top)}" if top else "no task terms - kept top of page"
+    return (f"OMITTED (least relevant, over the token budget): {parts}; {ranked_by}. "
+            f"Use search_page(query) or get_page_section(id) to read the rest.")
@@ -0,0 +1,152 @@
+"""
+Resource policy for text-mode browsing.
+
+The agent reads pages as text, so images, media, fonts and ad/tracker requests
+only slow down loading and lazy-load scrolling. A ResourcePolicy blocks them in
+Chromium itself, through CDP Network.setBlockedURLs on every page of a browser
+context: tracker domains, and images/media/fonts by file extension. Nothing is
+routed through Playwright, so requests don't make a round trip to the Python
+event loop and the context keeps its HTTP cache (routing disables it).
+Extension-less image URLs (some CDNs) are not caught; that is the price.
+
+take_screenshot temporarily lets images through (see images_allowed). Blocked
+requests are counted per page; their sizes are unknown without downloading
+them, so saved bytes are an estimate from typical sizes per request kind.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Page, Request
+from config import BLOCKED_RESOURCE_TYPES, BLOCKED_DOMAINS, BLOCKED_SIZE_ESTIMATES
+
+# File extensions of each blockable resource type, for URL patterns
+TYPE_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"),
+    "media": ("mp4", "webm", "mov", "m4v", "mp3", "m4a", "ogg", "oga", "wav", "flac"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+}
+BLOCKED_BY_CLIENT = "net::ERR_BLOCKED_BY_CLIENT"
+
+# Re-requests images that were blocked before a screenshot and waits (bounded) for them
+RELOAD_IMAGES_JS = r"""
+async (timeoutMs) => {
+    const visible = img => {
+        const rect = img.getBoundingClientRect();
+        return rect.bottom > 0 && rect.top < window.innerHeight && rect.width > 0 && rect.height > 0;
+    };
+    const images = [...document.images].filter(img => visible(img) && !(img.complete && img.naturalWidth));
+    const loads = images.map(img => new Promise(resolve => {
+        img.addEventListener('load', resolve, {once: true});
+        img.addEventListener('error', resolve, {once: true});
+        if (img.srcset) img.srcset = img.srcset;
+        img.src = img.src;
+    }));
+    await Promise.race([Promise.all(loads), new Promise(resolve => setTimeout(resolve, timeoutMs))]);
+    return images.length;
+}
+"""
+IMAGE_RELOAD_TIMEOUT_MS = 1500
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / 1_000_000:.1f} MB" if size >= 1_000_000 else f"{size // 1000} KB"
+
+
+class ResourcePolicy:
+    """Blocks heavy resources and trackers for one browser context."""
+
+    def __init__(self):
+        self.image_grants = 0  # screenshots in progress that need images
+        self.counts = {}    # page -> {"blocked": n, "bytes": estimated bytes}
+        self.reported = {}  # page -> counts at the last step_report()
+        self.sessions = {}  # page -> CDP session holding its block list
+        self.attaching = {}  # page -> task applying the block list to it
+
+    @classmethod
+    async def install(cls, context: BrowserContext) -> "ResourcePolicy":
+        """Block on every page of `context`; await attach(page) for a page before navigating it."""
+        policy = cls()
+        context.on("page", policy._on_page)
+        for page in context.pages:
+            await policy.attach(page)
+        return policy
+
+    def _on_page(self, page: Page) -> None:
+        if page not in self.attaching:
+            self.attaching[page] = asyncio.ensure_future(self._attach(page))
+
+    async def attach(self, page: Page) -> None:
+        """Wait until the block list is in place on `page` (new tabs get it on their own)."""
+        self._on_page(page)
+        await self.attaching[page]
+
+    async def _attach(self, page: Page) -> None:
+        page.on("requestfailed", lambda request: self._count(page, request))
+        page.on("close", lambda closed: self.sessions.pop(closed, None))
+        try:
+            session = await page.context.new_cdp_session(page)
+            await session.send("Network.enable")
+            self.sessions[page] = session
+            await self._apply(page)
+        except Exception:
+            pass  # page already closed, or not Chromium: it just loads everything
+
+    def blocked_patterns(self) -> list[str]:
+        """URL patterns for Network.setBlockedURLs; images are left out while a screenshot needs them."""
+        patterns = [pattern for domain in BLOCKED_DOMAINS for pattern in (f"*://{domain}/*", f"*.{domain}/*")]
+        for resource_type in sorted(BLOCKED_RESOURCE_TYPES):
+            if resource_type == "image" and self.image_grants:
+                continue
+            for extension in TYPE_EXTENSIONS.get(resource_type, ()):
+                patterns += [f"*.{extension}", f"*.{extension}?*"]
+        return patterns
+
+    async def _apply(self, page: Page) -> None:
+        session = self.sessions.get(page)
+        if session is not None:
+            await session.send("Network.setBlockedURLs", {"urls": self.blocked_patterns()})
+
+    def _block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        host = urlparse(url).hostname or ""
+        if any(host == domain or host.endswith("." + domain) for domain in BLOCKED_DOMAINS):
+            return "tracker"
+        return resource_type if resource_type in BLOCKED_RESOURCE_TYPES else None
+
+    def _count(self, page: Page, request: Request) -> None:
+        if request.failure != BLOCKED_BY_CLIENT:
+            return
+        reason = self._block_reason(request.url, request.resource_type)
+        counts = self.counts.setdefault(page, {"blocked": 0, "bytes": 0})
+        counts["blocked"] += 1
+        counts["bytes"] += BLOCKED_SIZE_ESTIMATES.get(reason, 0)
+
+    def step_report(self, page: Page) -> str:
+        """Blocked requests on this page since the previous report, for the step log."""
+        counts = self.counts.get(page, {"blocked": 0, "bytes": 0})
+        last = self.reported.get(page, {"blocked": 0, "bytes": 0})
+        self.reported[page] = dict(counts)
+        blocked = counts["blocked"] - last["blocked"]
+        if not blocked:
+            return ""
+        return (f"resources: blocked {blocked} requests (~{_format_bytes(counts['bytes'] - last['bytes'])} saved); "
+                f"page total {counts['blocked']} (~{_format_bytes(counts['bytes'])})")
+
+    @asynccontextmanager
+    async def images_allowed(self, page: Page):
+        """Let images load for the duration of the block (screenshots), re-requesting blocked ones."""
+        self.image_grants += 1
+        try:
+            try:
+                await self._apply(page)
+                await page.evaluate(RELOAD_IMAGES_JS, IMAGE_RELOAD_TIMEOUT_MS)
+            except Exception:
+                pass  # a screenshot without images beats no screenshot
+            yield
+        finally:
+            self.image_grants -= 1
+            try:
+                await self._apply(page)
+            except Exception:
+                pass  # page closed meanwhile
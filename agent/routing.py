@@ -0,0 +1,77 @@
+"""
+Tiered model routing: routine steps go to a fast model, hard ones to the strong one.
+
+Most steps are mechanical (type a query, press Enter, read the results) and a
+small model handles them well. The router sends a step to MODEL when the
+previous step suggests it needs more than that:
+
+  first      - the first step, where the model plans the task
+  failure    - a tool call of the previous step failed
+  screenshot - the previous step took a screenshot the model has to analyze
+  repeat     - the previous step repeated a page-changing action (likely stuck);
+               reading the page again is not a repeat, and scroll/press_key
+               only repeat on the same URL
+  final      - the fast model gave a final answer; it is re-asked to MODEL
+
+Which of these escalate is ROUTING_ESCALATE_ON; MODEL_ROUTING = False sends
+every step to MODEL.
+"""
+
+import json
+from collections import deque
+from typing import Optional
+from agent.tools import is_failure, is_read_only
+from config import MODEL, FAST_MODEL, MODEL_ROUTING, ROUTING_ESCALATE_ON, ROUTING_REPEAT_WINDOW
+
+
+# Reads that scroll or page through stored content: calling them again is progress, not being stuck
+PAGE_READ_TOOLS = {"get_page_content", "search_page", "get_page_section"}
+# Same input, different effect on another page ("scroll down", "press Enter")
+PAGE_RELATIVE_TOOLS = {"scroll", "press_key"}
+
+
+class ModelRouter:
+    """Picks the model for each step of one run."""
+
+    def __init__(
+        self,
+        fast: str = FAST_MODEL,
+        strong: str = MODEL,
+        escalate_on=ROUTING_ESCALATE_ON,
+        enabled: bool = MODEL_ROUTING,
+    ):
+        self.fast = fast
+        self.strong = strong
+        self.escalate_on = set(escalate_on)
+        self.enabled = enabled and fast != strong
+        self.actions = deque(maxlen=ROUTING_REPEAT_WINDOW)  # recent page-changing calls
+        self.pending: Optional[str] = "first"  # why the next step is hard, if it is
+
+    def choose(self) -> tuple[str, str]:
+        """(model, reason) for the next request; the reason is "" for routine steps."""
+        if not self.enabled:
+            return self.strong, ""
+        if self.pending in self.escalate_on:
+            return self.strong, self.pending
+        return self.fast, ""
+
+    def observe(self, tool_calls: list, results: list[str], url: str = "") -> None:
+        """Record one step's tool calls, results and the URL after them; they decide the next step's model."""
+        self.pending = None
+        repeated = False
+        for call, result in zip(tool_calls, results):
+            if is_failure(result):
+                self.pending = "failure"
+            elif call.name == "take_screenshot" and result.startswith("data:image") and self.pending is None:
+                self.pending = "screenshot"
+            if not is_read_only(call.name, call.input) and call.name not in PAGE_READ_TOOLS:
+                page = url if call.name in PAGE_RELATIVE_TOOLS else ""
+                key = (call.name, json.dumps(call.input, sort_keys=True, ensure_ascii=False), page)
+                repeated = repeated or key in self.actions
+                self.actions.append(key)
+        if repeated and self.pending is None:
+            self.pending = "repeat"
+
+    def confirm_final(self, model: str) -> bool:
+        """Should a final answer given by `model` be re-asked to the strong model?"""
+        return self.enabled and model != self.strong and "final" in self.escalate_on
@@ -0,0 +1,111 @@
+"""
+Persistent per-domain selector cache for find_element.
+
+Maps (domain, page-structure fingerprint, normalized description) to a
+durable CSS selector that was confirmed by a successful click/type_text.
+find_element checks it first and verifies a hit with a single locator count,
+so known elements (compose button, search box, cookie banner close) are
+found without a page scan. Entries are evicted by LRU and by idle age.
+"""
+
+import json
+import os
+import re
+import time
+from typing import Optional
+from config import SELECTOR_CACHE_PATH, SELECTOR_CACHE_MAX_ENTRIES, SELECTOR_CACHE_MAX_AGE_DAYS
+
+
+def normalize_description(description: str) -> str:
+    words = re.findall(r"\w+", description.lower())
+    return " ".join(words)
+
+
+class SelectorCache:
+    """On-disk cache: (domain, fingerprint, description) -> selector."""
+
+    def __init__(self, path: str, max_entries: int, max_age_days: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.entries = None  # loaded lazily
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "stored": 0}
+
+    def _key(self, domain: str, fingerprint: str, description: str) -> str:
+        return f"{domain}|{fingerprint}|{normalize_description(description)}"
+
+    def _load(self) -> None:
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self._evict()
+
+    def _save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # the cache is an optimization; never fail a tool call over it
+
+    def _evict(self) -> None:
+        now = time.time()
+        for key in [k for k, e in self.entries.items() if now - e["last_used"] > self.max_age]:
+            del self.entries[key]
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries, key=lambda k: self.entries[k]["last_used"])
+            for key in by_age[:len(self.entries) - self.max_entries]:
+                del self.entries[key]
+
+    def lookup(self, domain: str, fingerprint: str, description: str) -> Optional[dict]:
+        self._load()
+        entry = self.entries.get(self._key(domain, fingerprint, description))
+        if entry is None:
+            self.stats["misses"] += 1
+        return entry
+
+    def record_hit(self, domain: str, fingerprint: str, description: str) -> None:
+        entry = self.entries.get(self._key(domain, fingerprint, description))
+        if entry:
+            self.stats["hits"] += 1
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            self._save()
+
+    def invalidate(self, domain: str, fingerprint: str, description: str) -> None:
+        """Drop an entry whose selector no longer resolves to exactly one element."""
+        self._load()
+        if self.entries.pop(self._key(domain, fingerprint, description), None) is not None:
+            self.stats["stale"] += 1
+            self.stats["misses"] += 1
+            self._save()
+
+    def store(self, domain: str, fingerprint: str, description: str, selector: str, text: str) -> None:
+        self._load()
+        now = time.time()
+        self.entries[self._key(domain, fingerprint, description)] = {
+            "selector": selector,
+            "text": text,
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        self.stats["stored"] += 1
+        self._evict()
+        self._save()
+
+    def summary(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (f"selector cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+                f"({rate:.0%} hit rate), {self.stats['stale']} stale, {self.stats['stored']} stored")
+
+
+# Shared by every task in the process
+selector_cache = SelectorCache(SELECTOR_CACHE_PATH, SELECTOR_CACHE_MAX_ENTRIES, SELECTOR_CACHE_MAX_AGE_DAYS)
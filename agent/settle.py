@@ -0,0 +1,123 @@
+"""
+Event-driven settling after a browser action.
+
+Instead of sleeping a fixed time after a click or navigation, settle() returns
+as soon as the action's effect is observable: the main frame loaded a new
+document, the context opened a new tab, or the page went quiet (no document
+/XHR/fetch requests in flight and no DOM mutations for SETTLE_QUIET_MS).
+Same-document navigations (pushState, hash changes) don't end the wait: an SPA
+changes the URL first and renders the new view after its fetches complete.
+Network and DOM quiet are required together: while a navigation request is
+pending the DOM is idle, and returning then would read the old page.
+SETTLE_TIMEOUT_MS bounds pages that never go quiet (animations, polling).
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+from playwright.async_api import Page
+from config import SETTLE_TIMEOUT_MS, SETTLE_QUIET_MS
+
+# Requests an action's result depends on; images, fonts, beacons don't hold it up
+TRACKED_REQUEST_TYPES = {"document", "xhr", "fetch"}
+POLL_INTERVAL = 0.05  # seconds
+
+# Installs (once per document) a MutationObserver recording the last DOM change;
+# returns ms since that change. Attribute changes count only for attributes that
+# show/hide things, so CSS animations don't keep the page "busy".
+DOM_IDLE_JS = r"""
+() => {
+    if (!window.__agentDomActivity) {
+        const activity = window.__agentDomActivity = {last: performance.now()};
+        new MutationObserver(() => { activity.last = performance.now(); }).observe(document.documentElement, {
+            childList: true, subtree: true, characterData: true,
+            attributes: true, attributeFilter: ['class', 'hidden', 'open', 'aria-expanded', 'aria-hidden', 'disabled'],
+        });
+    }
+    return performance.now() - window.__agentDomActivity.last;
+}
+"""
+
+
+async def settle(
+    page: Page,
+    action: Optional[Callable[[], Awaitable]] = None,
+    navigation: bool = True,
+    timeout_ms: int = SETTLE_TIMEOUT_MS,
+    quiet_ms: int = SETTLE_QUIET_MS,
+) -> tuple[str, int]:
+    """
+    Run `action` (if given) and wait until the page settles.
+
+    With navigation=False a new document doesn't end the wait (used after
+    page.goto, which already waited for the commit). Returns what settled the
+    page ("navigation", "new tab", "quiet", "timeout", "page closed") and the
+    settle time in ms, measured from the end of the action.
+    """
+    loop = asyncio.get_running_loop()
+    settled = loop.create_future()
+    in_flight = set()
+    last_network = loop.time()
+
+    def finish(reason: str) -> None:
+        if not settled.done():
+            settled.set_result(reason)
+
+    def on_new_document(loaded_page) -> None:
+        # framenavigated fires for same-document navigations too; domcontentloaded
+        # only for a new document
+        if navigation:
+            finish("navigation")
+
+    def on_request(request) -> None:
+        nonlocal last_network
+        if request.resource_type in TRACKED_REQUEST_TYPES:
+            in_flight.add(request)
+            last_network = loop.time()
+
+    def on_request_done(request) -> None:
+        nonlocal last_network
+        if request in in_flight:
+            in_flight.discard(request)
+            last_network = loop.time()
+
+    listeners = [
+        (page, "domcontentloaded", on_new_document),
+        (page.context, "page", lambda new_page: finish("new tab")),
+        (page, "close", lambda closed: finish("page closed")),
+        (page, "request", on_request),
+        (page, "requestfinished", on_request_done),
+        (page, "requestfailed", on_request_done),
+    ]
+    for emitter, event, handler in listeners:
+        emitter.on(event, handler)
+
+    try:
+        try:
+            await page.evaluate(DOM_IDLE_JS)  # start observing before the action
+        except Exception:
+            pass
+        if action is not None:
+            await action()
+
+        started = loop.time()
+        last_network = max(last_network, started)
+        deadline = started + timeout_ms / 1000
+        while not settled.done():
+            now = loop.time()
+            if now >= deadline:
+                finish("timeout")
+                break
+            if not in_flight and now - last_network >= quiet_ms / 1000:
+                try:
+                    dom_idle_ms = await page.evaluate(DOM_IDLE_JS)
+                except Exception:
+                    dom_idle_ms = 0  # context replaced by a navigation; the event decides
+                if min(dom_idle_ms, (now - started) * 1000) >= quiet_ms:
+                    finish("quiet")
+                    break
+            await asyncio.wait([settled], timeout=POLL_INTERVAL)
+
+        return settled.result(), round((loop.time() - started) * 1000)
+    finally:
+        for emitter, event, handler in listeners:
+            emitter.remove_listener(event, handler)
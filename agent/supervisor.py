@@ -1,154 +1,449 @@
-from anthropic import Anthropic
 from rich.console import Console
 from rich.panel import Panel
-from config import client, MODEL
-from agent.tools import TOOLS
+from config import PROMPT_CACHING, HISTORY_TOKEN_BUDGET, HISTORY_KEEP_RECENT, TRAJECTORY_REPLAY
+from agent.tools import TOOLS, is_read_only, current_state
+from agent.history import compact_history, estimate_tokens
+from agent.trajectory import TrajectoryRecorder, trajectory_store, replay, format_replay_note
+from agent.telemetry import start_trace, current_trace, usage_cost
+from agent.llm import get_client, stream_message
+from agent.routing import ModelRouter
+from typing import Optional
+import asyncio
 import json
+import time
 
 console = Console()
 
 
-MAX_HISTORY_MESSAGES = 80
 MAX_STEPS = 40
+MAX_TOOL_RESULT_CHARS = 8000  # ~2000 tokens per tool result
+TOOL_NAMES = {tool["name"] for tool in TOOLS}
 
-def run_agent(task: str) -> str:
-    messages = [
-        {
-            "role": "user",
-            "content": f"""You are an autonomous AI agent controlling a web browser. Your task is to complete the following objective:
 
-TASK: {task}
+class RunStats:
+    """Counters collected during one agent run (filled in as the run progresses)."""
+
+    def __init__(self):
+        self.steps = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.replayed_steps = 0  # actions replayed from a recorded trajectory, without the model
+        self.pool_wait_s = 0.0  # time spent waiting for a warm browser context
+        self.startup_saved_s = 0.0  # context startup the pool did ahead of time
+        self.cost_usd = 0.0
+        self.model_requests = {}  # model -> requests sent to it
+        self.escalations = 0  # requests routed to the strong model for a reason (see agent/routing.py)
+
+    def add_usage(self, usage) -> None:
+        self.input_tokens += getattr(usage, "input_tokens", 0) or 0
+        self.output_tokens += getattr(usage, "output_tokens", 0) or 0
+        self.cache_read_tokens += getattr(usage, "cache_read_input_tokens", 0) or 0
+        self.cache_write_tokens += getattr(usage, "cache_creation_input_tokens", 0) or 0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of prompt tokens served from the cache."""
+        total = self.input_tokens + self.cache_read_tokens + self.cache_write_tokens
+        return self.cache_read_tokens / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "steps": self.steps,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "replayed_steps": self.replayed_steps,
+            "pool_wait_s": round(self.pool_wait_s, 2),
+            "startup_saved_s": round(self.startup_saved_s, 2),
+            "cost_usd": round(self.cost_usd, 5),
+            "model_requests": dict(self.model_requests),
+            "escalations": self.escalations,
+        }
+
+
+SYSTEM_PROMPT = """You are an autonomous AI agent controlling a web browser. Your task is given in the first user message.
 
 IMPORTANT RULES:
 1. Use ONLY the provided tools — never invent new ones.
-2. Be extremely token-efficient: prefer fast text-based tools over screenshots.
+2. Be extremely token-efficient: prefer fast text-based tools over screenshots. On large pages use search_page() and get_page_section() to read what get_page_content left out instead of calling it again.
 3. Think step-by-step and adapt your strategy to the current page and website behavior.
 4. Never use "text=" selectors — they are unreliable on modern single-page applications.
-5. Always prefer the XPath selector returned by find_element() — it works everywhere.
+5. Prefer element refs like e42 (shown as [e42] in get_page_content, returned by find_element()) — pass them as the selector to click, type_text, fill_form, get_element_text, scroll and wait_for_element. Fill several fields with one fill_form call; batch predictable sequences (type, Enter, wait, read) into one run_actions call. Refs are valid until the page navigates.
 6. If a click fails once — immediately call take_screenshot() for visual debugging instead of retrying.
 7. For elements containing dynamic counters, badges, or icons (e.g. "Orders 3", "Cart 1"), describe them naturally in find_element() — e.g. "orders link with badge", "cart icon with number".
 8. Close pop-ups, cookie banners, and ads as soon as they appear.
 9. Ask the human via ask_human() only for dangerous actions (delete, pay, send) or when genuinely stuck.
 10. When the task is complete, provide a clear, concise final answer.
 
-You have full autonomy. No predefined plans. No hardcoded selectors.
+You have full autonomy. No predefined plans. No hardcoded selectors."""
 
-Begin now."""
-        }
-    ]
+# Cache breakpoints: the tools + system prefix is identical on every step (and
+# across tasks); a rolling breakpoint on the newest message caches the history.
+CACHE_CONTROL = {"type": "ephemeral"}
+CACHED_TOOLS = TOOLS[:-1] + [{**TOOLS[-1], "cache_control": CACHE_CONTROL}]
+CACHED_SYSTEM = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
 
-    step = 0
-    final_answer = None
+# Models that accept the 1M-context beta header
+LONG_CONTEXT_MODELS = {"claude-sonnet-4-5-20250929"}
 
-    while step < MAX_STEPS:
-        step += 1
-        console.print(Panel(f"[bold white]Step {step}[/bold white] - Sending request to Claude...", style="bold blue"))
+# System prompt + tool schemas are sent with every request and count against the budget
+PROMPT_OVERHEAD_TOKENS = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(json.dumps(TOOLS, ensure_ascii=False))
 
-        try:
-            response = client.messages.create(
-                model=MODEL,
-                max_tokens=4096,
-                tools=TOOLS,
-                messages=messages,
-                temperature=0.0,
-                extra_headers={"anthropic-beta": "context-1m-2025-08-07"}
-            )
 
-            messages.append({"role": "assistant", "content": response.content})
+async def run_agent(
+    task: str,
+    label: str = "",
+    stats: Optional[RunStats] = None,
+    template: Optional[str] = None,
+) -> str:
+    """
+    Run the agent loop for one task on the page bound via tools.bind_page().
 
-            tool_calls_made = False
-            text_responses = []
+    Runs of the same template (the task text by default) share a recorded
+    trajectory: its actions are replayed first, the model takes over where the
+    page stops matching the recording.
+    """
+    stats = stats if stats is not None else RunStats()
+    trace = start_trace(label)
+    current_state().task = task
+    current_state().label = label
+    template = template or task
+    recorder = TrajectoryRecorder() if TRAJECTORY_REPLAY else None
+    router = ModelRouter()
+    intro = "Begin now."
+
+    step = 0
+    final_answer = None
+    try:
+        recorded = trajectory_store.load(template) if recorder else None
+        if recorded:
+            replayed, stopped = await replay(recorded, task, recorder, execute_tool)
+            stats.replayed_steps = len(replayed)
+            console.print(Panel(
+                f"Replayed {len(replayed)}/{len(recorded['steps'])} recorded steps"
+                + (f"\nStopped at {stopped}" if stopped else ""),
+                title=f"{label}Trajectory replay", style="bold magenta"
+            ))
+            if replayed:
+                intro = format_replay_note(replayed, stopped)
 
-            for block in response.content:
-                if hasattr(block, "text"):
-                    text_responses.append(block.text)
-                    if block.text.strip():
-                        console.print(Panel(block.text, title="Agent Thinking", style="dim cyan"))
+        messages = [
+            {
+                "role": "user",
+                "content": f"TASK: {task}\n\n{intro}"
+            }
+        ]
 
-                elif block.type == "tool_use":
-                    tool_calls_made = True
-                    tool_name = block.name
-                    tool_input = block.input
+        while step < MAX_STEPS:
+            step += 1
+            stats.steps = step
+            current_state().step = step
+            model, reason = router.choose()
+            console.print(Panel(
+                f"[bold white]{label}Step {step}[/bold white] - Sending request to {model}"
+                + (f" [yellow](escalated: {reason})[/yellow]" if reason else ""),
+                style="bold blue"
+            ))
 
+            dispatcher = None
+            try:
+                response, dispatcher = await request_turn(messages, model, reason, label, stats, recorder)
+                tool_calls = dispatcher.calls
+                if not tool_calls and router.confirm_final(model):
+                    # Финальный ответ быстрой модели перепроверяет сильная
+                    model, reason = router.strong, "final"
                     console.print(Panel(
-                        f"[bold yellow]Tool:[/bold yellow] {tool_name}\n"
-                        f"[bold yellow]Arguments:[/bold yellow]\n{json.dumps(tool_input, ensure_ascii=False, indent=2)}",
-                        title=f"Step {step}", style="bold green"
+                        f"[bold white]{label}Step {step}[/bold white] - Final answer from the fast model, "
+                        f"re-asking {model} [yellow](escalated: final)[/yellow]",
+                        style="bold blue"
                     ))
+                    response, dispatcher = await request_turn(messages, model, reason, label, stats, recorder)
+
+                messages.append({"role": "assistant", "content": serialize_content(response.content)})
+
+                tool_calls = dispatcher.calls
+                if not tool_calls:
+                    final_answer = " ".join(block.text for block in response.content if block.type == "text")
+                    console.print(Panel(final_answer, title="Task Complete", style="bold green on black"))
+                    break
+
+                tool_results = await dispatcher.results()
+                router.observe(tool_calls, tool_results, current_state().page.url)
+
+                # Все tool_result одного хода уходят одним user-сообщением, в порядке tool_use
+                messages.append({
+                    "role": "user",
+                    "content": [
+                        format_tool_result(block, tool_result)
+                        for block, tool_result in zip(tool_calls, tool_results)
+                    ]
+                })
+
+                # Счётчики заблокированных запросов (картинки, шрифты, трекеры) за этот шаг
+                state = current_state()
+                if state.resources:
+                    blocked = state.resources.step_report(state.page)
+                    if blocked:
+                        console.print(f"[dim]{label}{blocked}[/dim]")
+
+                # БЕЗОПАСНОЕ сжатие истории — по токенам, пары tool_use/tool_result не разрываются
+                messages, report = compact_history(
+                    messages, HISTORY_TOKEN_BUDGET - PROMPT_OVERHEAD_TOKENS, keep_recent=HISTORY_KEEP_RECENT
+                )
+                if report:
+                    console.print(f"[dim italic]{label}{report}[/dim italic]\n")
 
-                    tool_result = execute_tool(tool_name, tool_input)
-
-                    # КЛЮЧЕВОЙ ФИКС: правильная отправка скриншотов + безопасный tool_result
-                    if tool_name == "take_screenshot" and tool_result.startswith("data:image"):
-                        console.print(Panel("Screenshot captured (vision analysis enabled)", style="bold yellow"))
-                        messages.append({
-                            "role": "user",
-                            "content": [{
-                                "type": "tool_result",
-                                "tool_use_id": block.id,
-                                "content": [
-                                    {"type": "text", "text": "Screenshot taken and analyzed visually."},
-                                    {
-                                        "type": "image",
-                                        "source": {
-                                            "type": "base64",
-                                            "media_type": "image/png",
-                                            "data": tool_result.split(",")[1]
-                                        }
-                                    }
-                                ]
-                            }]
-                        })
-                    else:
-                        # Smart truncation to respect token limits
-                        MAX_TOOL_RESULT_CHARS = 8000  # ~2000 tokens per tool result
-                        truncated_result = tool_result
-                        if len(tool_result) > MAX_TOOL_RESULT_CHARS:
-                            truncated_result = (
-                                tool_result[:MAX_TOOL_RESULT_CHARS] +
-                                f"\n\n... [TRUNCATED: {len(tool_result) - MAX_TOOL_RESULT_CHARS} chars omitted to save tokens]"
-                            )
-
-                        display = truncated_result[:500] + "..." if len(truncated_result) > 500 else truncated_result
-                        console.print(Panel(display, title="Result", style="bold white"))
-                        messages.append({
-                            "role": "user",
-                            "content": [{
-                                "type": "tool_result",
-                                "tool_use_id": block.id,
-                                "content": truncated_result
-                            }]
-                        })
-
-            if not tool_calls_made:
-                final_answer = " ".join(text_responses)
-                console.print(Panel(final_answer, title="Task Complete", style="bold green on black"))
+            except BaseException as e:
+                if dispatcher:
+                    await dispatcher.cancel()
+                if not isinstance(e, Exception):
+                    raise  # cancelled (e.g. a batch task timeout): the context is being torn down
+                console.print(Panel(f"Error in agent loop: {str(e)}", title="Error", style="bold red"))
                 break
 
-            # БЕЗОПАСНАЯ обрезка истории — сохраняем пары tool_use/tool_result
-            if len(messages) > MAX_HISTORY_MESSAGES:
-                # Оставляем: первый промпт + последние 70 сообщений (всегда целые пары)
-                preserved = [messages[0]] + messages[-70:]
-                messages = preserved
-                console.print("[dim italic]Trimmed conversation history safely (preserved tool pairs)[/dim italic]\n")
+        if step >= MAX_STEPS:
+            console.print(Panel(f"Reached maximum steps ({MAX_STEPS})", title="Max Steps", style="bold yellow"))
+    finally:
+        # Also when cancelled: the run span is what shows a timed-out task in telemetry
+        if trace:
+            trace.finish(stats)
 
-        except Exception as e:
-            console.print(Panel(f"Error in agent loop: {str(e)}", title="Error", style="bold red"))
-            break
+    # Only runs that reached an answer are worth replaying
+    if recorder and final_answer and recorder.complete and recorder.steps:
+        trajectory_store.save(template, task, recorder.steps)
 
-    if step >= MAX_STEPS:
-        console.print(Panel(f"Reached maximum steps ({MAX_STEPS})", title="Max Steps", style="bold yellow"))
+    console.print(
+        f"[dim]{label}Tokens: in {stats.input_tokens}, out {stats.output_tokens}, "
+        f"cache read {stats.cache_read_tokens}, cache write {stats.cache_write_tokens} "
+        f"(hit rate {stats.cache_hit_rate:.0%})[/dim]"
+    )
+    if trace:
+        console.print(Panel(trace.summary(), title=f"{label}Timings", style="dim"))
 
     return final_answer or "Task execution ended without final answer"
 
 
-def execute_tool(tool_name: str, tool_input: dict) -> str:
+async def request_turn(
+    messages: list,
+    model: str,
+    reason: str,
+    label: str,
+    stats: RunStats,
+    recorder: Optional[TrajectoryRecorder] = None,
+) -> tuple:
+    """
+    Stream one model turn, dispatching its tool calls as they arrive.
+
+    Returns the final response and the ToolDispatcher running its tool calls.
+    """
+    step = current_state().step
+    trace = current_trace()
+    dispatcher = ToolDispatcher(recorder)
+    request_started = time.perf_counter()
+    first_tool_s = None
+    text_open = False
+
+    def on_text(delta: str) -> None:
+        nonlocal text_open
+        if not text_open:
+            console.print(f"[dim cyan]{label}Agent Thinking:[/dim cyan] ", end="")
+            text_open = True
+        console.print(delta, end="", style="dim cyan", markup=False, highlight=False)
+
+    def on_block(block) -> None:
+        # tool_use уходит в работу сразу, пока модель ещё пишет следующие блоки
+        nonlocal text_open, first_tool_s
+        if block.type == "text" and text_open:
+            console.print()
+            text_open = False
+        elif block.type == "tool_use":
+            if first_tool_s is None:
+                first_tool_s = time.perf_counter() - request_started
+            console.print(Panel(
+                f"[bold yellow]Tool:[/bold yellow] {block.name}\n"
+                f"[bold yellow]Arguments:[/bold yellow]\n{json.dumps(block.input, ensure_ascii=False, indent=2)}",
+                title=f"{label}Step {step} · {model}", style="bold green"
+            ))
+            dispatcher.submit(block)
+
+    request = dict(
+        model=model,
+        max_tokens=4096,
+        tools=CACHED_TOOLS if PROMPT_CACHING else TOOLS,
+        system=CACHED_SYSTEM if PROMPT_CACHING else SYSTEM_PROMPT,
+        messages=with_cache_breakpoint(messages) if PROMPT_CACHING else messages,
+        temperature=0.0,
+    )
+    if model in LONG_CONTEXT_MODELS:
+        request["extra_headers"] = {"anthropic-beta": "context-1m-2025-08-07"}
+    try:
+        response = await stream_message(get_client(), request, on_text, on_block)
+    except BaseException:  # cancellation too: started tools must not outlive the task's context
+        await dispatcher.cancel()
+        raise
+
+    stats.add_usage(response.usage)
+    stats.cost_usd += usage_cost(model, response.usage) or 0.0
+    stats.model_requests[model] = stats.model_requests.get(model, 0) + 1
+    stats.escalations += bool(reason)
+    if trace:
+        trace.llm(step, model, time.perf_counter() - request_started, response.usage, first_tool_s, reason)
+    console.print(f"[dim]{label}{model}: {format_usage(response.usage)}[/dim]")
+    return response, dispatcher
+
+
+def with_cache_breakpoint(messages: list) -> list:
+    """
+    Copy of the history with a cache breakpoint on the newest message.
+
+    The history itself is never mutated, so older messages don't keep stale
+    breakpoints (the API allows at most 4 per request).
+    """
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    content = content[:-1] + [{**content[-1], "cache_control": CACHE_CONTROL}]
+    return messages[:-1] + [{**last, "content": content}]
+
+
+def format_usage(usage) -> str:
+    return (
+        f"tokens: in {usage.input_tokens}, out {usage.output_tokens}, "
+        f"cache read {getattr(usage, 'cache_read_input_tokens', 0) or 0}, "
+        f"cache write {getattr(usage, 'cache_creation_input_tokens', 0) or 0}"
+    )
+
+
+def serialize_content(content) -> list[dict]:
+    """Convert response content blocks into plain dicts for the message history."""
+    blocks = []
+    for block in content:
+        if block.type == "text":
+            if block.text.strip():  # API rejects empty text blocks
+                blocks.append({"type": "text", "text": block.text})
+        elif block.type == "tool_use":
+            blocks.append({"type": "tool_use", "id": block.id, "name": block.name, "input": block.input})
+    return blocks
+
+
+def format_tool_result(block, tool_result: str) -> dict:
+    """Build the tool_result content block for one tool call (and log it)."""
+    # КЛЮЧЕВОЙ ФИКС: правильная отправка скриншотов + безопасный tool_result
+    if block.name == "take_screenshot" and tool_result.startswith("data:image"):
+        header, data = tool_result.split(",", 1)
+        media_type = header[len("data:"):].split(";")[0]  # png/jpeg/webp, whatever the tool encoded
+        trace = current_trace()
+        if trace:
+            trace.sent(block.id, len(data))
+        console.print(Panel(
+            f"Screenshot captured: {media_type}, {len(data) * 3 // 4 // 1024} KB (vision analysis enabled)",
+            style="bold yellow"
+        ))
+        return {
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": [
+                {"type": "text", "text": "Screenshot taken and analyzed visually."},
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": media_type,
+                        "data": data
+                    }
+                }
+            ]
+        }
+
+    # Smart truncation to respect token limits
+    truncated_result = tool_result
+    if len(tool_result) > MAX_TOOL_RESULT_CHARS:
+        truncated_result = (
+            tool_result[:MAX_TOOL_RESULT_CHARS] +
+            f"\n\n... [TRUNCATED: {len(tool_result) - MAX_TOOL_RESULT_CHARS} chars omitted to save tokens]"
+        )
+
+    trace = current_trace()
+    if trace:
+        trace.sent(block.id, len(truncated_result))
+
+    display = truncated_result[:500] + "..." if len(truncated_result) > 500 else truncated_result
+    console.print(Panel(display, title="Result", style="bold white"))
+    return {
+        "type": "tool_result",
+        "tool_use_id": block.id,
+        "content": truncated_result
+    }
+
+
+class ToolDispatcher:
+    """
+    Starts the tool_use blocks of one assistant turn as they arrive.
+
+    Consecutive read-only calls run concurrently; a mutating call runs alone,
+    after everything submitted before it. Results come back in tool_use order.
+    """
+
+    def __init__(self, recorder: Optional[TrajectoryRecorder] = None):
+        self.recorder = recorder
+        self.calls = []
+        self.tasks = []
+        self.reads = []         # read-only calls since the last mutating one
+        self.last_write = None  # the last mutating call (it waited for everything before it)
+
+    def submit(self, call) -> None:
+        earlier = [self.last_write] if self.last_write else []
+        if is_read_only(call.name, call.input):
+            task = asyncio.create_task(self._run(call, earlier))
+            self.reads.append(task)
+        else:
+            task = asyncio.create_task(self._run(call, earlier + self.reads))
+            self.last_write = task
+            self.reads = []
+        self.calls.append(call)
+        self.tasks.append(task)
+
+    async def _run(self, call, earlier: list) -> str:
+        await asyncio.gather(*earlier, return_exceptions=True)
+        step = await self.recorder.before(call.name, call.input) if self.recorder else None
+        result = await execute_tool(call.name, call.input, call.id)
+        if self.recorder:
+            self.recorder.after(step, result)
+        return result
+
+    async def results(self) -> list[str]:
+        return list(await asyncio.gather(*self.tasks))
+
+    async def cancel(self) -> None:
+        """Stop calls still running after the turn failed (e.g. the stream broke)."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def execute_tool(tool_name: str, tool_input: dict, tool_use_id: Optional[str] = None) -> str:
+    """Run one tool and record its span (tool_use_id is None for replayed and run_actions steps)."""
+    started = time.perf_counter()
+    current_state().recent_inputs.append(tool_input)  # page content is ranked against recent inputs too
+    result = await _call_tool(tool_name, tool_input)
+    trace = current_trace()
+    if trace:
+        trace.tool(current_state().step, tool_use_id, tool_name, time.perf_counter() - started, result)
+    return result
+
+
+async def _call_tool(tool_name: str, tool_input: dict) -> str:
     try:
         from agent import tools
-        if not hasattr(tools, tool_name):
+        # Only dispatch declared tools: the module also exposes state helpers
+        if tool_name not in TOOL_NAMES:
             return f"Error: Unknown tool '{tool_name}'"
         tool_func = getattr(tools, tool_name)
-        result = tool_func(**tool_input)
+        result = await tool_func(**tool_input)
         return str(result)
     except Exception as e:
         return f"Error executing {tool_name}: {str(e)}"
\ No newline at end of file
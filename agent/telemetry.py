@@ -0,0 +1,150 @@
+"""
+Per-step telemetry: structured spans written to a JSONL trace.
+
+Every model request and every tool call of a run becomes one span record:
+  llm  - model and why it was chosen, request wall time, time to the first
+         tool_use, input/output/cache tokens, cost
+  tool - tool name, wall time, settle time, result size before/after truncation
+  run  - totals, written when the run ends
+Spans of one run share a run_id; concurrent runs append to the same file.
+The trace of the running task lives in a ContextVar, so execute_tool can add
+spans without the trace being threaded through every call.
+"""
+
+import json
+import math
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+from config import TELEMETRY, TRACE_PATH, MODEL_PRICING
+
+SETTLE_PATTERN = re.compile(r"settled in (\d+) ms")
+
+
+def usage_cost(model: str, usage) -> Optional[float]:
+    """USD cost of one response's usage, or None for a model missing from MODEL_PRICING."""
+    prices = MODEL_PRICING.get(model)
+    if prices is None:
+        return None
+    tokens = {
+        "input": getattr(usage, "input_tokens", 0) or 0,
+        "output": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    }
+    return sum(tokens[kind] * prices[kind] for kind in tokens) / 1_000_000
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class RunTrace:
+    """Spans of one agent run."""
+
+    def __init__(self, label: str = "", path: Optional[str] = None):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.label = label.strip()
+        self.path = path or TRACE_PATH
+        self.started = time.time()
+        self.spans = []
+        self.tool_spans = {}  # tool_use_id -> span still waiting for its sent size
+
+    def _emit(self, span: dict) -> None:
+        span = {"run_id": self.run_id, "label": self.label, "ts": round(time.time(), 3), **span}
+        self.spans.append(span)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # telemetry must never break a run
+
+    def llm(
+        self, step: int, model: str, duration_s: float, usage,
+        first_tool_s: Optional[float] = None, route: str = "",
+    ) -> None:
+        self._emit({
+            "type": "llm",
+            "step": step,
+            "model": model,
+            "route": route or None,  # escalation reason, None for routine steps
+            "duration_ms": round(duration_s * 1000),
+            # tools start here (streaming), not at duration_ms
+            "first_tool_ms": round(first_tool_s * 1000) if first_tool_s is not None else None,
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            "cost_usd": usage_cost(model, usage),
+        })
+
+    def tool(self, step: int, tool_use_id: Optional[str], name: str, duration_s: float, result: str) -> None:
+        settle = SETTLE_PATTERN.search(result)
+        span = {
+            "type": "tool",
+            "step": step,
+            "tool": name,
+            "duration_ms": round(duration_s * 1000),
+            "settle_ms": int(settle.group(1)) if settle else None,
+            "result_chars": len(result),
+            "sent_chars": len(result),
+        }
+        if tool_use_id is None:
+            self._emit(span)  # replayed or run_actions step: not sent to the model by itself
+        else:
+            self.tool_spans[tool_use_id] = span
+
+    def sent(self, tool_use_id: str, chars: int) -> None:
+        """Size of the result as sent to the model (after truncation); emits the tool span."""
+        span = self.tool_spans.pop(tool_use_id, None)
+        if span is not None:
+            span["sent_chars"] = chars
+            self._emit(span)
+
+    def finish(self, stats) -> None:
+        for span in list(self.tool_spans.values()):
+            self._emit(span)
+        self.tool_spans.clear()
+        self._emit({
+            "type": "run",
+            "duration_ms": round((time.time() - self.started) * 1000),
+            **stats.to_dict(),
+        })
+
+    def cost(self) -> Optional[float]:
+        costs = [span["cost_usd"] for span in self.spans if span["type"] == "llm"]
+        return None if any(c is None for c in costs) else sum(costs)
+
+    def summary(self) -> str:
+        """p50/p95 per tool and for model requests, plus total cost."""
+        durations = {}
+        for span in self.spans:
+            key = "model" if span["type"] == "llm" else span.get("tool")
+            if span["type"] in ("llm", "tool"):
+                durations.setdefault(key, []).append(span["duration_ms"])
+
+        lines = [f"{'':<18}{'calls':>6}{'p50 ms':>9}{'p95 ms':>9}{'total s':>9}"]
+        for key, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            lines.append(f"{key:<18}{len(values):>6}{percentile(values, 50):>9}{percentile(values, 95):>9}"
+                         f"{sum(values) / 1000:>9.1f}")
+        cost = self.cost()
+        lines.append(f"cost: {'$%.4f' % cost if cost is not None else 'unknown (model missing from MODEL_PRICING)'}")
+        return "\n".join(lines)
+
+
+_trace: ContextVar[Optional[RunTrace]] = ContextVar("run_trace", default=None)
+
+
+def start_trace(label: str = "") -> Optional[RunTrace]:
+    """Start tracing the current task's run (None when TELEMETRY is off)."""
+    trace = RunTrace(label) if TELEMETRY else None
+    _trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RunTrace]:
+    return _trace.get()
@@ -1,282 +1,1071 @@
-from playwright.sync_api import Page
+from playwright.async_api import Page
 from typing import Annotated, Optional
+from contextvars import ContextVar
+from contextlib import nullcontext
+from collections import deque
+import re
 from bs4 import BeautifulSoup
+import asyncio
 import base64
-from config import DESTRUCTIVE_KEYWORDS
-
-page: Page = None
-
-def goto_url(url: Annotated[str, "Full URL including https://"]) -> str:
+import hashlib
+import io
+import json
+import random
+from urllib.parse import urlparse
+from agent.selector_cache import selector_cache
+from agent.settle import settle
+from agent.resources import ResourcePolicy
+from agent.relevance import query_terms, rank_items, format_omitted
+from agent.page_store import PageStore
+from agent.history import estimate_tokens
+from config import (
+    DESTRUCTIVE_KEYWORDS, SCROLL_MAX_ROUNDS, SCROLL_QUIET_MS, SCROLL_MAX_WAIT_MS,
+    INPUT_MODE, HUMAN_INPUT_DOMAINS, HUMAN_TYPING_DELAY_MS,
+    SCREENSHOT_FORMAT, SCREENSHOT_QUALITY, SCREENSHOT_MAX_WIDTH, SCREENSHOT_DEDUP_DISTANCE,
+    PAGE_EXTRACT_LIMITS, PAGE_CONTENT_TOKEN_BUDGET, PAGE_OUTLINE_TOKEN_SHARE, RELEVANCE_RECENT_INPUTS,
+    PAGE_SECTION_TOKEN_BUDGET, SEARCH_PAGE_RESULTS,
+)
+
+try:
+    from PIL import Image  # optional: downscaling, WebP and perceptual screenshot dedup
+except ImportError:
+    Image = None
+
+
+class ToolState:
+    """Browser state owned by one agent task (its current tab)."""
+
+    def __init__(self, page: Page, interactive: bool = True, resources: Optional[ResourcePolicy] = None):
+        self.page = page
+        self.interactive = interactive  # False for unattended runs: nobody answers input()
+        self.resources = resources  # request blocking of the page's context, if installed
+        self.step = 0  # current agent step, set by the supervisor
+        self.snapshots = {}  # (id(tab), url) -> (step, last get_page_content snapshot)
+        self.pending_selectors = {}  # ref -> find_element match, cached once used successfully
+        self.screenshots = []  # (step, crop, image hash) of screenshots already sent
+        self.task = ""  # task text, set by the supervisor; page content is ranked against it
+        self.label = ""  # task label ("[task 3] "), set by the supervisor; prefixes questions to the human
+        self.recent_inputs = deque(maxlen=RELEVANCE_RECENT_INPUTS)  # inputs of the latest tool calls
+        self.page_stores = {}  # id(tab) -> PageStore of its last get_page_content
+        self.secrets = set()  # text typed into secret fields; never written to trajectories or cassettes
+
+
+# Each asyncio task sees its own ToolState, so concurrent agents never share a tab
+_state: ContextVar[ToolState] = ContextVar("tool_state")
+
+
+def bind_page(page: Page, interactive: bool = True, resources: Optional[ResourcePolicy] = None) -> ToolState:
+    """Bind a page to the current task. Tools called from this task will drive it."""
+    state = ToolState(page, interactive, resources)
+    _state.set(state)
+    return state
+
+
+def current_state() -> ToolState:
+    return _state.get()
+
+
+# Concurrent tasks share one stdin: one question at a time, so an answer can't
+# reach the wrong task. Shared by every task in the process
+_human_lock = asyncio.Lock()
+
+
+async def _ask_human_input(prompt: str) -> str:
+    """Read one answer from the operator, labelled with the asking task."""
+    label = current_state().label
+    async with _human_lock:
+        return await asyncio.to_thread(input, f"{label}{prompt}")
+
+
+async def goto_url(url: Annotated[str, "Full URL including https://"]) -> str:
     """Navigate to the specified URL"""
+    page = current_state().page
     try:
-        page.goto(url, wait_until="domcontentloaded", timeout=30000)
-        page.wait_for_timeout(1000)  # Wait for dynamic content
-        return f"Successfully navigated to {url}"
+        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        reason, settle_ms = await settle(page, navigation=False)  # Wait for dynamic content
+        return f"Successfully navigated to {url} (settled in {settle_ms} ms: {reason})"
     except Exception as e:
         return f"Error navigating to {url}: {str(e)}"
 
-def get_page_content(
-    scroll_to_load: Annotated[bool, "Whether to scroll page to trigger lazy loading (default: True)"] = True
+# Adaptive lazy-load scrolling. Each round scrolls one step and moves on as soon
+# as no fetch/XHR is in flight and no new DOM nodes or network requests have shown
+# up for `quietMs` (bounded by `maxWaitMs`). Finished resource entries alone miss
+# a slow feed request still running, so fetch and XHR are wrapped for the call
+# to count requests in flight. Stops when the bottom is reached and the page
+# stopped growing (after giving a pending next page up to `maxWaitMs`), when
+# nothing new loads for two rounds, or when the round budget runs out.
+SCROLL_TO_LOAD_JS = r"""
+async ({maxRounds, quietMs, maxWaitMs}) => {
+    let addedNodes = 0;
+    let requests = 0;
+    let inFlight = 0;
+    let lastActivity = performance.now();
+    const touch = () => { lastActivity = performance.now(); };
+
+    const mutations = new MutationObserver(records => {
+        for (const record of records) {
+            record.addedNodes.forEach(node => { if (node.nodeType === 1) addedNodes++; });
+        }
+        touch();
+    });
+    mutations.observe(document.documentElement, {childList: true, subtree: true});
+
+    let network = null;
+    try {
+        network = new PerformanceObserver(list => {
+            requests += list.getEntries().length;
+            touch();
+        });
+        network.observe({type: 'resource'});
+    } catch (e) {}
+
+    // Requests in flight: started by the page while we scroll, not finished yet
+    const originalFetch = window.fetch;
+    const originalSend = XMLHttpRequest.prototype.send;
+    const started = () => { inFlight++; requests++; touch(); };
+    const finished = () => { inFlight = Math.max(0, inFlight - 1); touch(); };
+    if (originalFetch) {
+        window.fetch = function (...args) {
+            started();
+            return originalFetch.apply(this, args).finally(finished);
+        };
+    }
+    XMLHttpRequest.prototype.send = function (...args) {
+        started();
+        this.addEventListener('loadend', finished, {once: true});
+        return originalSend.apply(this, args);
+    };
+
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    async function waitQuiet() {
+        const began = lastActivity = performance.now();
+        while (performance.now() - began < maxWaitMs) {
+            await sleep(50);
+            if (inFlight === 0 && performance.now() - lastActivity >= quietMs) return;
+        }
+    }
+
+    // At the bottom without growth, the next page may still be on its way. A
+    // tracked request ends the wait once it settled; a feed that grew before may
+    // load through a fetch reference taken before we wrapped it, so it gets the
+    // full maxWaitMs to grow.
+    async function waitGrowth(height, untilQuiet) {
+        const began = performance.now();
+        while (performance.now() - began < maxWaitMs) {
+            if (scroller.scrollHeight > height) return;
+            await sleep(50);
+            if (untilQuiet && inFlight === 0 && performance.now() - lastActivity >= quietMs) return;
+        }
+    }
+
+    const scroller = document.scrollingElement || document.documentElement;
+    const rounds = [];
+    let stoppedBy = 'budget';
+    let idleRounds = 0;
+    let grew = false;
+
+    try {
+        for (let i = 0; i < maxRounds; i++) {
+            const heightBefore = scroller.scrollHeight;
+            addedNodes = 0;
+            requests = 0;
+
+            window.scrollBy(0, window.innerHeight * 0.8);
+            await waitQuiet();
+
+            let atBottom = window.scrollY + window.innerHeight >= scroller.scrollHeight - 2;
+            if (atBottom && scroller.scrollHeight <= heightBefore && (requests > 0 || grew)) {
+                await waitGrowth(heightBefore, !grew);
+                atBottom = window.scrollY + window.innerHeight >= scroller.scrollHeight - 2;
+            }
+
+            const growth = scroller.scrollHeight - heightBefore;
+            rounds.push({nodes: addedNodes, requests: requests, growth: growth});
+            grew = grew || growth > 0;
+
+            if (atBottom && growth <= 0) { stoppedBy = 'end of page'; break; }
+
+            idleRounds = (addedNodes === 0 && requests === 0 && growth <= 0) ? idleRounds + 1 : 0;
+            if (idleRounds >= 2) { stoppedBy = 'nothing new loading'; break; }
+        }
+    } finally {
+        if (originalFetch) window.fetch = originalFetch;
+        XMLHttpRequest.prototype.send = originalSend;
+        mutations.disconnect();
+        if (network) network.disconnect();
+    }
+
+    // Scroll back to top
+    window.scrollTo(0, 0);
+    return {rounds: rounds, stoppedBy: stoppedBy};
+}
+"""
+
+# Page-side registry of element refs ("e42"). An element keeps its ref for the
+# lifetime of the document, so refs stay stable across get_page_content calls.
+# Injected into the scripts that hand out refs; resolved by the "ref" selector engine.
+REF_REGISTRY_JS = r"""
+    const refs = window.__agentRefs || (window.__agentRefs = {next: 1, byElement: new WeakMap(), byRef: new Map()});
+    function refFor(el) {
+        let ref = refs.byElement.get(el);
+        if (!ref) {
+            ref = `e${refs.next++}`;
+            refs.byElement.set(el, ref);
+            refs.byRef.set(ref, new WeakRef(el));
+        }
+        return ref;
+    }
+"""
+
+# Playwright selector engine: "ref=e42" is a Map lookup instead of a DOM scan
+REF_SELECTOR_ENGINE_JS = r"""
+({
+    query(root, ref) {
+        const entry = window.__agentRefs && window.__agentRefs.byRef.get(ref.trim());
+        const el = entry && entry.deref();
+        return el && el.isConnected && root.contains(el) ? el : null;
+    },
+    queryAll(root, ref) {
+        const el = this.query(root, ref);
+        return el ? [el] : [];
+    }
+})
+"""
+
+# Hands out a ref for an element resolved by a selector (used for selector-cache hits)
+REF_FOR_ELEMENT_JS = r"""
+(el) => {
+""" + REF_REGISTRY_JS + r"""
+    return refFor(el);
+}
+"""
+
+# Page-structure fingerprint: path template + the set of landmarks and named
+# controls. A set, not counts, so a longer list of emails keeps the same print.
+PAGE_FINGERPRINT_JS = r"""
+() => {
+    const signatures = new Set();
+    const path = location.pathname.replace(/[0-9a-f]{16,}/gi, ':h').replace(/\d+/g, ':n');
+    const stable = value => value && !/\d{3,}|^:/.test(value) ? value : '';
+    document.querySelectorAll(
+        'header, nav, main, aside, footer, form, dialog, [role="main"], [role="navigation"], [role="search"], ' +
+        '[role="dialog"], button, input, select, textarea, [data-testid]'
+    ).forEach(el => {
+        if (signatures.size >= 500) return;
+        const id = stable(el.id);
+        const testid = stable(el.getAttribute('data-testid'));
+        const name = stable(el.getAttribute('name'));
+        const role = el.getAttribute('role') || '';
+        signatures.add(`${el.tagName}${id ? '#' + id : ''}${testid ? '@' + testid : ''}${name ? '~' + name : ''}${role ? ':' + role : ''}`);
+    });
+
+    // FNV-1a over the sorted signatures
+    let hash = 0x811c9dc5;
+    const text = location.host + path + '|' + [...signatures].sort().join(',');
+    for (let i = 0; i < text.length; i++) {
+        hash ^= text.charCodeAt(i);
+        hash = Math.imul(hash, 0x01000193) >>> 0;
+    }
+    return hash.toString(16).padStart(8, '0');
+}
+"""
+
+# Selector that survives a reload: data-testid, a non-generated id, aria-label or
+# name. Empty when the element has none. Injected into scripts that need it.
+DURABLE_SELECTOR_JS = r"""
+    function durableSelector(el) {
+        const tag = el.tagName.toLowerCase();
+        const testid = el.getAttribute('data-testid');
+        if (testid) return `[data-testid="${CSS.escape(testid)}"]`;
+        if (el.id && !el.id.startsWith(':') && !/\d{3,}/.test(el.id)) return `#${CSS.escape(el.id)}`;  // skip generated ids
+        const ariaLabel = el.getAttribute('aria-label');
+        if (ariaLabel) return `${tag}[aria-label="${CSS.escape(ariaLabel)}"]`;
+        const name = el.getAttribute('name');
+        if (name) return `${tag}[name="${CSS.escape(name)}"]`;
+        return '';
+    }
+"""
+
+# Selector for replaying an action on a fresh load of the same page: the durable
+# selector, else the element's nth-of-type path from <body>. Replay only runs a
+# step when the page fingerprint matches, so the path usually still resolves.
+REPLAY_SELECTOR_JS = r"""
+(el) => {
+""" + DURABLE_SELECTOR_JS + r"""
+    const durable = durableSelector(el);
+    if (durable && document.querySelectorAll(durable).length === 1) return durable;
+    const path = [];
+    for (let node = el; node && node !== document.body && node.parentElement; node = node.parentElement) {
+        const tag = node.tagName.toLowerCase();
+        const sameTag = [...node.parentElement.children].filter(child => child.tagName === node.tagName);
+        path.unshift(sameTag.length > 1 ? `${tag}:nth-of-type(${sameTag.indexOf(node) + 1})` : tag);
+    }
+    return path.length ? 'css=body > ' + path.join(' > ') : 'css=body';
+}
+"""
+
+REF_PATTERN = re.compile(r"^(?:ref=)?\[?(e\d+)\]?$")
+
+
+async def register_selector_engines(playwright) -> None:
+    """Register the "ref" selector engine. Must run before any page is created."""
+    await playwright.selectors.register("ref", REF_SELECTOR_ENGINE_JS)
+
+
+async def page_fingerprint(page: Page) -> str:
+    """Short hash of the page structure (see PAGE_FINGERPRINT_JS)."""
+    return await page.evaluate(PAGE_FINGERPRINT_JS)
+
+
+def _domain(url: str) -> str:
+    return urlparse(url).hostname or ""
+
+
+def _confirm_selector(state: ToolState, selector: str) -> None:
+    """A find_element ref was used successfully: remember its durable selector."""
+    if selector.startswith("ref="):
+        match = state.pending_selectors.pop(selector[4:], None)
+        if match:
+            selector_cache.store(*match)
+
+
+def _resolve(selector: str) -> str:
+    """Turn an element ref ("e42", "[e42]", "ref=e42") into a ref= selector; pass anything else through."""
+    match = REF_PATTERN.match(selector.strip())
+    return f"ref={match.group(1)}" if match else selector
+
+
+async def replay_selector(page: Page, selector: str) -> str:
+    """Selector for replaying an action later: refs die with the document, so swap them for a DOM selector."""
+    selector = _resolve(selector)
+    if not selector.startswith("ref="):
+        return selector
+    try:
+        return await page.locator(selector).evaluate(REPLAY_SELECTOR_JS, timeout=2000)
+    except Exception:
+        return selector  # element already gone; replay will stop at this step
+
+
+# Password, one-time-code and card fields: what is typed into them must never be written to disk
+SECRET_FIELD_JS = r"""
+el => el.type === 'password' || /password|one-time-code|cc-/i.test(el.getAttribute('autocomplete') || '')
+"""
+
+
+# Stands in for text typed into password/OTP/card fields wherever it would be saved
+REDACTED = "<redacted>"
+
+
+async def is_secret_field(page: Page, selector: str) -> bool:
+    """Whether the field is a password/OTP/card input. Unknown (element gone) counts as secret."""
+    try:
+        return await page.locator(_resolve(selector)).first.evaluate(SECRET_FIELD_JS, timeout=2000)
+    except Exception:
+        return True
+
+
+async def redact_secret_inputs(page: Page, tool_input: dict) -> dict:
+    """Copy of a tool input with text for secret fields redacted, in forms and macros too."""
+    tool_input = dict(tool_input)
+    if tool_input.get("text") and tool_input.get("selector") and await is_secret_field(page, str(tool_input["selector"])):
+        tool_input["text"] = REDACTED
+    if tool_input.get("fields"):
+        tool_input["fields"] = [
+            {**field, "value": REDACTED}
+            if field.get("value") and await is_secret_field(page, str(field.get("selector", ""))) else field
+            for field in tool_input["fields"]
+        ]
+    if tool_input.get("actions"):
+        tool_input["actions"] = [
+            {**action, "input": await redact_secret_inputs(page, action.get("input") or {})}
+            for action in tool_input["actions"]
+        ]
+    return tool_input
+
+
+def redact_secrets(value, secrets):
+    """`value` (str/list/dict) with every secret typed so far replaced by REDACTED."""
+    if isinstance(value, dict):
+        return {k: redact_secrets(v, secrets) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact_secrets(v, secrets) for v in value]
+    if isinstance(value, str):
+        for secret in secrets:
+            # Short secrets (a PIN) only as a whole value: "12" would be masked in every number
+            if value == secret or (len(secret) >= 4 and secret in value):
+                value = value.replace(secret, REDACTED)
+    return value
+
+
+# Extracts a structured snapshot of the page in one DOM pass: {url, title, headings, interactive, blocks, text}
+# Interactive elements are tagged with refs that click/type_text/... accept directly.
+EXTRACT_PAGE_JS = r"""
+(limits) => {
+""" + REF_REGISTRY_JS + r"""
+    // Single TreeWalker pass: every visible element is classified once,
+    // hidden subtrees are skipped whole, and section caps stop the walk early.
+    const LIMITS = Object.assign({headings: 20, interactive: 100, blocks: 80, text: 50}, limits || {});
+    const SLACK = 1.5;  // blocks/text lose duplicates of headings/links at the end, so collect a bit more
+    const INTERACTIVE = 'button, a[href], input, select, textarea, [role="button"], [role="link"]';
+    const BLOCK = 'article, [class*="card"], [class*="item"], [class*="vacancy"], [class*="product"], [class*="email"], [class*="letter"], li';
+    const OTHER_TAGS = new Set(['P', 'SPAN', 'DIV', 'TD', 'LABEL']);
+    const SKIP_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'IFRAME', 'svg', 'SVG']);
+    const MAX_CHILDREN = 30;        // bigger containers can't produce a short text
+    const MAX_TEXT_CONTENT = 1500;  // cheap textContent check before the costly innerText
+
+    // Helper: clean and validate text
+    function cleanText(text) {
+        if (!text) return null;
+        text = text.trim().replace(/\s+/g, ' ');
+
+        // Filter garbage
+        if (text.length < 3) return null;
+        if (text.length > 300) return null;
+        if (/^[\d\s\.,;:!?()\[\]{}\\/\|\-\+•·×]+$/.test(text)) return null;
+        return text;
+    }
+
+    // innerText forces layout-aware serialization: only read it for small subtrees
+    function boundedText(el) {
+        if (el.childElementCount > MAX_CHILDREN) return null;
+        if (el.textContent.length > MAX_TEXT_CONTENT) return null;
+        return cleanText(el.innerText);
+    }
+
+    // Style is computed once for the document; checkVisibility() then avoids a layout per element
+    function isHidden(el) {
+        const hasBox = el.checkVisibility ? el.checkVisibility() : el.getClientRects().length > 0;
+        return !hasBox && getComputedStyle(el).display !== 'contents';
+    }
+
+    // [text, line, page section, document order]; a line may be a function so refs
+    // are only handed out to items that are kept
+    const found = {headings: [], interactive: [], blocks: [], text: []};
+    const seen = {headings: new Set(), interactive: new Set(), blocks: new Set(), text: new Set()};
+    const SLACKS = {headings: 1, interactive: 1, blocks: SLACK, text: SLACK};
+    const full = (section) => found[section].length >= LIMITS[section] * SLACKS[section];
+    // A section overflows when an item comes after it is full, i.e. one was really dropped;
+    // after that its candidates aren't even checked
+    const overflow = {headings: false, interactive: false, blocks: false, text: false};
+
+    // Page sections: [level, title] of every h1-h3 in document order, for the page store outline
+    const titles = [[0, '(top of page)']];
+    let current = 0, order = 0;
+
+    function add(section, text, line, key = text) {
+        if (seen[section].has(key)) return;
+        if (full(section)) {
+            overflow[section] = true;
+            return;
+        }
+        seen[section].add(key);
+        found[section].push([text, line, current, order++]);
+    }
+
+    const root = document.body || document.documentElement;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT, {
+        acceptNode(el) {
+            if (SKIP_TAGS.has(el.tagName)) return NodeFilter.FILTER_REJECT;
+            if (isHidden(el)) return NodeFilter.FILTER_REJECT;  // whole subtree
+            return NodeFilter.FILTER_ACCEPT;
+        }
+    });
+
+    let el;
+    while ((el = walker.nextNode())) {
+        const tag = el.tagName;
+
+        // 1. MAIN HEADINGS (h1-h3), each one starts a page section
+        if (tag === 'H1' || tag === 'H2' || tag === 'H3') {
+            const text = cleanText(el.innerText);
+            if (text) {
+                titles.push([Number(tag[1]), text]);
+                current = titles.length - 1;
+                if (!overflow.headings) add('headings', text, `[${tag}] ${text}`);
+            }
+        }
+
+        // 2. INTERACTIVE ELEMENTS (buttons, links, inputs)
+        if (!overflow.interactive && el.matches(INTERACTIVE)) {
+            // Icon-only controls ("×", "🔍") fall back to their aria-label/placeholder/value
+            const text = cleanText(el.innerText) || cleanText(el.getAttribute('aria-label')) ||
+                cleanText(el.getAttribute('placeholder')) || cleanText(el.getAttribute('value'));
+            if (text) {
+                const target = el;
+                const type = el.getAttribute('type') || '';
+                const id = el.id ? `#${el.id}` : '';
+                const name = el.getAttribute('name') ? `[name=${el.getAttribute('name')}]` : '';
+                // Keyed by element: two "Add to cart" buttons are two different targets
+                add('interactive', text, () => `[${refFor(target)}] <${tag.toLowerCase()}${type ? ` type=${type}` : ''}${id}${name}> ${text}`, target);
+            }
+        }
+
+        // 3. IMPORTANT CONTENT BLOCKS (articles, cards, list items)
+        if (!overflow.blocks && el.matches(BLOCK) && !el.closest('nav, header, footer')) {
+            const text = boundedText(el);
+            if (text && text.length > 15 && text.length < 250) add('blocks', text, text);
+        }
+
+        // 4. VISIBLE TEXT (fallback - all other visible text)
+        if (OTHER_TAGS.has(tag) && !overflow.text) {
+            const text = boundedText(el);
+            if (text && text.length > 10 && !el.querySelector('button, a, input')) add('text', text, text);
+        }
+
+        if (overflow.headings && overflow.interactive && overflow.blocks && overflow.text) break;
+    }
+
+    // Cross-section dedup in priority order: headings > interactive > blocks > text.
+    // A section is truncated if the walk or the final cut dropped an item of it.
+    const claimed = new Set();
+    const places = {};
+    const truncated = {};
+    const take = (section) => {
+        const unclaimed = found[section].filter(([text]) => !claimed.has(text));
+        if (overflow[section] || unclaimed.length > LIMITS[section]) truncated[section] = LIMITS[section];
+        const kept = unclaimed.slice(0, LIMITS[section]);
+        kept.forEach(([text]) => claimed.add(text));
+        places[section] = kept.map(([, , sectionIndex, position]) => [sectionIndex, position]);
+        return kept.map(([, line]) => typeof line === 'function' ? line() : line);
+    };
+
+    return {
+        url: window.location.href,
+        title: document.title,
+        headings: take('headings'),
+        interactive: take('interactive'),
+        blocks: take('blocks'),
+        text: take('text'),
+        sections: titles,
+        places: places,
+        truncated: truncated,
+    };
+}
+"""
+
+# Snapshot sections, in output order
+SNAPSHOT_SECTIONS = [
+    ("headings", "HEADINGS"),
+    ("interactive", "INTERACTIVE ELEMENTS"),
+    ("blocks", "CONTENT BLOCKS"),
+    ("text", "OTHER TEXT"),
+]
+
+
+def _format_snapshot(snapshot: dict, terms: dict[str, float], store: Optional[PageStore] = None) -> str:
+    """
+    Snapshot as text; over PAGE_CONTENT_TOKEN_BUDGET only the items most
+    relevant to `terms` are kept, after an outline of the store's sections
+    that takes at most PAGE_OUTLINE_TOKEN_SHARE of the budget.
+    """
+    sections = {title: snapshot.get(key) or [] for key, title in SNAPSHOT_SECTIONS}
+    lines = [f"URL: {snapshot['url']}", f"TITLE: {snapshot['title']}", "---"]
+    # Items are ranked once: the outline's share comes off the budget before ranking
+    over_budget = sum(estimate_tokens(item) + 1 for items in sections.values() for item in items) > PAGE_CONTENT_TOKEN_BUDGET
+    outline = store.outline(budget_tokens=int(PAGE_CONTENT_TOKEN_BUDGET * PAGE_OUTLINE_TOKEN_SHARE)) if over_budget and store else ""
+    kept, omitted = rank_items(sections, terms, PAGE_CONTENT_TOKEN_BUDGET - estimate_tokens(outline) if outline else PAGE_CONTENT_TOKEN_BUDGET)
+    if outline:
+        lines.append(f"PAGE SECTIONS ({store.item_count} items stored; get_page_section(id) reads one, "
+                     f"search_page(query) searches all):")
+        lines.append(outline)
+        lines.append("---")
+    for key, title in SNAPSHOT_SECTIONS:
+        items = kept[title]
+        if items:
+            lines.append(f"{title}:")
+            lines.extend(f"• {item}" if key == "blocks" else item for item in items)
+            lines.append("---")
+    if omitted:
+        lines.append(format_omitted(omitted, {title: len(items) for title, items in sections.items()}, terms))
+    return "\n".join(lines[:-1] if lines[-1] == "---" else lines)
+
+
+def _format_scroll_report(scrolled: dict) -> str:
+    rounds = scrolled["rounds"]
+    loaded = ", ".join(f"+{r['nodes']}" for r in rounds)
+    return f"(lazy-load: {len(rounds)} scroll rounds, new nodes per round: {loaded or 'none'}; stopped: {scrolled['stoppedBy']})"
+
+
+def _diff_snapshots(old: dict, new: dict, since_step: int, terms: dict[str, float]) -> str:
+    """Added/removed items per section between two snapshots of the same URL, ranked like _format_snapshot."""
+    lines = [f"URL: {new['url']}", f"TITLE: {new['title']}"]
+    if old["title"] != new["title"]:
+        lines.append(f"(title was: {old['title']})")
+    # Added items outrank removed ones: the agent acts on what is on the page now
+    sections = {}
+    for key, title in SNAPSHOT_SECTIONS:
+        old_set = set(old.get(key) or [])
+        sections[f"{title} added"] = [item for item in new.get(key) or [] if item not in old_set]
+    for key, title in SNAPSHOT_SECTIONS:
+        new_set = set(new.get(key) or [])
+        sections[f"{title} removed"] = [item for item in old.get(key) or [] if item not in new_set]
+    kept, omitted = rank_items(sections, terms, PAGE_CONTENT_TOKEN_BUDGET)
+
+    changed = False
+    for key, title in SNAPSHOT_SECTIONS:
+        added, removed = sections[f"{title} added"], sections[f"{title} removed"]
+        if not added and not removed:
+            continue
+        changed = True
+        lines.append("---")
+        lines.append(f"{title}: +{len(added)} / -{len(removed)}")
+        lines.extend(f"+ {item}" for item in kept[f"{title} added"])
+        lines.extend(f"- {item}" for item in kept[f"{title} removed"])
+    if not changed:
+        lines.append(f"--- unchanged since step {since_step}")
+    elif omitted:
+        lines.append("---")
+        lines.append(format_omitted(omitted, {title: len(items) for title, items in sections.items()}, terms))
+    return "\n".join(lines)
+
+
+async def get_page_content(
+    scroll_to_load: Annotated[bool, "Whether to scroll page to trigger lazy loading (default: True)"] = True,
+    diff: Annotated[bool, "Return only what changed since the last get_page_content of this URL in this tab"] = False,
+    max_scroll_rounds: Annotated[int, "Scroll budget for lazy loading; raise it for infinite feeds"] = SCROLL_MAX_ROUNDS
 ) -> str:
     """
     CRITICAL: Intelligent full-page content extraction. Returns structured text from ENTIRE page.
 
     Features:
-    - Triggers lazy loading by scrolling to bottom
+    - Triggers lazy loading by scrolling, moving on as soon as nothing new loads
     - Captures dynamically loaded content
     - Returns hierarchical structure (sections with headings)
-    - Token-optimized: semantic filtering, deduplication, length limits
+    - Token-optimized: semantic filtering, deduplication; on large pages keeps the
+      items most relevant to the task and recent actions, plus an outline of page
+      sections; the full extraction stays in memory for search_page/get_page_section
     - Works on Russian SPAs
+    - diff=True: only added/removed items since the previous snapshot of the same tab and URL
 
     Use this as PRIMARY tool for understanding any page.
     """
+    state = current_state()
+    page = state.page
     try:
         # Step 1: Trigger lazy loading if needed
+        scroll_report = ""
         if scroll_to_load:
-            page.evaluate(r"""
-                async () => {
-                    // Scroll to bottom in chunks to trigger lazy loading
-                    const scrollStep = window.innerHeight * 0.8;
-                    const scrollDelay = 300;
-                    let currentPos = 0;
-                    const maxHeight = Math.min(document.body.scrollHeight, window.innerHeight * 5); // Max 5 viewports
-
-                    while (currentPos < maxHeight) {
-                        window.scrollTo(0, currentPos);
-                        await new Promise(resolve => setTimeout(resolve, scrollDelay));
-                        currentPos += scrollStep;
-                    }
-
-                    // Scroll back to top
-                    window.scrollTo(0, 0);
-                    await new Promise(resolve => setTimeout(resolve, 200));
-                }
-            """)
-            page.wait_for_timeout(500)  # Let content stabilize
+            scrolled = await page.evaluate(SCROLL_TO_LOAD_JS, {
+                "maxRounds": max(1, max_scroll_rounds),
+                "quietMs": SCROLL_QUIET_MS,
+                "maxWaitMs": SCROLL_MAX_WAIT_MS,
+            })
+            scroll_report = _format_scroll_report(scrolled)
 
         # Step 2: Extract structured content
-        result = page.evaluate(r"""
-            () => {
-                const sections = [];
-                const seenTexts = new Set();
-
-                // Helper: clean and validate text
-                function cleanText(text) {
-                    if (!text) return null;
-                    text = text.trim().replace(/\s+/g, ' ');
-
-                    // Filter garbage
-                    if (text.length < 3) return null;
-                    if (text.length > 300) return null;
-                    if (/^[\d\s\.,;:!?()\[\]{}\\/\|\-\+•·×]+$/.test(text)) return null;
-                    if (seenTexts.has(text)) return null;
-
-                    seenTexts.add(text);
-                    return text;
-                }
-
-                // 1. PAGE TITLE AND URL
-                sections.push(`URL: ${window.location.href}`);
-                sections.push(`TITLE: ${document.title}`);
-                sections.push('---');
-
-                // 2. MAIN HEADINGS (h1-h3)
-                const headings = [];
-                document.querySelectorAll('h1, h2, h3').forEach(h => {
-                    const text = cleanText(h.innerText);
-                    if (text) headings.push(`[${h.tagName}] ${text}`);
-                });
-                if (headings.length > 0) {
-                    sections.push('HEADINGS:');
-                    sections.push(...headings.slice(0, 20));
-                    sections.push('---');
-                }
-
-                // 3. INTERACTIVE ELEMENTS (buttons, links, inputs)
-                const interactive = [];
-                document.querySelectorAll('button, a[href], input, select, textarea, [role="button"], [role="link"]').forEach(el => {
-                    if (!el.offsetParent && el.tagName !== 'INPUT') return; // Skip hidden (except inputs)
-
-                    let text = cleanText(el.innerText || el.getAttribute('aria-label') || el.getAttribute('placeholder') || el.getAttribute('value'));
-                    if (!text) return;
-
-                    const tag = el.tagName.toLowerCase();
-                    const type = el.getAttribute('type') || '';
-                    const id = el.id ? `#${el.id}` : '';
-                    const name = el.getAttribute('name') ? `[name=${el.getAttribute('name')}]` : '';
-
-                    interactive.push(`<${tag}${type ? ` type=${type}` : ''}${id}${name}> ${text}`);
-                });
-                if (interactive.length > 0) {
-                    sections.push('INTERACTIVE ELEMENTS:');
-                    sections.push(...interactive.slice(0, 100));
-                    sections.push('---');
-                }
-
-                // 4. IMPORTANT CONTENT BLOCKS (articles, cards, list items)
-                const contentBlocks = [];
-                document.querySelectorAll('article, [class*="card"], [class*="item"], [class*="vacancy"], [class*="product"], [class*="email"], [class*="letter"], li').forEach(el => {
-                    if (!el.offsetParent) return; // Skip hidden
-                    if (el.closest('nav, header, footer')) return; // Skip navigation
+        snapshot = await page.evaluate(EXTRACT_PAGE_JS, PAGE_EXTRACT_LIMITS)
+        terms = query_terms(state.task, state.recent_inputs)
+
+        key = (id(page), snapshot["url"])
+        previous = state.snapshots.get(key)
+        state.snapshots[key] = (state.step, snapshot)
+        store = PageStore(snapshot, state.step)
+        state.page_stores[id(page)] = store
+
+        if diff and previous:
+            since_step, old_snapshot = previous
+            result = _diff_snapshots(old_snapshot, snapshot, since_step, terms)
+            header = f"=== PAGE CONTENT (CHANGES SINCE STEP {since_step}) ==="
+        else:
+            if not any(snapshot.get(k) for k, _ in SNAPSHOT_SECTIONS):
+                return "No content found. Page may be empty or still loading."
+            result = _format_snapshot(snapshot, terms, store)
+            header = "=== PAGE CONTENT (FULL PAGE, TOKEN-OPTIMIZED) ==="
+            if diff:
+                header += "\n(no earlier snapshot of this URL in this tab - full content)"
 
-                    const text = cleanText(el.innerText);
-                    if (text && text.length > 15 && text.length < 250) {
-                        contentBlocks.push(`• ${text}`);
-                    }
-                });
-                if (contentBlocks.length > 0) {
-                    sections.push('CONTENT BLOCKS:');
-                    sections.push(...contentBlocks.slice(0, 80));
-                    sections.push('---');
-                }
+        if scroll_report:
+            header += f"\n{scroll_report}"
+        return f"{header}\n{result}\n=== END ==="
 
-                // 5. VISIBLE TEXT (fallback - all other visible text)
-                const otherText = [];
-                document.querySelectorAll('p, span, div, td, label').forEach(el => {
-                    if (!el.offsetParent) return;
-                    if (el.querySelector('button, a, input')) return; // Skip containers
+    except Exception as e:
+        return f"Error in get_page_content: {str(e)}"
 
-                    const text = cleanText(el.innerText);
-                    if (text && text.length > 10 && otherText.length < 50) {
-                        otherText.push(text);
-                    }
-                });
-                if (otherText.length > 0) {
-                    sections.push('OTHER TEXT:');
-                    sections.push(...otherText);
-                }
 
-                return sections.join('\n');
-            }
-        """)
+def _page_store(state: ToolState) -> tuple[Optional[PageStore], str]:
+    """The tab's stored extraction and a note if the tab has moved on since."""
+    store = state.page_stores.get(id(state.page))
+    if store is None:
+        return None, ""
+    url = state.page.url
+    stale = f"\n(stored content is of {store.url}; the tab is now at {url} - call get_page_content to refresh)" if url != store.url else ""
+    return store, stale
 
-        if not result.strip():
-            return "No content found. Page may be empty or still loading."
 
-        # Truncate if too long (should rarely happen with filtering above)
-        if len(result) > 12000:
-            result = result[:12000] + "\n\n... [TRUNCATED - page is very large]"
+async def search_page(
+    query: Annotated[str, "Words to look for, e.g. 'python remote' or 'order 4321'"],
+    top_k: Annotated[int, "Number of matches to return"] = SEARCH_PAGE_RESULTS
+) -> str:
+    """Search everything the last get_page_content of this tab extracted, without touching the DOM."""
+    state = current_state()
+    store, stale = _page_store(state)
+    if store is None:
+        return "Error: no stored page content for this tab - call get_page_content first"
+    matches = store.search(query)
+    if not matches:
+        return f"No matches for '{query}' among {store.item_count} items stored at step {store.step}{store.truncation_note()}{stale}"
+
+    shown, left = [], PAGE_SECTION_TOKEN_BUDGET
+    for section_id, index, line in matches[:max(1, top_k)]:
+        line = f"[{section_id} #{index}] {line}"
+        left -= estimate_tokens(line) + 1
+        if left < 0 and shown:
+            break
+        shown.append(line)
+    header = f"search_page: {len(matches)} matches for '{query}', showing {len(shown)} (content from step {store.step})"
+    return "\n".join([header + store.truncation_note() + stale] + shown)
+
+
+async def get_page_section(
+    section_id: Annotated[str, "Section ID from the get_page_content outline, e.g. s3"],
+    offset: Annotated[int, "Index of the first item to return (for paging through long sections)"] = 0
+) -> str:
+    """Read one section of the last get_page_content extraction of this tab, from memory."""
+    state = current_state()
+    store, stale = _page_store(state)
+    if store is None:
+        return "Error: no stored page content for this tab - call get_page_content first"
+    return store.read_section(section_id, offset, PAGE_SECTION_TOKEN_BUDGET) + store.truncation_note() + stale
 
-        return f"=== PAGE CONTENT (FULL PAGE, TOKEN-OPTIMIZED) ===\n{result}\n=== END ==="
+SCREENSHOT_THUMB_TOLERANCE = 8  # max brightness change of any 16x16 thumbnail cell
 
-    except Exception as e:
-        return f"Error in get_page_content: {str(e)}"
 
-def take_screenshot() -> str:
+def _image_hash(image) -> tuple[int, bytes]:
+    """
+    Perceptual hash: a 64-bit difference hash (layout/edges) plus a 16x16
+    grayscale thumbnail, which catches same-shape changes such as a button
+    changing color that the dHash alone would miss.
+    """
+    gray = image.convert("L")
+    pixels = list(gray.resize((9, 8), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits, gray.resize((16, 16), Image.BOX).tobytes()
+
+
+def _same_image(a: tuple[int, bytes], b: tuple[int, bytes], max_distance: int) -> bool:
+    if bin(a[0] ^ b[0]).count("1") > max_distance:
+        return False
+    return all(abs(x - y) <= SCREENSHOT_THUMB_TOLERANCE for x, y in zip(a[1], b[1]))
+
+
+def _encode_screenshot(png: bytes) -> tuple[bytes, str, tuple[int, bytes]]:
+    """Downscale and re-encode a PNG capture with Pillow. Returns (bytes, media type, perceptual hash)."""
+    image = Image.open(io.BytesIO(png)).convert("RGB")
+    if SCREENSHOT_MAX_WIDTH and image.width > SCREENSHOT_MAX_WIDTH:
+        height = round(image.height * SCREENSHOT_MAX_WIDTH / image.width)
+        image = image.resize((SCREENSHOT_MAX_WIDTH, height), Image.LANCZOS)
+
+    out = io.BytesIO()
+    fmt = SCREENSHOT_FORMAT.lower()
+    if fmt == "png":
+        image.save(out, "PNG", optimize=True)
+    elif fmt == "webp":
+        image.save(out, "WEBP", quality=SCREENSHOT_QUALITY, method=4)
+    else:
+        fmt = "jpeg"
+        image.save(out, "JPEG", quality=SCREENSHOT_QUALITY, optimize=True)
+    return out.getvalue(), f"image/{fmt}", _image_hash(image)
+
+
+async def take_screenshot(
+    selector: Annotated[Optional[str], "Element ref or selector to capture only that element"] = None,
+    region: Annotated[Optional[dict], "Viewport region {x, y, width, height} in CSS pixels"] = None,
+    force: Annotated[bool, "Send the image even if it looks identical to an earlier one"] = False,
+) -> str:
     """
-    Takes a screenshot of the current page and returns base64 encoded image.
-    This allows Claude to visually understand the page layout.
+    Takes a screenshot of the current page (or one element / region) and returns
+    it as a base64 data URL. This allows Claude to visually understand the page layout.
     """
+    state = current_state()
+    page = state.page
     try:
-        screenshot_bytes = page.screenshot(full_page=False)  # libo mozhno vmesto viewport: Fullpage: full_page=True, type="png"
+        if Image is not None:
+            options = {"type": "png"}  # lossless source, re-encoded below
+        elif SCREENSHOT_FORMAT.lower() == "png":
+            options = {"type": "png"}
+        else:
+            options = {"type": "jpeg", "quality": SCREENSHOT_QUALITY}  # no WebP without Pillow
+
+        # Text mode blocks images; let them load for the capture
+        async with state.resources.images_allowed(page) if state.resources else nullcontext():
+            if selector:
+                screenshot_bytes = await page.locator(_resolve(selector)).first.screenshot(scale="css", timeout=5000, **options)
+            else:
+                clip = {key: float(region[key]) for key in ("x", "y", "width", "height")} if region else None
+                screenshot_bytes = await page.screenshot(full_page=False, clip=clip, scale="css", **options)
+
+        if Image is not None:
+            screenshot_bytes, media_type, image_hash = await asyncio.to_thread(_encode_screenshot, screenshot_bytes)
+            max_distance = SCREENSHOT_DEDUP_DISTANCE
+        else:
+            media_type = f"image/{options['type']}"
+            image_hash = (int(hashlib.sha1(screenshot_bytes).hexdigest()[:16], 16), b"")  # exact repeats only
+            max_distance = 0
+
+        # Same view as an earlier shot: don't pay for the image again
+        crop = (selector, json.dumps(region, sort_keys=True) if region else None)
+        if not force:
+            for step, shot_crop, shot_hash in state.screenshots:
+                if shot_crop == crop and _same_image(image_hash, shot_hash, max_distance):
+                    return (f"Screenshot identical to the one taken at step {step} (nothing visible changed). "
+                            "If that image is no longer in your context, call take_screenshot(force=true).")
+        state.screenshots.append((state.step, crop, image_hash))
+
         screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
-        return f"data:image/png;base64,{screenshot_base64}"
+        return f"data:{media_type};base64,{screenshot_base64}"
     except Exception as e:
         return f"Error taking screenshot: {str(e)}"
 
-def find_element(description: Annotated[str, "Natural language description of the element"]) -> str:
-    try:
-        result = page.evaluate("""
-            (desc) => {
-                const query = desc.toLowerCase().trim();
-                const words = query.split(' ').filter(w => w.length > 2);
-                const candidates = [];
-
-
-                document.querySelectorAll('a, button, div, span, [role="button"], [role="link"], [role="checkbox"], [data-tooltip], [aria-label], [title], [id^=":"]')
-                .forEach(el => {
-                    if (!el.offsetParent && el.tagName !== 'INPUT') return;
-
-                    const texts = [
-                        el.innerText,
-                        el.textContent,
-                        el.getAttribute('aria-label'),
-                        el.getAttribute('title'),
-                        el.getAttribute('data-tooltip'),
-                        el.getAttribute('alt'),
-                        el.getAttribute('placeholder'),
-                        el.id
-                    ].filter(Boolean).map(t => t?.toLowerCase().trim()).filter(Boolean);
-
-                    let bestScore = 0;
-                    let bestText = '';
-
-                    for (let text of texts) {
-                        if (!text) continue;
-
-                        let score = 0;
-
-                        // Полное совпадение
-                        if (text === query) score += 100;
-
-                        // Все слова из запроса есть
-                        const matched = words.filter(w => text.includes(w)).length;
-                        if (matched === words.length && words.length >= 2) score += 50;
-
-                        // Частичное совпадение
-                        for (let word of words) {
-                            if (text.includes(word)) score += 15;
-                        }
-
-                        // Бонус за короткий текст
-                        if (text.length < 60) score += 10;
-
-                        if (score > bestScore) {
-                            bestScore = score;
-                            bestText = text;
-                        }
-                    }
+# Ranked element search. An inverted token index over visible candidate elements
+# is built once per DOM version (window.__agentIndex) and marked dirty by a
+# MutationObserver, so repeated searches on an unchanged page only score postings.
+# Ranking is BM25 with label fields weighted up, a coverage/phrase/interactivity
+# boost, and a penalty for elements that merely contain a better match.
+FIND_ELEMENT_JS = r"""
+({query, k}) => {
+""" + REF_REGISTRY_JS + r"""
+    const CANDIDATES = 'a, button, input, select, textarea, label, summary, li, h1, h2, h3, h4, span, div, td, ' +
+        '[role], [data-tooltip], [aria-label], [title], [placeholder], [data-testid], [onclick], [tabindex]';
+    const INTERACTIVE = 'a[href], button, input, select, textarea, summary, [onclick], [contenteditable="true"], ' +
+        '[role="button"], [role="link"], [role="checkbox"], [role="menuitem"], [role="tab"], [role="option"], [role="switch"]';
+    const LABEL_ATTRS = ['aria-label', 'title', 'data-tooltip', 'alt', 'placeholder'];
+    const SKIP_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'svg', 'SVG']);
+    const WATCHED_ATTRS = ['class', 'style', 'hidden', 'aria-label', 'title', 'placeholder', 'alt', 'data-tooltip', 'aria-hidden'];
+    const K1 = 1.2, B = 0.75;
+    const POOL = 50;  // candidates considered for the ancestor penalty
+
+    function tokenize(text) {
+        return (text || '').toLowerCase().split(/[^\p{L}\p{N}]+/u).filter(t => t.length > 1);
+    }
 
-                    if (bestScore >= 30) {
-                        let selector = '';
-
-                        if (el.getAttribute('data-testid')) {
-                            selector = `[data-testid="${el.getAttribute('data-testid')}"]`;
-                        } else if (el.id) {
-                            selector = `#${el.id.replace(/:/g, '\\:')}`;  // Экранируем : для CSS
-                        } else if (el.getAttribute('aria-label')) {
-                            selector = `[aria-label*="${el.getAttribute('aria-label')}"]`;
-                        } else {
-                            const clean = bestText.replace(/'/g, "\\'");
-                            selector = `xpath=//*/contains(text(), '${clean}')/parent::*`;
-                        }
-
-                        candidates.push({
-                            score: bestScore,
-                            selector: selector,
-                            text: bestText
-                        });
-                    }
-                });
+    function isHidden(el) {
+        const hasBox = el.checkVisibility ? el.checkVisibility() : el.getClientRects().length > 0;
+        return !hasBox && getComputedStyle(el).display !== 'contents';
+    }
+
+    // Words for the element's kind, so "search field" or "кнопка войти" match on type too
+    function roleWords(el) {
+        const tag = el.tagName;
+        const role = el.getAttribute('role');
+        const type = (el.getAttribute('type') || '').toLowerCase();
+        if (tag === 'A' || role === 'link') return 'link ссылка';
+        if (tag === 'BUTTON' || role === 'button' || type === 'submit' || type === 'button') return 'button кнопка';
+        if (type === 'checkbox' || role === 'checkbox') return 'checkbox флажок';
+        if (tag === 'SELECT' || role === 'listbox' || role === 'combobox') return 'dropdown select список';
+        if (tag === 'INPUT' || tag === 'TEXTAREA' || el.isContentEditable) return 'input field box поле';
+        return '';
+    }
 
-                if (candidates.length === 0) return "NOT_FOUND";
+    function directText(el) {
+        let text = '';
+        for (const node of el.childNodes) {
+            if (node.nodeType === 3) text += node.data + ' ';
+        }
+        return text;
+    }
 
-                candidates.sort((a, b) => b.score - a.score);
-                const best = candidates[0];
-                return `FOUND|${best.selector}|${best.text}|score:${best.score}`;
+    function buildIndex() {
+        const docs = [];
+        const postings = new Map();
+        let totalLen = 0;
+
+        const root = document.body || document.documentElement;
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT, {
+            acceptNode(el) {
+                if (SKIP_TAGS.has(el.tagName)) return NodeFilter.FILTER_REJECT;
+                if (isHidden(el)) return NodeFilter.FILTER_REJECT;
+                return el.matches(CANDIDATES) ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_SKIP;
             }
-        """, description)
+        });
+
+        let el;
+        while ((el = walker.nextNode())) {
+            const interactive = el.matches(INTERACTIVE);
+            let label = LABEL_ATTRS.map(name => el.getAttribute(name)).filter(Boolean).join(' ');
+            if (el.labels) {
+                for (const labelEl of el.labels) label += ' ' + labelEl.textContent;  // <label for=...> of inputs
+            }
+            // Interactive elements own the text of their children (button > span); containers only their own text
+            const text = interactive && el.textContent.length <= 500 ? el.innerText : directText(el);
+
+            const tf = new Map();
+            const addTokens = (str, weight) => tokenize(str).forEach(t => tf.set(t, (tf.get(t) || 0) + weight));
+            addTokens(text, 1);
+            addTokens(label, 2);
+            addTokens(`${el.id} ${el.getAttribute('name') || ''} ${roleWords(el)}`, 0.5);
+            if (tf.size === 0) continue;
+
+            let len = 0;
+            tf.forEach(weight => { len += weight; });
+            const id = docs.length;
+            const shown = (text.trim() || label.trim()).replace(/\s+/g, ' ');
+            docs.push({
+                el: el,
+                len: len,
+                interactive: interactive,
+                shown: shown.slice(0, 100),
+                full: `${text} ${label}`.toLowerCase().replace(/\s+/g, ' '),
+            });
+            tf.forEach((weight, term) => {
+                let list = postings.get(term);
+                if (!list) postings.set(term, list = []);
+                list.push([id, weight]);
+            });
+            totalLen += len;
+        }
+        return {docs: docs, postings: postings, avgLen: totalLen / Math.max(1, docs.length), dirty: false};
+    }
+
+    let index = window.__agentIndex;
+    const rebuilt = !index || index.dirty;
+    if (rebuilt) {
+        index = window.__agentIndex = buildIndex();
+        if (!window.__agentIndexObserver) {
+            window.__agentIndexObserver = new MutationObserver(() => {
+                if (window.__agentIndex) window.__agentIndex.dirty = true;
+            });
+            window.__agentIndexObserver.observe(document.documentElement, {
+                childList: true, subtree: true, characterData: true, attributes: true, attributeFilter: WATCHED_ATTRS,
+            });
+        }
+    }
 
-        if "NOT_FOUND" in result:
+    // Query terms match exact tokens and, for longer words, tokens sharing the stem
+    // (plurals, Russian case endings: "кнопка" ~ "кнопку")
+    function expand(term) {
+        const variants = index.postings.has(term) ? [[term, 1]] : [];
+        if (term.length < 5) return variants;
+        const stem = term.slice(0, term.length - 2);
+        for (const key of index.postings.keys()) {
+            if (key !== term && key.startsWith(stem)) variants.push([key, 0.7]);
+        }
+        return variants;
+    }
+
+    const terms = [...new Set(tokenize(query))];
+    const N = index.docs.length;
+    const hits = new Map();  // doc id -> Map(query term -> best term score)
+
+    terms.forEach((term, qi) => {
+        for (const [key, weight] of expand(term)) {
+            const list = index.postings.get(key);
+            const idf = Math.log(1 + (N - list.length + 0.5) / (list.length + 0.5));
+            for (const [id, tf] of list) {
+                const doc = index.docs[id];
+                const score = weight * idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc.len / index.avgLen));
+                let perTerm = hits.get(id);
+                if (!perTerm) hits.set(id, perTerm = new Map());
+                perTerm.set(qi, Math.max(perTerm.get(qi) || 0, score));
+            }
+        }
+    });
+
+    const phrase = terms.join(' ');
+    let results = [];
+    hits.forEach((perTerm, id) => {
+        const doc = index.docs[id];
+        let score = 0;
+        perTerm.forEach(s => { score += s; });
+        score *= 0.5 + 0.5 * perTerm.size / terms.length;  // coverage of the query
+        if (terms.length > 1 && doc.full.includes(phrase)) score *= 1.5;
+        if (doc.interactive) score *= 1.3;
+        results.push({doc: doc, score: score, matched: perTerm.size});
+    });
+    results.sort((a, b) => b.score - a.score);
+    results = results.slice(0, POOL);
+
+    // Ancestor penalty: of two nested matches, keep the one that is the real target
+    for (const outer of results) {
+        for (const inner of results) {
+            if (outer === inner || inner.matched < outer.matched || !outer.doc.el.contains(inner.doc.el)) continue;
+            if (outer.doc.interactive && !inner.doc.interactive) inner.penalized = true;  // span inside a button
+            else outer.penalized = true;  // container that merely holds the match
+        }
+    }
+    results.forEach(r => { if (r.penalized) r.score *= 0.4; });
+    results.sort((a, b) => b.score - a.score);
+
+""" + DURABLE_SELECTOR_JS + r"""
+    return {
+        rebuilt: rebuilt,
+        indexed: N,
+        results: results.slice(0, k).map(r => ({
+            ref: refFor(r.doc.el),
+            selector: durableSelector(r.doc.el),
+            tag: r.doc.el.tagName.toLowerCase(),
+            text: r.doc.shown,
+            score: Math.round(r.score * 100) / 100,
+        })),
+    };
+}
+"""
+
+
+async def find_element(
+    description: Annotated[str, "Natural language description of the element"],
+    top_k: Annotated[int, "How many ranked candidates to return"] = 3
+) -> str:
+    state = current_state()
+    page = state.page
+    try:
+        # Selector cache first: one locator count instead of a page scan
+        domain = _domain(page.url)
+        fingerprint = await page_fingerprint(page)
+        cached = selector_cache.lookup(domain, fingerprint, description)
+        if cached:
+            locator = page.locator(cached["selector"])
+            if await locator.count() == 1:
+                selector_cache.record_hit(domain, fingerprint, description)
+                ref = await locator.evaluate(REF_FOR_ELEMENT_JS)
+                return (f"Найдено для '{description}' (из кэша селекторов):\n"
+                        f"1. ref: {ref} «{cached['text']}» (селектор: {cached['selector']})")
+            selector_cache.invalidate(domain, fingerprint, description)
+
+        result = await page.evaluate(FIND_ELEMENT_JS, {"query": description, "k": max(1, top_k)})
+
+        if not result["results"]:
             return f"Не найден элемент: '{description}'"
 
-        parts = result.split("|")
-        return f"Найден: «{parts[2]}» → селектор: {parts[1]}"
+        lines = [f"Найдено для '{description}' (лучший первым):"]
+        for i, found in enumerate(result["results"], 1):
+            if found["selector"]:
+                # Cached only once a click/type_text on this ref succeeds
+                state.pending_selectors[found["ref"]] = (domain, fingerprint, description, found["selector"], found["text"])
+            line = f"{i}. ref: {found['ref']} <{found['tag']}> «{found['text']}» score:{found['score']}"
+            if found["selector"]:
+                line += f" (селектор: {found['selector']})"
+            lines.append(line)
+        return "\n".join(lines)
 
     except Exception as e:
         return f"Ошибка find_element: {str(e)}"
 
-def click(selector: Annotated[str, "Любой селектор: text=, xpath=, css, aria-label и т.д."]) -> str:
-    
-    global page  # MUST be at the top before any use of 'page'
+ELEMENT_LABEL_JS = "el => el.innerText || el.getAttribute('aria-label') || el.value || ''"
+
+
+async def click(selector: Annotated[str, "Любой селектор: text=, xpath=, css, aria-label и т.д."]) -> str:
+    state = current_state()
+    page = state.page
 
     try:
         if selector.startswith("text="):
             text = selector[5:].strip().strip('"\'')
             selector = f"xpath=//*/text()[normalize-space()='{text}'']/parent::*"
 
-        if any(kw in selector.lower() for kw in DESTRUCTIVE_KEYWORDS):
-            if input(f"Опасное действие: клик по {selector}. Продолжить? (yes/no): ").lower() != "yes":
+        selector = _resolve(selector)
+        locator = page.locator(selector).first
+
+        # Check what the element says, not only the selector: refs and replayed
+        # durable/nth-of-type selectors say nothing about a "Delete" button
+        label = await locator.evaluate(ELEMENT_LABEL_JS, timeout=5000)
+        if any(kw in f"{selector} {label}".lower() for kw in DESTRUCTIVE_KEYWORDS):
+            if not state.interactive:
+                return f"Отменено: опасное действие ({selector}) требует подтверждения человека, а запуск без оператора"
+            answer = await _ask_human_input(f"Опасное действие: клик по {selector}. Продолжить? (yes/no): ")
+            if answer.lower() != "yes":
                 return "Отменено пользователем"
 
         # Get current context to detect new tabs
@@ -284,128 +1073,276 @@ def click(selector: Annotated[str, "Любой селектор: text=, xpath=,
         current_pages = len(context.pages)
         current_url = page.url
 
-        locator = page.locator(selector).first
-
         # scrolll
-        locator.scroll_into_view_if_needed(timeout=5000)
+        await locator.scroll_into_view_if_needed(timeout=5000)
 
         # awaitin for clicable
-        locator.wait_for(state="visible", timeout=10000)
-        try:
-            locator.click(delay=100, timeout=8000)
-            page.wait_for_timeout(800)
-        except:
+        await locator.wait_for(state="visible", timeout=10000)
+
+        async def do_click():
             try:
-                locator.click(force=True, timeout=6000)
-                page.wait_for_timeout(800)
-            except:
-                page.eval_on_selector(selector, "el => el.click()")
-                page.wait_for_timeout(1000)
+                await locator.click(timeout=8000)
+            except Exception:
+                try:
+                    await locator.click(force=True, timeout=6000)
+                except Exception:
+                    await page.eval_on_selector(selector, "el => el.click()")
+
+        # Waits for navigation / new tab / quiet page instead of fixed sleeps
+        reason, settle_ms = await settle(page, do_click)
+        settled = f"(settled in {settle_ms} ms: {reason})"
+
+        _confirm_selector(state, selector)
 
         # CRITICAL: Check if new tab opened and switch to it
-        page.wait_for_timeout(500)  # Give time for new tab to open
         new_pages = context.pages
 
         if len(new_pages) > current_pages:
             # New tab opened - switch to it
-            page = new_pages[-1]  # Switch to the newest tab
-            page.wait_for_load_state("domcontentloaded", timeout=10000)
-            return f"✅ Клик успешен: {selector}\n🆕 Открылась новая вкладка: {page.url}"
+            page = state.page = new_pages[-1]  # Switch to the newest tab
+            await page.wait_for_load_state("domcontentloaded", timeout=10000)
+            return f"✅ Клик успешен: {selector} {settled}\n🆕 Открылась новая вкладка: {page.url}"
         elif page.url != current_url:
             # Same tab, but navigated
-            page.wait_for_load_state("domcontentloaded", timeout=5000)
-            return f"✅ Клик успешен: {selector}\n➡️ Перешли на: {page.url}"
+            await page.wait_for_load_state("domcontentloaded", timeout=5000)
+            return f"✅ Клик успешен: {selector} {settled}\n➡️ Перешли на: {page.url}"
         else:
             # Click worked but no navigation (popup, dropdown, etc.)
-            return f"✅ Клик успешен: {selector} (страница не изменилась)"
+            return f"✅ Клик успешен: {selector} (страница не изменилась) {settled}"
 
     except Exception as e:
         return f"Все попытки клика провалились: {str(e)}\nПопробуй: take_screenshot()"
 
-def type_text(
+async def type_text(
     selector: Annotated[str, "CSS selector or XPath of the input field"],
     text: Annotated[str, "Text to type into the field"]
 ) -> str:
     """
     Types text into an input field. Clears existing content first.
     """
+    state = current_state()
+    page = state.page
     try:
-        page.fill(selector, "")  # Clear existing text
-        page.type(selector, text, delay=50)  # Human-like typing
+        selector = _resolve(selector)
+        await _enter_text(page, selector, text)
+        _confirm_selector(state, selector)
         return f"Typed '{text}' into {selector}"
     except Exception as e:
         return f"Error typing into '{selector}': {str(e)}"
 
-def press_key(
+
+def _humanized_input(page: Page) -> bool:
+    domain = _domain(page.url)
+    return INPUT_MODE == "human" or any(domain == d or domain.endswith("." + d) for d in HUMAN_INPUT_DOMAINS)
+
+
+async def _enter_text(page: Page, selector: str, text: str) -> None:
+    """Replace the field's value: instantly, or key by key with jitter where a site needs it."""
+    locator = page.locator(selector).first
+    if text and await is_secret_field(page, selector):
+        current_state().secrets.add(text)
+    if not _humanized_input(page):
+        await locator.fill(text, timeout=8000)
+        return
+    await locator.fill("", timeout=8000)  # Clear existing text
+    await locator.focus()
+    low, high = HUMAN_TYPING_DELAY_MS
+    for char in text:
+        await page.keyboard.type(char)
+        await asyncio.sleep(random.uniform(low, high) / 1000)
+
+
+# Field kinds that fill_form sets without typing
+FIELD_KIND_JS = "el => el.tagName === 'SELECT' ? 'select' : (['checkbox', 'radio'].includes(el.type) ? 'check' : 'text')"
+CHECKED_VALUES = {"true", "yes", "on", "1", "checked", "да"}
+# Value of the <select> option whose label (or else value) matches, null if none
+SELECT_OPTION_VALUE_JS = r"""
+(el, wanted) => {
+    const options = [...el.options];
+    const match = options.find(o => o.label.trim() === wanted.trim()) || options.find(o => o.value === wanted);
+    return match ? match.value : null;
+}
+"""
+
+
+async def fill_form(
+    fields: Annotated[list[dict], "Fields to fill: [{'selector': 'e12', 'value': 'John'}, ...]"]
+) -> str:
+    """
+    Fill several form fields in one call. Text inputs get the value, <select>
+    picks the option by label (or value), checkboxes/radios are checked for
+    true/yes/on. Reports the outcome per field; a failed field doesn't stop the rest.
+    """
+    state = current_state()
+    page = state.page
+    lines = []
+    filled = 0
+    for field in fields:
+        selector = _resolve(str(field.get("selector", "")))
+        value = "" if field.get("value") is None else str(field["value"])
+        try:
+            locator = page.locator(selector).first
+            kind = await locator.evaluate(FIELD_KIND_JS, timeout=5000)
+            if kind == "select":
+                option = await locator.evaluate(SELECT_OPTION_VALUE_JS, value, timeout=5000)
+                if option is None:
+                    raise ValueError(f"no option with label or value '{value}'")
+                await locator.select_option(value=option, timeout=5000)
+            elif kind == "check":
+                await locator.set_checked(value.strip().lower() in CHECKED_VALUES, timeout=5000)
+            else:
+                await _enter_text(page, selector, value)
+            _confirm_selector(state, selector)
+            filled += 1
+            lines.append(f"✅ {selector}: '{value}'")
+        except Exception as e:
+            lines.append(f"❌ {selector}: {str(e).splitlines()[0]}")
+
+    if not filled and fields:
+        return "Ошибка fill_form: ни одно поле не заполнено\n" + "\n".join(lines)
+    return f"Заполнено полей: {filled}/{len(fields)}\n" + "\n".join(lines)
+
+async def press_key(
     key: Annotated[str, "Key name (e.g., 'Enter', 'Tab', 'Escape', 'ArrowDown')"]
 ) -> str:
     """Press a keyboard key"""
+    page = current_state().page
     try:
-        page.keyboard.press(key)
-        return f"Pressed key: {key}"
+        # Enter often submits a form, so wait for the result like click does
+        reason, settle_ms = await settle(page, lambda: page.keyboard.press(key))
+        if reason == "navigation":
+            await page.wait_for_load_state("domcontentloaded", timeout=5000)
+        return f"Pressed key: {key} (settled in {settle_ms} ms: {reason})"
     except Exception as e:
         return f"Error pressing key '{key}': {str(e)}"
 
-def scroll(
+async def scroll(
     direction: Annotated[str, "Direction to scroll: 'down', 'up', or 'to_element'"],
     selector: Annotated[Optional[str], "CSS selector of element to scroll to (only if direction='to_element')"] = None
 ) -> str:
     """Scroll the page in the specified direction or to a specific element"""
+    page = current_state().page
     try:
         if direction == "to_element" and selector:
-            page.locator(selector).scroll_into_view_if_needed()
+            await page.locator(_resolve(selector)).scroll_into_view_if_needed()
             return f"Scrolled to element: {selector}"
         elif direction == "down":
-            page.evaluate("window.scrollBy(0, window.innerHeight * 0.8)")
+            await page.evaluate("window.scrollBy(0, window.innerHeight * 0.8)")
             return "Scrolled down"
         elif direction == "up":
-            page.evaluate("window.scrollBy(0, -window.innerHeight * 0.8)")
+            await page.evaluate("window.scrollBy(0, -window.innerHeight * 0.8)")
             return "Scrolled up"
         else:
             return f"Invalid scroll direction: {direction}"
     except Exception as e:
         return f"Error scrolling: {str(e)}"
 
-def wait_for_element(
+async def wait_for_element(
     selector: Annotated[str, "CSS selector or XPath of the element to wait for"],
     timeout_ms: Annotated[int, "Maximum time to wait in milliseconds"] = 10000
 ) -> str:
     """Wait for an element to appear on the page"""
+    page = current_state().page
     try:
-        page.wait_for_selector(selector, timeout=timeout_ms)
+        await page.wait_for_selector(_resolve(selector), timeout=timeout_ms)
         return f"Element appeared: {selector}"
     except Exception as e:
         return f"Element did not appear within {timeout_ms}ms: {selector}"
 
-def get_element_text(
+async def get_element_text(
     selector: Annotated[str, "CSS selector or XPath of the element"]
 ) -> str:
     """Get the text content of a specific element"""
+    page = current_state().page
     try:
-        text = page.locator(selector).inner_text()
+        text = await page.locator(_resolve(selector)).inner_text()
         return f"Text content: {text}"
     except Exception as e:
         return f"Error getting text from '{selector}': {str(e)}"
 
-def go_back() -> str:
+async def go_back() -> str:
     """Navigate back to the previous page"""
+    page = current_state().page
     try:
-        page.go_back(wait_until="domcontentloaded")
+        await page.go_back(wait_until="domcontentloaded")
         return "Navigated back to previous page"
     except Exception as e:
         return f"Error going back: {str(e)}"
 
-def ask_human(
+async def ask_human(
     question: Annotated[str, "Question to ask the user (e.g., for CAPTCHA, 2FA, or clarification)"]
 ) -> str:
     """
     Ask the human user a question and wait for their response.
     Use this for CAPTCHAs, 2FA, login credentials, or when you need clarification.
     """
-    print(f"\n🤖 Agent asks: {question}")
-    answer = input("👤 Your answer: ")
+    if not current_state().interactive:
+        return "No human available (unattended run). Continue autonomously or finish with a final answer."
+    answer = await _ask_human_input(f"\n🤖 Agent asks: {question}\n👤 Your answer: ")
     return f"User responded: {answer}"
 
+MAX_MACRO_ACTIONS = 20
+# Tools a run_actions macro may call. Screenshots (image results), ask_human and
+# nested macros need their own model turn.
+MACRO_TOOLS = {
+    "goto_url", "go_back", "click", "type_text", "fill_form", "press_key", "scroll",
+    "wait_for_element", "get_element_text", "find_element", "get_page_content", "search_page", "get_page_section",
+}
+# Reading steps return their full output in the combined result, actions one line
+MACRO_READ_TOOLS = {"get_element_text", "find_element", "get_page_content", "search_page", "get_page_section"}
+
+
+async def run_actions(
+    actions: Annotated[list[dict], "Ordered tool calls: [{'tool': 'type_text', 'input': {...}}, ...]"]
+) -> str:
+    """
+    Run a sequence of tool calls in one model turn, e.g. type a query, press
+    Enter, wait for results, read the page. Stops at the first failing step.
+    Each step goes through the supervisor's execute_tool like a call of its
+    own: it gets its telemetry span, feeds page-content ranking, and click's
+    destructive-action confirmation still applies.
+    """
+    from agent.supervisor import execute_tool  # the supervisor imports this module
+    if not actions:
+        return "Error: run_actions needs at least one action"
+    if len(actions) > MAX_MACRO_ACTIONS:
+        return f"Error: run_actions takes at most {MAX_MACRO_ACTIONS} actions, got {len(actions)}"
+    for number, action in enumerate(actions, 1):
+        if action.get("tool") not in MACRO_TOOLS:
+            return f"Error: step {number}: '{action.get('tool')}' can't be used in run_actions (allowed: {', '.join(sorted(MACRO_TOOLS))})"
+
+    lines = []
+    for number, action in enumerate(actions, 1):
+        name = action["tool"]
+        result = await execute_tool(name, action.get("input") or {})
+
+        if is_failure(result):
+            lines.append(f"{number}. {name}: {result}")
+            return (f"Ошибка run_actions: остановлено на шаге {number}/{len(actions)} ({name}), "
+                    f"выполнено шагов до него: {number - 1}\n" + "\n".join(lines))
+        lines.append(f"{number}. {name}: {result if name in MACRO_READ_TOOLS else result.splitlines()[0]}")
+
+    return f"run_actions: выполнено {len(actions)}/{len(actions)}\n" + "\n".join(lines)
+
+# Tools that only read the page. The supervisor runs consecutive read-only
+# calls of one turn concurrently; everything else runs alone and in order.
+READ_ONLY_TOOLS = {"find_element", "get_element_text", "take_screenshot", "wait_for_element", "search_page", "get_page_section"}
+
+
+def is_read_only(tool_name: str, tool_input: dict) -> bool:
+    if tool_name == "get_page_content":
+        # Lazy-load scrolling moves the viewport, so only the no-scroll variant is read-only
+        return not tool_input.get("scroll_to_load", True)
+    return tool_name in READ_ONLY_TOOLS
+
+
+# Tools report failures as text instead of raising; these prefixes mark them
+FAILURE_PREFIXES = ("Error", "Ошибка", "Все попытки", "Отменено", "Не найден", "Element did not appear", "Invalid", "No human")
+
+
+def is_failure(result: str) -> bool:
+    return result.startswith(FAILURE_PREFIXES)
+
 # Tool definitions for Claude API
 TOOLS = [
     {
@@ -421,42 +1358,91 @@ TOOLS = [
     },
     {
         "name": "get_page_content",
-        "description": "PRIMARY TOOL: Intelligent full-page content extraction. Auto-scrolls to trigger lazy loading, captures ALL content (jobs, products, emails), returns structured hierarchical text. Token-optimized (~2000-3000 tokens). Use this FIRST on every page - it sees everything a human sees by scrolling.",
+        "description": "PRIMARY TOOL: Intelligent full-page content extraction. Auto-scrolls to trigger lazy loading, captures ALL content (jobs, products, emails), returns structured hierarchical text. Token-optimized (~2000 tokens): on large pages it returns the items most relevant to the task plus an outline of page sections with IDs (s1, s2, ...); the rest stays available via search_page and get_page_section. Use this FIRST on every page - it sees everything a human sees by scrolling.",
         "input_schema": {
             "type": "object",
             "properties": {
-                "scroll_to_load": {"type": "boolean", "description": "Whether to scroll to trigger lazy loading (default: true). Set false only for static pages."}
+                "scroll_to_load": {"type": "boolean", "description": "Whether to scroll to trigger lazy loading (default: true). Set false only for static pages."},
+                "diff": {"type": "boolean", "description": "Return only what was added/removed since your last get_page_content of this same URL (default: false). Use after small interactions on a page you already read."},
+                "max_scroll_rounds": {"type": "integer", "description": f"Lazy-load scroll budget (default: {SCROLL_MAX_ROUNDS}). Raise it (e.g. 30) for infinite feeds where you need more items."}
             },
             "required": []
         }
     },
 
+    {
+        "name": "search_page",
+        "description": "Search all content the last get_page_content of this tab extracted (every row, email, product - not only what it showed). No DOM access, so it is cheap. Returns matching items with their section ID and index, and element refs.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Words to look for, e.g. 'python remote' or 'order 4321'"},
+                "top_k": {"type": "integer", "description": f"Number of matches to return (default: {SEARCH_PAGE_RESULTS})"}
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "get_page_section",
+        "description": "Read one section (by ID from the get_page_content outline, e.g. s3) of the last extraction of this tab, from memory. Long sections are paged: pass the offset given at the end of the previous result.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "section_id": {"type": "string", "description": "Section ID, e.g. s3"},
+                "offset": {"type": "integer", "description": "Index of the first item to return (default: 0)"}
+            },
+            "required": ["section_id"]
+        }
+    },
+
     {
         "name": "take_screenshot",
-        "description": "Take a screenshot of the current page to visually understand the layout. Use when text tools are not enough. Each screenshot costs ~2000 tokens, so use strategically.",
+        "description": "Take a screenshot of the current page to visually understand the layout. Use when text tools are not enough. Each screenshot costs ~1000-2000 tokens, so use strategically: crop to an element or region when you only need part of the page. If nothing visible changed since an earlier screenshot, returns a note instead of the image.",
         "input_schema": {
             "type": "object",
-            "properties": {}
+            "properties": {
+                "selector": {
+                    "type": "string",
+                    "description": "Element ref (e.g. e42) or selector: capture only this element"
+                },
+                "region": {
+                    "type": "object",
+                    "description": "Capture only this viewport region, in CSS pixels",
+                    "properties": {
+                        "x": {"type": "number"},
+                        "y": {"type": "number"},
+                        "width": {"type": "number"},
+                        "height": {"type": "number"}
+                    },
+                    "required": ["x", "y", "width", "height"]
+                },
+                "force": {
+                    "type": "boolean",
+                    "description": "Send the image even if it is identical to an earlier screenshot",
+                    "default": False
+                }
+            }
         }
     },
     {
         "name": "find_element",
-        "description": "Find an element on the page using natural language description (e.g., 'search button', 'email input'). Returns the selector to use with click or type_text.",
+        "description": "Find an element on the page using natural language description (e.g., 'search button', 'email input'). Returns ranked candidates (best first) with element refs (e.g. e42) to use with click or type_text.",
         "input_schema": {
             "type": "object",
             "properties": {
-                "description": {"type": "string", "description": "Natural language description of the element"}
+                "description": {"type": "string", "description": "Natural language description of the element"},
+                "top_k": {"type": "integer", "description": "Number of ranked candidates to return (default: 3)"}
             },
             "required": ["description"]
         }
     },
     {
         "name": "click",
-        "description": "Click on an element using a selector. Supports CSS selectors (#id, .class), XPath, or text selectors (text=Login). Use find_element first if you need to search for an element.",
+        "description": "Click on an element using an element ref from get_page_content/find_element (e.g. e42), or a CSS selector (#id, .class), XPath, or text selector (text=Login).",
         "input_schema": {
             "type": "object",
             "properties": {
-                "selector": {"type": "string", "description": "CSS selector, XPath, or text selector"}
+                "selector": {"type": "string", "description": "Element ref (e42), CSS selector, XPath, or text selector"}
             },
             "required": ["selector"]
         }
@@ -467,12 +1453,59 @@ TOOLS = [
         "input_schema": {
             "type": "object",
             "properties": {
-                "selector": {"type": "string", "description": "CSS selector or XPath of input field"},
+                "selector": {"type": "string", "description": "Element ref (e42), CSS selector or XPath of input field"},
                 "text": {"type": "string", "description": "Text to type"}
             },
             "required": ["selector", "text"]
         }
     },
+    {
+        "name": "fill_form",
+        "description": "Fill several form fields in one call (text inputs, textareas, selects, checkboxes). Use instead of repeated type_text calls. Reports success or failure per field; does not submit the form.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "fields": {
+                    "type": "array",
+                    "description": "Fields in fill order",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "selector": {"type": "string", "description": "Element ref (e42), CSS selector or XPath of the field"},
+                            "value": {"type": "string", "description": "Text to enter, option label for selects, true/false for checkboxes"}
+                        },
+                        "required": ["selector", "value"]
+                    }
+                }
+            },
+            "required": ["fields"]
+        }
+    },
+    {
+        "name": "run_actions",
+        "description": "Run several tool calls in order in ONE step, e.g. type_text → press_key Enter → wait_for_element → get_page_content. Stops at the first failure and returns one compact combined result (full output only for reading tools). Use for predictable sequences to save round trips. Dangerous clicks still require confirmation.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "actions": {
+                    "type": "array",
+                    "description": "Tool calls in execution order (at most 20)",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "tool": {
+                                "type": "string",
+                                "enum": sorted(MACRO_TOOLS)
+                            },
+                            "input": {"type": "object", "description": "Arguments, exactly as for the tool itself"}
+                        },
+                        "required": ["tool", "input"]
+                    }
+                }
+            },
+            "required": ["actions"]
+        }
+    },
     {
         "name": "press_key",
         "description": "Press a keyboard key (Enter, Tab, Escape, ArrowDown, etc.)",
@@ -491,7 +1524,7 @@ TOOLS = [
             "type": "object",
             "properties": {
                 "direction": {"type": "string", "enum": ["down", "up", "to_element"], "description": "Scroll direction"},
-                "selector": {"type": "string", "description": "CSS selector (only used when direction='to_element')"}
+                "selector": {"type": "string", "description": "Element ref (e42) or CSS selector (only used when direction='to_element')"}
             },
             "required": ["direction"]
         }
@@ -502,7 +1535,7 @@ TOOLS = [
         "input_schema": {
             "type": "object",
             "properties": {
-                "selector": {"type": "string", "description": "CSS selector or XPath"},
+                "selector": {"type": "string", "description": "Element ref (e42), CSS selector or XPath"},
                 "timeout_ms": {"type": "integer", "description": "Timeout in milliseconds (default: 10000)"}
             },
             "required": ["selector"]
@@ -514,7 +1547,7 @@ TOOLS = [
         "input_schema": {
             "type": "object",
             "properties": {
-                "selector": {"type": "string", "description": "CSS selector or XPath"}
+                "selector": {"type": "string", "description": "Element ref (e42), CSS selector or XPath"}
             },
             "required": ["selector"]
         }
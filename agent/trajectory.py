@@ -0,0 +1,204 @@
+"""
+Trajectory recording and LLM-free replay for repeated tasks.
+
+While the agent works, every page-changing tool call is recorded together with
+the page URL and structure fingerprint taken right before it. A run that ends
+with a final answer saves its trajectory under the task template. The next run
+of the same template replays the recorded actions directly, checking before
+each step that the page still has the recorded fingerprint, and hands control
+to the model at the first step where the page differs (or after the last one).
+Text typed into password, one-time-code and card fields is redacted before
+it is saved; replay hands those steps back to the model.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+from agent.tools import current_state, page_fingerprint, replay_selector, is_failure, is_secret_field, REDACTED
+from config import TRAJECTORY_DIR
+
+# Tools whose effect a later run has to repeat. Pure reads (page content,
+# find_element, screenshots) only informed the model and are not replayed.
+REPLAYED_TOOLS = {
+    "goto_url", "click", "type_text", "fill_form", "press_key", "scroll", "wait_for_element", "go_back", "run_actions",
+}
+
+# Inputs that may be copied from the task text (a search query, a URL)
+TASK_DERIVED_INPUTS = ("text", "url")
+
+
+def normalize_template(template: str) -> str:
+    return " ".join(template.lower().split())
+
+
+async def _replayable_input(page, tool_input: dict) -> dict:
+    """
+    Copy of a tool input with element refs swapped for selectors that survive a
+    reload, and text for secret fields (passwords, one-time codes) redacted.
+    """
+    tool_input = dict(tool_input)
+    if tool_input.get("selector"):
+        if tool_input.get("text") and await is_secret_field(page, tool_input["selector"]):
+            tool_input["text"] = REDACTED
+        tool_input["selector"] = await replay_selector(page, tool_input["selector"])
+    if tool_input.get("fields"):
+        fields = []
+        for field in tool_input["fields"]:
+            selector = str(field.get("selector", ""))
+            field = {**field, "selector": await replay_selector(page, selector)}
+            if field.get("value") and await is_secret_field(page, selector):
+                field["value"] = REDACTED
+            fields.append(field)
+        tool_input["fields"] = fields
+    if tool_input.get("actions"):
+        # Refs to elements that only appear mid-macro stay refs; replay stops there
+        tool_input["actions"] = [
+            {**action, "input": await _replayable_input(page, action.get("input") or {})}
+            for action in tool_input["actions"]
+        ]
+    return tool_input
+
+
+def _inputs(tool_input: dict) -> list:
+    """Every value a step types or navigates to, including inside forms and macros."""
+    values = [tool_input.get(key) for key in TASK_DERIVED_INPUTS]
+    values += [field.get("value") for field in tool_input.get("fields", [])]
+    for action in tool_input.get("actions", []):
+        values += _inputs(action.get("input") or {})
+    return values
+
+
+class TrajectoryRecorder:
+    """Collects the replayable steps of one run."""
+
+    def __init__(self):
+        self.steps = []
+        self.complete = True  # False once a step could not be recorded
+
+    async def before(self, tool_name: str, tool_input: dict) -> Optional[dict]:
+        """Record the precondition and replayable input of a tool call that is about to run."""
+        if tool_name not in REPLAYED_TOOLS:
+            return None
+        page = current_state().page
+        try:
+            step = {
+                "tool": tool_name,
+                "input": await _replayable_input(page, tool_input),
+                "url": page.url,
+                "fingerprint": await page_fingerprint(page),
+            }
+        except Exception:
+            self.complete = False  # a trajectory with a hole in it would replay wrongly
+            return None
+        self.steps.append(step)
+        return step
+
+    def after(self, step: Optional[dict], result: str) -> None:
+        """Failed calls changed nothing the model relied on, so they are not replayed."""
+        if step is not None and is_failure(result):
+            self.steps = [s for s in self.steps if s is not step]  # by identity: repeated steps compare equal
+
+
+class TrajectoryStore:
+    """One JSON file per task template in TRAJECTORY_DIR."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, template: str) -> str:
+        digest = hashlib.sha1(normalize_template(template).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, template: str) -> Optional[dict]:
+        try:
+            with open(self._path(template), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, template: str, task: str, steps: list[dict]) -> None:
+        path = self._path(template)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "template": normalize_template(template),
+                    "task": task,
+                    "recorded_at": time.time(),
+                    "steps": steps,
+                }, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # replay is an optimization; never fail a run over it
+
+
+def _changed_task_input(step: dict, recorded_task: str, task: str) -> Optional[str]:
+    """An input copied from the recorded task text that this task doesn't contain (e.g. another search query)."""
+    for value in _inputs(step["input"]):
+        if not isinstance(value, str) or len(value) < 2:
+            continue
+        in_recorded = value.lower() in recorded_task.lower()
+        if in_recorded and value.lower() not in task.lower():
+            return f"input '{value}' came from the recorded task text"
+    return None
+
+
+def describe_step(step: dict) -> str:
+    args = ", ".join(f"{key}={json.dumps(value, ensure_ascii=False)}" for key, value in step["input"].items())
+    return f"{step['tool']}({args})"
+
+
+async def replay(
+    trajectory: dict,
+    task: str,
+    recorder: TrajectoryRecorder,
+    execute: Callable[[str, dict], Awaitable[str]],
+) -> tuple[list[str], Optional[str]]:
+    """
+    Replay recorded steps while their preconditions hold.
+
+    Returns the replayed steps (as "tool(args) -> result" lines) and why replay
+    stopped, or None when every step ran.
+    """
+    replayed = []
+    for number, step in enumerate(trajectory["steps"], 1):
+        page = current_state().page  # a click may have switched tabs
+        try:
+            fingerprint = await page_fingerprint(page)
+        except Exception:
+            fingerprint = None  # page still navigating
+        if fingerprint != step["fingerprint"]:
+            return replayed, f"step {number} ({step['tool']}): page differs from the recording ({page.url})"
+
+        changed = _changed_task_input(step, trajectory.get("task", ""), task)
+        if changed:
+            return replayed, f"step {number} ({step['tool']}): {changed}"
+        if REDACTED in _inputs(step["input"]):
+            return replayed, f"step {number} ({step['tool']}): enters a password or code, which is never recorded"
+
+        result = await execute(step["tool"], step["input"])
+        if is_failure(result):
+            return replayed, f"step {number} ({step['tool']}): {result.splitlines()[0]}"
+
+        recorder.steps.append(step)
+        replayed.append(f"{describe_step(step)} -> {result.splitlines()[0]}")
+
+    return replayed, None
+
+
+def format_replay_note(replayed: list[str], stopped: Optional[str]) -> str:
+    """Tells the model which actions already ran, so it continues instead of starting over."""
+    lines = [f"The first {len(replayed)} actions of this task were replayed from a previous successful run:"]
+    lines += [f"{i}. {line}" for i, line in enumerate(replayed, 1)]
+    if stopped:
+        lines.append(f"Replay stopped at {stopped}. Continue the task from the current page.")
+    else:
+        lines.append("All recorded actions ran. Check the current page and finish the task.")
+    return "\n".join(lines)
+
+
+# Shared by every task in the process
+trajectory_store = TrajectoryStore(TRAJECTORY_DIR)
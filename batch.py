@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Batch Runner - execute agent tasks from a JSONL file, headless, with a worker pool
+
+Each input line is a JSON object with the task text (field "task" by default),
+an optional id (field "id", defaults to the line number) and an optional task
+template (field "template") that runs of the same flow share for replay. Tasks run on
+async workers sharing one headless Chromium; each result is appended to the
+output JSONL as soon as its task finishes, so partial runs are never lost.
+
+Usage:
+    ./venv/bin/python3 batch.py tasks.jsonl -o results.jsonl --workers 4 --timeout 600
+"""
+
+from playwright.async_api import async_playwright
+from agent.engine import launch_browser, start_pool, run_task
+from agent.supervisor import RunStats
+from agent.selector_cache import selector_cache
+from agent.llm import create_client, get_client, set_client
+from config import MAX_CONCURRENT_TASKS
+from rich import print as rprint
+import argparse
+import asyncio
+import json
+import time
+
+DEFAULT_TASK_TIMEOUT = 600  # seconds
+
+
+def load_tasks(path: str, task_field: str, id_field: str, template_field: str) -> list[dict]:
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            task = record.get(task_field)
+            if not task:
+                rprint(f"[yellow]Skipping line {line_no}: no '{task_field}' field[/yellow]")
+                continue
+            tasks.append({"id": record.get(id_field, line_no), "task": task, "template": record.get(template_field)})
+    return tasks
+
+
+async def run_batch(tasks: list[dict], output_path: str, workers: int, timeout: float) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in tasks:
+        queue.put_nowait(item)
+
+    counts = {"ok": 0, "timeout": 0, "error": 0, "cost_usd": 0.0}
+    write_lock = asyncio.Lock()
+
+    async with async_playwright() as pw:
+        browser = await launch_browser(pw, headless=True)
+        pool = await start_pool(pw, browser, max(1, min(workers, len(tasks))))
+
+        with open(output_path, "a", encoding="utf-8") as out:
+
+            async def write_result(record: dict) -> None:
+                async with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+
+            async def worker() -> None:
+                while True:
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+
+                    stats = RunStats()
+                    started = time.monotonic()
+                    answer, status, error = None, "ok", None
+                    try:
+                        answer = await asyncio.wait_for(
+                            run_task(pool, item["task"], label=f"[{item['id']}] ", stats=stats,
+                                     interactive=False, template=item["template"]),
+                            timeout=timeout,
+                        )
+                    except asyncio.TimeoutError:
+                        status = "timeout"
+                    except Exception as e:
+                        status, error = "error", str(e)
+
+                    counts[status] += 1
+                    counts["cost_usd"] += stats.cost_usd
+                    await write_result({
+                        "id": item["id"],
+                        "task": item["task"],
+                        "status": status,
+                        "answer": answer,
+                        "error": error,
+                        "wall_time_s": round(time.monotonic() - started, 2),
+                        **stats.to_dict(),
+                    })
+                    rprint(f"[dim]{item['id']}: {status} in {time.monotonic() - started:.1f}s, {stats.steps} steps, "
+                           f"pool wait {stats.pool_wait_s:.1f}s[/dim]")
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+            finally:
+                rprint(f"[dim]{pool.summary()}[/dim]")
+                await pool.close()
+                await browser.close()
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run browser agent tasks from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one task per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="Output JSONL (appended to)")
+    parser.add_argument("-w", "--workers", type=int, default=MAX_CONCURRENT_TASKS, help="Concurrent tasks")
+    parser.add_argument("-t", "--timeout", type=float, default=DEFAULT_TASK_TIMEOUT, help="Per-task timeout, seconds")
+    parser.add_argument("--task-field", default="task", help="JSON field holding the task text")
+    parser.add_argument("--id-field", default="id", help="JSON field holding the task id")
+    parser.add_argument("--template-field", default="template", help="JSON field holding the task template")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="Save every model request/response to a cassette")
+    cassette.add_argument("--replay", metavar="CASSETTE", help="Answer model requests from a cassette (no API calls)")
+    args = parser.parse_args()
+
+    if args.record or args.replay:
+        set_client(create_client("record" if args.record else "replay", args.record or args.replay))
+
+    tasks = load_tasks(args.input, args.task_field, args.id_field, args.template_field)
+    rprint(f"[bold cyan]Running {len(tasks)} tasks with {args.workers} workers (timeout {args.timeout:.0f}s)[/bold cyan]")
+
+    started = time.monotonic()
+    counts = asyncio.run(run_batch(tasks, args.output, args.workers, args.timeout))
+
+    rprint(f"\n[bold green]Done in {time.monotonic() - started:.1f}s[/bold green] "
+           f"ok={counts['ok']} timeout={counts['timeout']} error={counts['error']} cost=${counts['cost_usd']:.4f}")
+    rprint(f"[dim]Results: {args.output}[/dim]")
+    rprint(f"[dim]{selector_cache.summary()}[/dim]")
+    if args.replay:
+        rprint(f"[dim]{get_client().summary()}[/dim]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Benchmark: browser tools and the full agent loop against local fixture sites
+
+Serves benchmarks/fixtures/sites (big list, infinite scroll with a JSON API,
+SPA with client-side routes, heavy form, new-tab link) from a local HTTP
+server and measures, in headless Chromium:
+
+  tools  - get_page_content, find_element, click, type_text, fill_form called
+           directly: median ms, result size in chars and estimated tokens
+  agent  - the whole run_agent loop driven by ScriptedClient, a stand-in for
+           the Anthropic client that answers from a fixed script: wall time,
+           model requests, prompt tokens (estimated from the requests), tool time
+
+Results print as a table and can be saved as JSON; pass an earlier JSON as
+--baseline to print per-metric deltas and flag regressions.
+
+Usage:
+    ./venv/bin/python3 benchmarks/bench_agent.py [--runs 5] [--json out.json] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from playwright.async_api import async_playwright
+from agent import supervisor, telemetry, tools
+from agent.llm import set_client
+from agent.engine import launch_browser
+from agent.history import estimate_tokens, history_tokens
+from agent.resources import ResourcePolicy
+from agent.selector_cache import selector_cache
+from config import BROWSER_WIDTH, BROWSER_HEIGHT, RESOURCE_BLOCKING
+
+SITES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "sites")
+API_DELAY_S = 0.05  # simulated backend latency of the JSON endpoints
+REGRESSION_THRESHOLD = 0.10  # a metric 10% worse than the baseline is flagged
+
+# Lower is better for every metric; "ms"-type metrics are noisy, so only those
+# and token counts are compared against the baseline
+COMPARED_METRICS = ("ms", "wall_ms", "tool_ms", "tokens", "prompt_tokens")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Static fixture files plus the small JSON API the SPA and feed fixtures use."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=SITES_DIR, **kwargs)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/api/items":
+            page = int(query.get("page", ["1"])[0])
+            body = [{"title": f"Story {page}.{i}", "body": f"Paragraph {i} of page {page}. " * 6} for i in range(1, 21)]
+        elif url.path == "/api/view":
+            name = query.get("name", ["inbox"])[0]
+            body = {"title": name.capitalize(), "items": [f"{name} message {i}: subject line {i}" for i in range(1, 31)]}
+        else:
+            return super().do_GET()
+
+        time.sleep(API_DELAY_S)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class ScriptedClient:
+    """
+    Stand-in for AsyncAnthropic: answers run_agent's requests from a script.
+
+    Each script entry is one model turn: a list of (tool name, input) calls, or
+    a string for the final answer. Usage is estimated from the request the way
+    history compaction estimates it, so prompt-size changes show up. The tool
+    results the agent sends back are kept in tool_results.
+    """
+
+    def __init__(self, script: list):
+        self.script = script
+        self.requests = 0
+        self.tool_results = []
+        self.messages = self  # client.messages.create(...)
+
+    async def create(self, **request):
+        turn = self.script[min(self.requests, len(self.script) - 1)]
+        self.requests += 1
+        if self.requests > 1:  # the previous turn's results come in the last message
+            for block in request["messages"][-1]["content"]:
+                if isinstance(block, dict) and block.get("type") == "tool_result":
+                    content = block["content"]
+                    self.tool_results.append(content if isinstance(content, str) else json.dumps(content))
+        prompt_tokens = (estimate_tokens(json.dumps(request["tools"], ensure_ascii=False))
+                         + estimate_tokens(request["system"]) + history_tokens(request["messages"]))
+        if isinstance(turn, str):
+            content = [SimpleNamespace(type="text", text=turn)]
+        else:
+            content = [
+                SimpleNamespace(type="tool_use", id=f"toolu_{self.requests}_{i}", name=name, input=tool_input)
+                for i, (name, tool_input) in enumerate(turn)
+            ]
+        usage = SimpleNamespace(input_tokens=prompt_tokens, output_tokens=estimate_tokens(json.dumps(turn)),
+                                cache_read_input_tokens=0, cache_creation_input_tokens=0)
+        return SimpleNamespace(content=content, usage=usage, stop_reason="end_turn" if isinstance(turn, str) else "tool_use")
+
+
+def agent_scenarios(base: str) -> dict:
+    """
+    Scripted runs: name -> (script, text a tool result must contain before the
+    final answer). The script's final answer is fixed, so the expected text is
+    what shows the tools actually reached the state the answer claims.
+    Selectors avoid DESTRUCTIVE_KEYWORDS ("order"), which unattended runs refuse.
+    """
+    form_fields = [
+        {"selector": "#first_name", "value": "Ada"}, {"selector": "#last_name", "value": "Lovelace"},
+        {"selector": "#email", "value": "ada@example.com"}, {"selector": "#city", "value": "Berlin"},
+        {"selector": "#postcode", "value": "10115"}, {"selector": "#country", "value": "Germany"},
+        {"selector": "#notes", "value": "Leave at the door. " * 10}, {"selector": "#gift", "value": "true"},
+    ]
+    return {
+        "form": ([
+            [("goto_url", {"url": f"{base}/form.html"})],
+            [("fill_form", {"fields": form_fields})],
+            [("click", {"selector": "#submit"})],
+            [("get_page_content", {"scroll_to_load": False})],
+            "The form was submitted and the review page lists the entered values.",
+        ], "Review your order"),
+        "infinite_scroll": ([
+            [("goto_url", {"url": f"{base}/infinite.html"})],
+            # the last story is past the content budget; search_page finds it in the stored extraction
+            [("get_page_content", {}), ("search_page", {"query": "Story 6.20"})],
+            "The feed has 6 pages of stories.",
+        ], "Paragraph 20 of page 6"),
+        "spa_routes": ([
+            [("goto_url", {"url": f"{base}/spa.html"})],
+            [("click", {"selector": "a[data-route=inbox]"})],
+            [("get_page_content", {"scroll_to_load": False})],
+            [("click", {"selector": "a[data-route=sent]"})],
+            [("get_page_content", {"scroll_to_load": False, "diff": True})],
+            "Inbox and Sent both hold 30 messages.",
+        ], "sent message 30"),
+        "new_tab": ([
+            [("goto_url", {"url": f"{base}/newtab.html"})],
+            [("click", {"selector": "#reference"})],
+            [("get_page_content", {"scroll_to_load": False})],
+            "The API reference documents GET and POST /orders.",
+        ], "POST /orders"),
+        "big_list": ([
+            [("goto_url", {"url": f"{base}/big_list.html"})],
+            [("find_element", {"description": "open order 4321 link"})],
+            [("click", {"selector": "tbody tr:nth-child(4321) a.open"})],
+            [("get_element_text", {"selector": "h1"})],
+            "Opened the details of the 4321st row.",
+        ], "Order #4321 details"),
+        "macro": ([
+            [("goto_url", {"url": f"{base}/spa.html"})],
+            [("run_actions", {"actions": [
+                {"tool": "click", "input": {"selector": "a[data-route=inbox]"}},
+                {"tool": "wait_for_element", "input": {"selector": ".row"}},
+                {"tool": "get_page_content", "input": {"scroll_to_load": False}},
+            ]})],
+            "Inbox opened in one macro step.",
+        ], "inbox message 30"),
+    }
+
+
+async def new_page(browser):
+    """A context set up like engine.run_task sets one up."""
+    context = await browser.new_context(viewport={"width": BROWSER_WIDTH, "height": BROWSER_HEIGHT})
+    resources = await ResourcePolicy.install(context) if RESOURCE_BLOCKING else None
+    page = await context.new_page()
+    if resources:
+        await resources.attach(page)
+    tools.bind_page(page, interactive=False, resources=resources)
+    return context, page
+
+
+async def timed(coro) -> tuple[float, str]:
+    started = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - started) * 1000, str(result)
+
+
+async def bench_tools(browser, base: str, runs: int) -> dict:
+    """Each case: (fixture, tool call). The page is reloaded (untimed) before every run."""
+    notes = "Please ring twice, the bell is quiet. " * 6  # ~230 chars
+    cases = {
+        "get_page_content big_list": ("big_list.html", lambda: tools.get_page_content(scroll_to_load=False)),
+        "get_page_content infinite": ("infinite.html", lambda: tools.get_page_content()),
+        "get_page_content form": ("form.html", lambda: tools.get_page_content(scroll_to_load=False)),
+        "find_element big_list": ("big_list.html", lambda: tools.find_element("open order 4321 link")),
+        "find_element form": ("form.html", lambda: tools.find_element("postcode field")),
+        "click spa route": ("spa.html", lambda: tools.click("a[data-route=inbox]")),
+        "click new tab": ("newtab.html", lambda: tools.click("#reference")),
+        "type_text 230 chars": ("form.html", lambda: tools.type_text("#notes", notes)),
+        "fill_form 8 fields": ("form.html", lambda: tools.fill_form([
+            {"selector": "#first_name", "value": "Ada"}, {"selector": "#last_name", "value": "Lovelace"},
+            {"selector": "#email", "value": "ada@example.com"}, {"selector": "#street", "value": "Main st 1"},
+            {"selector": "#city", "value": "Berlin"}, {"selector": "#postcode", "value": "10115"},
+            {"selector": "#country", "value": "Germany"}, {"selector": "#newsletter", "value": "true"},
+        ])),
+    }
+
+    results = {}
+    for name, (fixture, call) in cases.items():
+        timings, result = [], ""
+        for _ in range(runs):
+            context, page = await new_page(browser)
+            try:
+                await page.goto(f"{base}/{fixture}", wait_until="load")
+                ms, result = await timed(call())
+                timings.append(ms)
+            finally:
+                await context.close()
+        results[name] = {
+            "ms": round(statistics.median(timings), 1),
+            "chars": len(result),
+            "tokens": estimate_tokens(result),
+            "ok": not tools.is_failure(result),
+        }
+    return results
+
+
+async def bench_agent(browser, base: str, runs: int, trace_path: str) -> dict:
+    results = {}
+    for name, (script, expected) in agent_scenarios(base).items():
+        walls, requests, prompt_tokens, tool_ms, reached = [], 0, 0, [], []
+        for run in range(runs):
+            label = f"{name}#{run} "
+            client = ScriptedClient(script)
+            set_client(client)
+            context, page = await new_page(browser)
+            try:
+                stats = supervisor.RunStats()
+                ms, _ = await timed(supervisor.run_agent(f"benchmark: {name}", label=label, stats=stats))
+            finally:
+                await context.close()
+            walls.append(ms)
+            requests, prompt_tokens = client.requests, stats.input_tokens
+            reached.append(any(expected in result for result in client.tool_results))
+            with open(trace_path, encoding="utf-8") as f:
+                spans = [json.loads(line) for line in f]
+            # run_actions steps have spans of their own, so the macro's span would count them twice
+            tool_ms.append(sum(s["duration_ms"] for s in spans
+                               if s["type"] == "tool" and s["label"] == label.strip() and s["tool"] != "run_actions"))
+        results[name] = {
+            "wall_ms": round(statistics.median(walls), 1),
+            "tool_ms": round(statistics.median(tool_ms), 1),
+            "requests": requests,
+            "prompt_tokens": prompt_tokens,
+            "ok": all(reached),
+        }
+    return results
+
+
+def print_results(title: str, results: dict, baseline: dict) -> None:
+    print(f"\n{title}")
+    for name, metrics in results.items():
+        cells = []
+        for metric, value in metrics.items():
+            cell = f"{metric}={value}"
+            old = baseline.get(name, {}).get(metric)
+            if metric in COMPARED_METRICS and isinstance(old, (int, float)) and old:
+                delta = (value - old) / old
+                cell += f" ({delta:+.0%}{' REGRESSION' if delta > REGRESSION_THRESHOLD else ''})"
+            cells.append(cell)
+        print(f"  {name:<28} " + "  ".join(cells))
+
+
+async def main_async(runs: int, json_path: str, baseline_path: str) -> None:
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = {**saved.get("tools", {}), **saved.get("agent", {})}
+
+    # Keep the benchmark from touching the real trace, selector cache and trajectories
+    workdir = tempfile.mkdtemp(prefix="bench_agent_")
+    telemetry.TRACE_PATH = os.path.join(workdir, "trace.jsonl")
+    open(telemetry.TRACE_PATH, "w").close()
+    selector_cache.path = os.path.join(workdir, "selector_cache.json")
+    selector_cache.entries = None
+    supervisor.TRAJECTORY_REPLAY = False
+    supervisor.console.quiet = True
+
+    server, base = start_server()
+    try:
+        async with async_playwright() as pw:
+            browser = await launch_browser(pw, headless=True)
+            try:
+                tool_results = await bench_tools(browser, base, runs)
+                agent_results = await bench_agent(browser, base, runs, telemetry.TRACE_PATH)
+            finally:
+                await browser.close()
+    finally:
+        server.shutdown()
+
+    print_results("Tools (direct calls)", tool_results, baseline)
+    print_results("Agent loop (scripted model)", agent_results, baseline)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "runs": runs, "tools": tool_results, "agent": agent_results}, f, indent=2)
+        print(f"\nSaved: {json_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tools and the agent loop on local fixture sites")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Save results to this JSON file")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.runs, args.json, args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-pass get_page_content extraction vs the old four-sweep script
+
+Builds synthetic pages of 10k-100k elements (nav, product cards, nested
+layout divs, hidden panels, forms) in headless Chromium and times both
+extraction scripts on each, the single-pass one with the PAGE_EXTRACT_LIMITS
+get_page_content passes. Layout is dirtied before every run so each
+measurement pays for a fresh style/layout pass, like a real page would.
+
+Usage:
+    ./venv/bin/python3 benchmarks/bench_extraction.py [--sizes 10000 30000 100000] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from playwright.async_api import async_playwright
+from agent.tools import EXTRACT_PAGE_JS
+from config import PAGE_EXTRACT_LIMITS
+
+# The extraction script as it was before the single-pass rewrite (four querySelectorAll sweeps)
+LEGACY_EXTRACT_PAGE_JS = r"""
+() => {
+    const seenTexts = new Set();
+
+    function cleanText(text) {
+        if (!text) return null;
+        text = text.trim().replace(/\s+/g, ' ');
+        if (text.length < 3) return null;
+        if (text.length > 300) return null;
+        if (/^[\d\s\.,;:!?()\[\]{}\\/\|\-\+•·×]+$/.test(text)) return null;
+        if (seenTexts.has(text)) return null;
+        seenTexts.add(text);
+        return text;
+    }
+
+    const headings = [];
+    document.querySelectorAll('h1, h2, h3').forEach(h => {
+        const text = cleanText(h.innerText);
+        if (text) headings.push(`[${h.tagName}] ${text}`);
+    });
+
+    const interactive = [];
+    document.querySelectorAll('button, a[href], input, select, textarea, [role="button"], [role="link"]').forEach(el => {
+        if (!el.offsetParent && el.tagName !== 'INPUT') return;
+        let text = cleanText(el.innerText || el.getAttribute('aria-label') || el.getAttribute('placeholder') || el.getAttribute('value'));
+        if (!text) return;
+        const tag = el.tagName.toLowerCase();
+        const type = el.getAttribute('type') || '';
+        const id = el.id ? `#${el.id}` : '';
+        const name = el.getAttribute('name') ? `[name=${el.getAttribute('name')}]` : '';
+        interactive.push(`<${tag}${type ? ` type=${type}` : ''}${id}${name}> ${text}`);
+    });
+
+    const contentBlocks = [];
+    document.querySelectorAll('article, [class*="card"], [class*="item"], [class*="vacancy"], [class*="product"], [class*="email"], [class*="letter"], li').forEach(el => {
+        if (!el.offsetParent) return;
+        if (el.closest('nav, header, footer')) return;
+        const text = cleanText(el.innerText);
+        if (text && text.length > 15 && text.length < 250) contentBlocks.push(text);
+    });
+
+    const otherText = [];
+    document.querySelectorAll('p, span, div, td, label').forEach(el => {
+        if (!el.offsetParent) return;
+        if (el.querySelector('button, a, input')) return;
+        const text = cleanText(el.innerText);
+        if (text && text.length > 10 && otherText.length < 50) otherText.push(text);
+    });
+
+    return {
+        url: window.location.href,
+        title: document.title,
+        headings: headings.slice(0, 20),
+        interactive: interactive.slice(0, 100),
+        blocks: contentBlocks.slice(0, 80),
+        text: otherText,
+    };
+}
+"""
+
+# Builds a page of roughly `target` elements inside the browser (fast, no HTML transfer)
+BUILD_DOM_JS = r"""
+(target) => {
+    document.head.innerHTML = '<style>.bench-dirty { padding-top: 1px; } .hidden { display: none; }</style>';
+    document.title = `Synthetic page (${target} elements)`;
+    const body = document.body;
+    body.innerHTML = '';
+
+    const nav = document.createElement('nav');
+    for (let i = 0; i < 30; i++) nav.insertAdjacentHTML('beforeend', `<a href="/section/${i}">Section ${i}</a>`);
+    body.appendChild(nav);
+    body.insertAdjacentHTML('beforeend', '<h1>Catalog of synthetic products</h1>');
+    body.insertAdjacentHTML('beforeend',
+        '<form><input name="q" placeholder="Search products"><select name="sort"><option>Price</option></select>' +
+        '<button type="submit">Search</button></form>');
+
+    let count = body.getElementsByTagName('*').length;
+    let i = 0;
+    const main = document.createElement('main');
+    body.appendChild(main);
+    while (count < target) {
+        const hidden = i % 10 === 9 ? ' hidden' : '';
+        // Deep layout wrappers around each card, like component-heavy SPAs
+        main.insertAdjacentHTML('beforeend',
+            `<div class="row${hidden}"><div class="col"><div class="wrapper">` +
+            `<div class="product-card"><h3>Product number ${i}</h3>` +
+            `<p>Description of product ${i}: lightweight, durable and cheap.</p>` +
+            `<span class="price">Price ${100 + i} USD</span>` +
+            `<ul><li>Feature one of product ${i}</li><li>Feature two of product ${i}</li></ul>` +
+            `<a href="/product/${i}">Open product ${i}</a><button>Add ${i} to cart</button>` +
+            `</div></div></div></div>`);
+        count += 13;
+        i++;
+    }
+    return body.getElementsByTagName('*').length;
+}
+"""
+
+RUN_JS = r"""
+({src, limits}) => {
+    document.body.classList.toggle('bench-dirty');  // invalidate layout before each run
+    const extract = eval(src);
+    const started = performance.now();
+    const result = extract(limits);  // the legacy script ignores limits, it has its own caps
+    return {
+        ms: performance.now() - started,
+        counts: [result.headings.length, result.interactive.length, result.blocks.length, result.text.length],
+    };
+}
+"""
+
+
+async def bench(sizes: list[int], runs: int) -> None:
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.goto("about:blank")
+
+        print(f"{'elements':>9}  {'script':<12} {'median ms':>10} {'min ms':>8}  counts (headings/interactive/blocks/text)")
+        for size in sizes:
+            elements = await page.evaluate(BUILD_DOM_JS, size)
+            for name, script in (("legacy", LEGACY_EXTRACT_PAGE_JS), ("single-pass", EXTRACT_PAGE_JS)):
+                timings = []
+                counts = None
+                for _ in range(runs):
+                    result = await page.evaluate(RUN_JS, {"src": script, "limits": PAGE_EXTRACT_LIMITS})
+                    timings.append(result["ms"])
+                    counts = result["counts"]
+                print(f"{elements:>9}  {name:<12} {statistics.median(timings):>10.1f} {min(timings):>8.1f}  {'/'.join(map(str, counts))}")
+
+        await browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_page_content extraction scripts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    asyncio.run(bench(args.sizes, args.runs))
+    print(f"\nTotal: {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
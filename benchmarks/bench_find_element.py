@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Benchmark: indexed, ranked find_element vs the old full-scan scorer
+
+Speed: times both scripts on synthetic pages of 10k-100k elements. The new
+script builds its token index on the first call and reuses it while the DOM
+is unchanged, so first and repeated calls are reported separately.
+
+Accuracy: runs the cases in fixtures/find_element/cases.json (description ->
+expected element) and counts how often the top result is the expected element.
+
+Usage:
+    ./venv/bin/python3 benchmarks/bench_find_element.py [--sizes 10000 30000 100000] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from playwright.async_api import async_playwright
+from agent.tools import FIND_ELEMENT_JS, REF_REGISTRY_JS
+from bench_extraction import BUILD_DOM_JS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "find_element")
+
+# find_element as it was before the index: scans every candidate and scores substrings
+LEGACY_FIND_ELEMENT_JS = r"""(desc) => {
+""" + REF_REGISTRY_JS + r"""
+    const query = desc.toLowerCase().trim();
+    const words = query.split(' ').filter(w => w.length > 2);
+    const candidates = [];
+
+
+    document.querySelectorAll('a, button, div, span, [role="button"], [role="link"], [role="checkbox"], [data-tooltip], [aria-label], [title], [id^=":"]')
+    .forEach(el => {
+        if (!el.offsetParent && el.tagName !== 'INPUT') return;
+
+        const texts = [
+            el.innerText,
+            el.textContent,
+            el.getAttribute('aria-label'),
+            el.getAttribute('title'),
+            el.getAttribute('data-tooltip'),
+            el.getAttribute('alt'),
+            el.getAttribute('placeholder'),
+            el.id
+        ].filter(Boolean).map(t => t?.toLowerCase().trim()).filter(Boolean);
+
+        let bestScore = 0;
+        let bestText = '';
+
+        for (let text of texts) {
+            if (!text) continue;
+
+            let score = 0;
+
+            // Полное совпадение
+            if (text === query) score += 100;
+
+            // Все слова из запроса есть
+            const matched = words.filter(w => text.includes(w)).length;
+            if (matched === words.length && words.length >= 2) score += 50;
+
+            // Частичное совпадение
+            for (let word of words) {
+                if (text.includes(word)) score += 15;
+            }
+
+            // Бонус за короткий текст
+            if (text.length < 60) score += 10;
+
+            if (score > bestScore) {
+                bestScore = score;
+                bestText = text;
+            }
+        }
+
+        if (bestScore >= 30) {
+            let selector = '';
+
+            if (el.getAttribute('data-testid')) {
+                selector = `[data-testid="${el.getAttribute('data-testid')}"]`;
+            } else if (el.id) {
+                selector = `#${el.id.replace(/:/g, '\:')}`;  // Экранируем : для CSS
+            } else if (el.getAttribute('aria-label')) {
+                selector = `[aria-label*="${el.getAttribute('aria-label')}"]`;
+            }
+
+            candidates.push({
+                score: bestScore,
+                selector: selector,
+                text: bestText,
+                el: el
+            });
+        }
+    });
+
+    if (candidates.length === 0) return null;
+
+    candidates.sort((a, b) => b.score - a.score);
+    const best = candidates[0];
+    return {ref: refFor(best.el), selector: best.selector, text: best.text, score: best.score};
+}
+"""
+
+QUERIES = ["add product 500 to cart", "open product 1234", "search products", "section 7"]
+
+# Wrappers normalize both scripts to "(query) -> {ms, ref}" with in-page timing
+TIME_NEW_JS = "([src, query]) => { const f = eval(src); const t = performance.now(); " \
+    "const r = f({query: query, k: 3}); return {ms: performance.now() - t, ref: r.results.length ? r.results[0].ref : null}; }"
+TIME_LEGACY_JS = "([src, query]) => { const f = eval(src); const t = performance.now(); " \
+    "const r = f(query); return {ms: performance.now() - t, ref: r ? r.ref : null}; }"
+IS_EXPECTED_JS = "([ref, expected]) => { const entry = ref && window.__agentRefs.byRef.get(ref); " \
+    "return !!entry && entry.deref() === document.querySelector(expected); }"
+
+
+async def bench_speed(page, sizes: list[int], runs: int) -> None:
+    print(f"{'elements':>9}  {'script':<18} {'median ms':>10} {'min ms':>8}")
+    for size in sizes:
+        elements = await page.evaluate(BUILD_DOM_JS, size)
+        rows = {"legacy": [], "indexed (build)": [], "indexed (cached)": []}
+        for _ in range(runs):
+            for query in QUERIES:
+                rows["legacy"].append((await page.evaluate(TIME_LEGACY_JS, [LEGACY_FIND_ELEMENT_JS, query]))["ms"])
+                await page.evaluate("() => { if (window.__agentIndex) window.__agentIndex.dirty = true; }")
+                rows["indexed (build)"].append((await page.evaluate(TIME_NEW_JS, [FIND_ELEMENT_JS, query]))["ms"])
+                rows["indexed (cached)"].append((await page.evaluate(TIME_NEW_JS, [FIND_ELEMENT_JS, query]))["ms"])
+        for name, timings in rows.items():
+            print(f"{elements:>9}  {name:<18} {statistics.median(timings):>10.1f} {min(timings):>8.1f}")
+
+
+async def bench_accuracy(page) -> None:
+    with open(os.path.join(FIXTURES_DIR, "cases.json"), encoding="utf-8") as f:
+        cases = json.load(f)
+
+    hits = {"legacy": 0, "indexed": 0}
+    print(f"\n{'legacy':<7}{'indexed':<8} case")
+    for case in cases:
+        with open(os.path.join(FIXTURES_DIR, case["fixture"]), encoding="utf-8") as f:
+            await page.set_content(f.read())
+        legacy = await page.evaluate(TIME_LEGACY_JS, [LEGACY_FIND_ELEMENT_JS, case["description"]])
+        indexed = await page.evaluate(TIME_NEW_JS, [FIND_ELEMENT_JS, case["description"]])
+        legacy_ok = await page.evaluate(IS_EXPECTED_JS, [legacy["ref"], case["expected"]])
+        indexed_ok = await page.evaluate(IS_EXPECTED_JS, [indexed["ref"], case["expected"]])
+        hits["legacy"] += legacy_ok
+        hits["indexed"] += indexed_ok
+        print(f"{'ok' if legacy_ok else '-':<7}{'ok' if indexed_ok else '-':<8} {case['fixture']}: {case['description']}")
+
+    print(f"\nTop-1 accuracy: legacy {hits['legacy']}/{len(cases)}, indexed {hits['indexed']}/{len(cases)}")
+
+
+async def main_async(sizes: list[int], runs: int) -> None:
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.goto("about:blank")
+        await bench_speed(page, sizes, runs)
+        await bench_accuracy(page)
+        await browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark find_element scripts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.sizes, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,130 @@
 import os
-from anthropic import Anthropic
 
-# API Configuration - MUST be set via environment variable
+# API Configuration - set via environment variable. Checked when the client is
+# first used (agent/llm.py), so replaying a cassette needs no key.
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if not ANTHROPIC_API_KEY:
-    raise ValueError("ANTHROPIC_API_KEY environment variable is required")
 
-client = Anthropic(api_key=ANTHROPIC_API_KEY)
+# Model client mode: "live", "record" (live + save every request/response to
+# the cassette) or "replay" (serve responses from the cassette, no network)
+LLM_MODE = os.getenv("AGENT_LLM_MODE", "live")
+CASSETTE_PATH = os.getenv("AGENT_CASSETTE", os.path.join(os.path.dirname(__file__), "cassettes", "default.jsonl"))
 
-# Using Haiku - fast and cost-effective for browser automation
+# Strong model: planning, recovery from failures, screenshots and final answers
 MODEL = "claude-sonnet-4-5-20250929"
 
+# Model routing: routine steps go to FAST_MODEL, steps matching one of
+# ROUTING_ESCALATE_ON go to MODEL (see agent/routing.py):
+#   "first" - first step, "failure" - a tool call failed, "screenshot" - a
+#   screenshot to analyze, "repeat" - a page-changing action was repeated,
+#   "final" - a final answer from FAST_MODEL is re-asked to MODEL
+# MODEL_ROUTING = False sends every step to MODEL.
+MODEL_ROUTING = True
+FAST_MODEL = "claude-haiku-4-5-20251001"
+ROUTING_ESCALATE_ON = {"first", "failure", "screenshot", "repeat", "final"}
+ROUTING_REPEAT_WINDOW = 6  # recent page-changing actions checked for "repeat"
+
+# Telemetry: per-step spans (model latency, tokens, tool timings) appended to a JSONL trace
+TELEMETRY = True
+TRACE_PATH = os.path.join(os.path.dirname(__file__), "trace.jsonl")
+
+# USD per million tokens, for cost in traces and run summaries
+MODEL_PRICING = {
+    "claude-sonnet-4-5-20250929": {"input": 3.00, "output": 15.00, "cache_read": 0.30, "cache_write": 3.75},
+    "claude-haiku-4-5-20251001": {"input": 1.00, "output": 5.00, "cache_read": 0.10, "cache_write": 1.25},
+}
+
+# Prompt caching: cache breakpoints on tools/system and the rolling history prefix
+PROMPT_CACHING = True
+
+# History compaction: keep each request under this many (estimated) tokens.
+# Old screenshots/page dumps are stubbed first, then the oldest steps are dropped.
+HISTORY_TOKEN_BUDGET = 60000
+HISTORY_KEEP_RECENT = 6  # newest messages that are never compacted
+
 # Browser configuration
 BROWSER_WIDTH = 1400
 BROWSER_HEIGHT = 700
 SLOW_MO = 300  # milliseconds delay for visibility
+START_URL = "https://google.com"
+
+# Concurrency: tasks share one Chromium, each in its own browser context
+MAX_CONCURRENT_TASKS = 4
+
+# Settling after click/goto_url/press_key: done once a new document loads, a new tab opens,
+# or once network and DOM have been quiet for SETTLE_QUIET_MS; never longer
+# than SETTLE_TIMEOUT_MS
+SETTLE_QUIET_MS = 200
+SETTLE_TIMEOUT_MS = 3000
+
+# Text input: "fill" sets the value instantly, "human" types key by key with a
+# random delay. Sites listed in HUMAN_INPUT_DOMAINS (e.g. ones that drop filled
+# values or flag instant input) always get humanized typing.
+INPUT_MODE = "fill"
+HUMAN_INPUT_DOMAINS = []
+HUMAN_TYPING_DELAY_MS = (30, 120)  # per-key delay range
+
+# get_page_content: the extraction collects up to PAGE_EXTRACT_LIMITS items per
+# section; when they don't fit PAGE_CONTENT_TOKEN_BUDGET (kept under the
+# supervisor's per-result cut), the items most relevant to the task and the
+# inputs of the last RELEVANCE_RECENT_INPUTS tool calls are kept
+PAGE_EXTRACT_LIMITS = {"headings": 100, "interactive": 6000, "blocks": 3000, "text": 1500}
+PAGE_CONTENT_TOKEN_BUDGET = 1700
+RELEVANCE_RECENT_INPUTS = 4
+
+# The full extraction is kept per tab (agent/page_store.py) for search_page and
+# get_page_section; a section read returns at most PAGE_SECTION_TOKEN_BUDGET.
+# The outline of sections in get_page_content takes at most
+# PAGE_OUTLINE_TOKEN_SHARE of PAGE_CONTENT_TOKEN_BUDGET, the rest goes to items
+PAGE_SECTION_TOKEN_BUDGET = 1700
+SEARCH_PAGE_RESULTS = 20
+PAGE_OUTLINE_TOKEN_SHARE = 0.25
+
+# Lazy-load scrolling in get_page_content: a round ends once the page has been
+# quiet (no new nodes/requests) for SCROLL_QUIET_MS, at most SCROLL_MAX_WAIT_MS
+SCROLL_MAX_ROUNDS = 8
+SCROLL_QUIET_MS = 150
+SCROLL_MAX_WAIT_MS = 1500
+
+# Text-mode resource policy: requests to these domains and for files of these
+# types (by extension, see agent/resources.py) are blocked in Chromium via CDP
+# (take_screenshot lets images through while it captures). Saved bytes in the
+# step log are estimated from typical sizes per blocked kind.
+RESOURCE_BLOCKING = True
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_DOMAINS = [
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+    "googletagmanager.com", "adservice.google.com", "connect.facebook.net", "analytics.twitter.com",
+    "ads-twitter.com", "mc.yandex.ru", "top-fwz1.mail.ru", "hotjar.com", "segment.io", "mixpanel.com",
+    "amplitude.com", "scorecardresearch.com", "criteo.com", "taboola.com", "outbrain.com", "adnxs.com",
+]
+BLOCKED_SIZE_ESTIMATES = {"image": 40_000, "media": 500_000, "font": 35_000, "tracker": 20_000}
+
+# Screenshots: encoding, downscaling (width in px; None keeps the viewport size)
+# and dedup. WebP, downscaling and perceptual dedup need Pillow; without it
+# shots are JPEG/PNG straight from Chromium and only exact repeats are caught.
+SCREENSHOT_FORMAT = "jpeg"  # "png", "jpeg" or "webp"
+SCREENSHOT_QUALITY = 60     # jpeg/webp quality, 1-100
+SCREENSHOT_MAX_WIDTH = 1024
+SCREENSHOT_DEDUP_DISTANCE = 4  # max differing bits of the 64-bit dHash to count as identical
 
 # Session persistence
 USER_DATA_DIR = os.path.join(os.path.dirname(__file__), ".browser_session")
 
+# Warm context pool (engine / batch.py): contexts are seeded from this snapshot
+# of the profile's cookies + localStorage. main.py and login_helper.py merge into
+# it on exit; a snapshot taken from the profile alone holds cookies only
+STORAGE_STATE_PATH = os.path.join(os.path.dirname(__file__), ".storage_state.json")
+
+# find_element selector cache (per domain + page structure), stored next to the session
+SELECTOR_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".selector_cache.json")
+SELECTOR_CACHE_MAX_ENTRIES = 2000
+SELECTOR_CACHE_MAX_AGE_DAYS = 30  # entries unused for this long are dropped
+
+# Trajectory replay: successful runs are recorded per task template and later
+# runs replay the recorded actions while the page still matches
+TRAJECTORY_REPLAY = True
+TRAJECTORY_DIR = os.path.join(os.path.dirname(__file__), ".trajectories")
+
 # Security keywords that trigger human confirmation
 DESTRUCTIVE_KEYWORDS = [
     "delete", "remove", "buy", "purchase", "pay", "order", "checkout",
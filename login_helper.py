@@ -11,7 +11,8 @@ Usage:
 """
 
 from playwright.sync_api import sync_playwright
-from config import BROWSER_WIDTH, BROWSER_HEIGHT, SLOW_MO, USER_DATA_DIR
+from config import BROWSER_WIDTH, BROWSER_HEIGHT, SLOW_MO, USER_DATA_DIR, STORAGE_STATE_PATH
+from agent.pool import save_storage_state
 from rich import print as rprint
 import os
 
@@ -84,6 +85,10 @@ def main():
             cookies = browser.cookies()
             rprint(f"[dim]Saved {len(cookies)} cookies[/dim]")
 
+            # Merge into the snapshot for the warm context pool used by batch runs
+            save_storage_state(browser.storage_state(), STORAGE_STATE_PATH)
+            rprint(f"[dim]Storage state snapshot: {STORAGE_STATE_PATH}[/dim]")
+
         except Exception as e:
             rprint(f"[yellow]Note: {str(e)}[/yellow]")
 
@@ -1,11 +1,16 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 from agent.supervisor import run_agent
 from agent import tools
-from config import BROWSER_WIDTH, BROWSER_HEIGHT, SLOW_MO, USER_DATA_DIR
+from agent.engine import LAUNCH_ARGS
+from agent.selector_cache import selector_cache
+from agent.resources import ResourcePolicy
+from agent.pool import save_storage_state
+from config import BROWSER_WIDTH, BROWSER_HEIGHT, SLOW_MO, USER_DATA_DIR, START_URL, RESOURCE_BLOCKING, STORAGE_STATE_PATH
 from rich import print as rprint
+import asyncio
 import os
 
-def main():
+async def main():
     # Get task from user
     rprint("[bold cyan]╔══════════════════════════════════════════════════╗[/bold cyan]")
     rprint("[bold cyan]║   🤖 Autonomous Browser Agent by Claude AI      ║[/bold cyan]")
@@ -17,7 +22,7 @@ def main():
         rprint(f"[yellow]Using default task: {task}[/yellow]\n")
 
     # Launch browser with persistent session
-    with sync_playwright() as pw:
+    async with async_playwright() as pw:
         # Create user data directory if it doesn't exist
         os.makedirs(USER_DATA_DIR, exist_ok=True)
 
@@ -25,27 +30,31 @@ def main():
         rprint("[dim]🔄 Using persistent session (cookies, login state preserved)[/dim]\n")
 
         # Launch browser with persistent context
-        browser = pw.chromium.launch_persistent_context(
+        await tools.register_selector_engines(pw)
+        browser = await pw.chromium.launch_persistent_context(
             user_data_dir=USER_DATA_DIR,
             headless=False,
             slow_mo=SLOW_MO,
             viewport={"width": BROWSER_WIDTH, "height": BROWSER_HEIGHT},
-            args=[
-                "--disable-blink-features=AutomationControlled",  # Avoid detection
-            ]
+            args=LAUNCH_ARGS,
         )
 
+        # Text mode: block images, media, fonts and trackers (screenshots re-enable images)
+        resources = await ResourcePolicy.install(browser) if RESOURCE_BLOCKING else None
+
         # Get or create the first page
         if len(browser.pages) > 0:
             page = browser.pages[0]
         else:
-            page = browser.new_page()
+            page = await browser.new_page()
+        if resources:
+            await resources.attach(page)
 
-        # Initialize global page reference
-        tools.page = page
+        # Bind the page to this task's tool state
+        tools.bind_page(page, resources=resources)
 
         # Navigate to starting page
-        page.goto("https://google.com")
+        await page.goto(START_URL)
 
         rprint("[bold green]✓ Browser opened (persistent session)[/bold green]")
         rprint("[bold green]✓ Agent starting...[/bold green]\n")
@@ -53,20 +62,27 @@ def main():
 
         # Run the agent
         try:
-            result = run_agent(task)
+            result = await run_agent(task)
 
             rprint("\n[dim]" + "─" * 60 + "[/dim]")
             rprint("\n[bold magenta]✓ Task completed![/bold magenta]")
             if result:
                 rprint(f"\n[bold white]📊 Result:[/bold white]\n{result}")
-        except KeyboardInterrupt:
+            rprint(f"[dim]{selector_cache.summary()}[/dim]")
+        except (KeyboardInterrupt, asyncio.CancelledError):
             rprint("\n[bold red]⚠️  Interrupted by user[/bold red]")
         except Exception as e:
             rprint(f"\n[bold red]❌ Error: {str(e)}[/bold red]")
 
         # Keep browser open for inspection
         input("\n[bold cyan]Press Enter to close browser...[/bold cyan]")
-        browser.close()
+
+        # Merge cookies + localStorage of the open sites into the warm pool's snapshot (batch runs)
+        try:
+            save_storage_state(await browser.storage_state(), STORAGE_STATE_PATH)
+        except Exception:
+            pass
+        await browser.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for click()'s destructive-action guard (agent/tools.py)
+"""
+
+import asyncio
+from agent import tools
+
+
+class FakeLocator:
+    """Just enough of a Playwright locator for the guard: the element's label; the click itself stops early."""
+
+    def __init__(self, label):
+        self.label = label
+        self.first = self
+        self.reached_click = False
+
+    async def evaluate(self, script, timeout=None):
+        return self.label
+
+    async def scroll_into_view_if_needed(self, timeout=None):
+        self.reached_click = True
+        raise RuntimeError("no browser in tests")
+
+
+class FakePage:
+    def __init__(self, label):
+        self.element = FakeLocator(label)
+        self.url = "http://shop.test/cart"
+        self.context = self
+        self.pages = [self]
+
+    def locator(self, selector):
+        return self.element
+
+
+def click_unattended(selector, label):
+    """click() in an unattended run; returns (result, whether it got past the guard)."""
+    page = FakePage(label)
+
+    async def run():
+        tools.bind_page(page, interactive=False)
+        return await tools.click(selector)
+    return asyncio.run(run()), page.element.reached_click
+
+
+def test_replayed_selector_on_destructive_button_is_refused():
+    """A recorded ref replays as a DOM selector; the button's own text still triggers the guard"""
+    result, reached_click = click_unattended("css=body > main > form > button:nth-of-type(2)", "Pay now")
+    assert result.startswith("Отменено")
+    assert not reached_click
+
+
+def test_harmless_button_is_clicked():
+    result, reached_click = click_unattended("css=body > main > form > button:nth-of-type(1)", "Show details")
+    assert not result.startswith("Отменено")
+    assert reached_click
+
+
+def test_destructive_selector_text_still_counts():
+    result, reached_click = click_unattended("text=Delete", "")
+    assert result.startswith("Отменено")
+    assert not reached_click
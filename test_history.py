@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted history compaction (agent/history.py)
+"""
+
+import pytest
+from agent.history import compact_history, history_tokens, TRIM_NOTE
+from config import HISTORY_KEEP_RECENT
+
+PAGE_DUMP = "URL: http://shop.test/\nTITLE: Shop\n---\n" + "[e12] <a> Some product link\n" * 300
+
+
+def make_history(turns):
+    """The task plus `turns` steps: page reads, screenshots and clicks, as the supervisor builds them."""
+    messages = [{"role": "user", "content": "TASK: find the cheapest kettle\n\nBegin now."}]
+    for n in range(turns):
+        tool_id = f"toolu_{n}"
+        if n % 3 == 0:
+            call, result = ("get_page_content", {}), PAGE_DUMP
+        elif n % 3 == 1:
+            call, result = ("take_screenshot", {}), [
+                {"type": "text", "text": "Screenshot taken and analyzed visually."},
+                {"type": "image", "source": {"type": "base64", "media_type": "image/webp", "data": "A" * 4000}},
+            ]
+        else:
+            call, result = ("click", {"selector": f"e{n}"}), f"✅ Клик успешен: e{n} (страница не изменилась)"
+        messages.append({"role": "assistant", "content": [
+            {"type": "text", "text": f"Step {n}"},
+            {"type": "tool_use", "id": tool_id, "name": call[0], "input": call[1]},
+        ]})
+        messages.append({"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": tool_id, "content": result},
+        ]})
+    return messages
+
+
+def assert_valid_for_the_api(messages):
+    """Roles alternate from the task on, and each tool_result message answers exactly the tool_use before it."""
+    roles = [message["role"] for message in messages]
+    assert roles[0] == "user"
+    assert all(a != b for a, b in zip(roles, roles[1:])), f"roles don't alternate: {roles}"
+    for previous, message in zip(messages, messages[1:]):
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        result_ids = {block["tool_use_id"] for block in message["content"] if block.get("type") == "tool_result"}
+        use_ids = {block["id"] for block in previous["content"] if block.get("type") == "tool_use"}
+        assert result_ids == use_ids, f"tool_use/tool_result pairs split: {result_ids ^ use_ids}"
+
+
+@pytest.mark.parametrize("keep_recent", [HISTORY_KEEP_RECENT, 5, 2])
+def test_compaction_keeps_the_api_contract(keep_recent):
+    """Over budget even after stubbing: old turns are dropped, and the result is still a valid request"""
+    messages = make_history(30)
+    budget = history_tokens(messages[-keep_recent:]) + 600  # more than stubs can save
+    original_recent = [dict(message) for message in messages[-keep_recent:]]
+
+    compacted, report = compact_history(messages, budget, keep_recent=keep_recent)
+
+    assert "dropped" in report
+    assert history_tokens(compacted) <= budget
+    assert_valid_for_the_api(compacted)
+    assert compacted[-keep_recent:] == original_recent
+    assert any(block.get("text") == TRIM_NOTE for block in compacted[0]["content"])
+
+
+def test_stubbing_alone_keeps_every_step():
+    """A budget that stubbing old page dumps and screenshots meets drops no turn"""
+    messages = make_history(9)
+    budget = int(history_tokens(messages) * 0.6)
+
+    compacted, report = compact_history(messages, budget, keep_recent=HISTORY_KEEP_RECENT)
+
+    assert "stubbed" in report and "dropped" not in report
+    assert len(compacted) == len(messages)
+    assert_valid_for_the_api(compacted)
+    assert compacted[-HISTORY_KEEP_RECENT:] == messages[-HISTORY_KEEP_RECENT:]
+
+
+def test_under_budget_is_untouched():
+    messages = make_history(3)
+    compacted, report = compact_history(messages, history_tokens(messages) + 1)
+    assert compacted is messages
+    assert report == ""
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for cassette request keys and recording (agent/llm.py)
+"""
+
+import asyncio
+import json
+from agent import tools
+from agent.llm import request_keys, RecordingClient
+from agent.tools import REDACTED
+
+
+def make_request(task, tool_result="Clicked (settled in 120 ms: quiet)"):
+    """A second-step request: the task, one tool call and its result."""
+    return {
+        "model": "claude-sonnet-4-5",
+        "system": [{"type": "text", "text": "You are a browser agent.", "cache_control": {"type": "ephemeral"}}],
+        "tools": [],
+        "max_tokens": 4096,
+        "messages": [
+            {"role": "user", "content": task},
+            {"role": "assistant", "content": [
+                {"type": "tool_use", "id": "toolu_1", "name": "click", "input": {"selector": "e12"}},
+            ]},
+            {"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": "toolu_1", "content": tool_result},
+            ]},
+        ],
+    }
+
+
+def test_task_numbers_give_different_keys():
+    exact_a, loose_a = request_keys(make_request("open order 1234"))
+    exact_b, loose_b = request_keys(make_request("open order 5678"))
+    assert exact_a != exact_b
+    assert loose_a != loose_b
+
+
+def test_tool_input_numbers_give_different_keys():
+    request = make_request("open the order")
+    other = make_request("open the order")
+    other["messages"][1]["content"][0]["input"] = {"selector": "e13"}
+    assert request_keys(request)[0] != request_keys(other)[0]
+
+
+def test_volatile_tool_result_numbers_give_the_same_key():
+    fast = make_request("open order 1234", "Clicked (settled in 120 ms: quiet)\n[e12] <a> Next page (2 of 40)")
+    slow = make_request("open order 1234", "Clicked (settled in 945 ms: quiet)\n[e31] <a> Next page (2 of 41)")
+    assert request_keys(fast) == request_keys(slow)
+
+
+def test_cache_breakpoints_are_ignored():
+    request = make_request("open order 1234")
+    moved = make_request("open order 1234")
+    moved["system"][0].pop("cache_control")
+    moved["messages"][2]["content"][0]["cache_control"] = {"type": "ephemeral"}
+    assert request_keys(request) == request_keys(moved)
+
+
+class FakeField:
+    def __init__(self, secret):
+        self.secret = secret
+        self.first = self
+
+    async def evaluate(self, script, timeout=None):
+        return self.secret
+
+
+class FakePage:
+    """Only #password is a password field."""
+
+    def locator(self, selector):
+        return FakeField(selector == "#password")
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def model_dump(self, mode=None):
+        return json.loads(json.dumps(self.data))
+
+
+class FakeInner:
+    """Stand-in for AsyncAnthropic returning scripted responses."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.messages = self
+
+    async def create(self, **request):
+        return FakeResponse(self.responses.pop(0))
+
+
+def test_recording_redacts_typed_passwords(tmp_path):
+    fill = {"type": "tool_use", "id": "toolu_1", "name": "fill_form", "input": {"fields": [
+        {"selector": "#login", "value": "ada"}, {"selector": "#password", "value": "hunter2-secret"},
+    ]}}
+    responses = [
+        {"content": [fill], "stop_reason": "tool_use"},
+        {"content": [{"type": "text", "text": "Logged in."}], "stop_reason": "end_turn"},
+    ]
+    path = tmp_path / "cassette.jsonl"
+
+    async def run():
+        state = tools.bind_page(FakePage(), interactive=False)
+        client = RecordingClient(FakeInner(responses), str(path))
+        messages = [{"role": "user", "content": "log in as ada"}]
+        await client.messages.create(model="m", messages=messages)
+        state.secrets.add("hunter2-secret")  # what fill_form registers when it types into #password
+        messages += [
+            {"role": "assistant", "content": [fill]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1",
+                                          "content": "✅ #password: 'hunter2-secret'"}]},
+        ]
+        await client.messages.create(model="m", messages=messages)
+    asyncio.run(run())
+
+    cassette = path.read_text(encoding="utf-8")
+    assert "hunter2-secret" not in cassette
+    assert "ada" in cassette  # only secret fields are redacted
+    first, second = [json.loads(line) for line in cassette.splitlines()]
+    assert first["response"]["content"][0]["input"]["fields"][1]["value"] == REDACTED
+    # the recorded history matches what replaying the redacted response produces
+    replayed_fill = second["request"]["messages"][1]["content"][0]
+    assert replayed_fill == first["response"]["content"][0]
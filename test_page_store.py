@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the page store outline (agent/page_store.py)
+"""
+
+from agent.history import estimate_tokens
+from agent.page_store import PageStore, OUTLINE_MAX_SECTIONS
+
+
+def make_snapshot(titles, blocks_per_section=2):
+    """Snapshot shaped like EXTRACT_PAGE_JS output: blocks spread under the given headings."""
+    sections = [[0, "(top of page)"]] + titles
+    blocks, places = [], []
+    for section_index in range(1, len(sections)):
+        for i in range(blocks_per_section):
+            blocks.append(f"{sections[section_index][1]}, paragraph {i}")
+            places.append([section_index, len(places)])
+    return {"url": "http://example.test/", "title": "Example", "blocks": blocks,
+            "sections": sections, "places": {"blocks": places}}
+
+
+def test_many_h2_sections_keep_their_level():
+    """A page with more h2s than OUTLINE_MAX_SECTIONS is outlined by h2, not collapsed into one section"""
+    count = OUTLINE_MAX_SECTIONS + 20
+    store = PageStore(make_snapshot([[2, f"Chapter {n}"] for n in range(count)]), step=1)
+
+    assert len(store.sections) == count
+    assert store.sections["s1"].title == "Chapter 0"
+    assert store.item_count == count * 2
+
+    outline = store.outline()
+    assert len(outline.splitlines()) == OUTLINE_MAX_SECTIONS + 1
+    assert "20 more sections" in outline
+
+
+def test_top_of_page_does_not_count_toward_the_limit():
+    """Exactly OUTLINE_MAX_SECTIONS h3s plus text above them still use the h3 level"""
+    titles = [[2, "Results"]] + [[3, f"Card {n}"] for n in range(OUTLINE_MAX_SECTIONS - 1)]
+    snapshot = make_snapshot(titles)
+    snapshot["blocks"].insert(0, "Intro text above every heading")
+    snapshot["places"]["blocks"].insert(0, [0, -1])
+    store = PageStore(snapshot, step=1)
+
+    assert len(store.sections) == OUTLINE_MAX_SECTIONS + 1
+    assert store.sections["s1"].title == "(top of page)"
+    assert store.sections["s3"].title == "Card 0"
+
+
+def test_cards_with_own_h3_fold_into_h2_sections():
+    """Too many h3s but few h2s: h3 items belong to their h2 section"""
+    titles = []
+    for group in range(3):
+        titles.append([2, f"Group {group}"])
+        titles += [[3, f"Card {group}.{n}"] for n in range(30)]
+    store = PageStore(make_snapshot(titles), step=1)
+
+    assert [section.title for section in store.sections.values()] == ["Group 0", "Group 1", "Group 2"]
+    assert len(store.sections["s2"].items) == 31 * 2
+
+
+def test_outline_stays_within_its_token_budget():
+    """Long titles and many sections: the outline stops at the budget and says how many are left"""
+    titles = [[2, f"Chapter {n}: " + "a very long heading text " * 10] for n in range(OUTLINE_MAX_SECTIONS)]
+    store = PageStore(make_snapshot(titles), step=1)
+
+    outline = store.outline(budget_tokens=300)
+    assert estimate_tokens(outline) <= 300 + 50
+    assert outline.splitlines()[-1].startswith("... ")
+    assert all(len(line) < 250 for line in outline.splitlines())
+
+
+def test_truncated_extraction_is_reported():
+    """Sections cut by the extraction cap are named; headings aren't stored, so they aren't"""
+    snapshot = make_snapshot([[2, "Orders"]])
+    assert PageStore(snapshot, step=1).truncation_note() == ""
+
+    snapshot["truncated"] = {"headings": 100, "interactive": 10000}
+    note = PageStore(snapshot, step=1).truncation_note()
+    assert "extraction truncated at 10000 controls" in note
+    assert "headings" not in note
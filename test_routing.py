@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for tiered model routing (agent/routing.py)
+"""
+
+from types import SimpleNamespace
+from agent.routing import ModelRouter
+
+
+def make_router():
+    return ModelRouter(fast="fast", strong="strong", escalate_on={"first", "failure", "repeat"}, enabled=True)
+
+
+def step(router, name, tool_input, result="ok", url="http://shop.test/"):
+    """One step with a single tool call; returns (model, reason) chosen for the next step."""
+    router.observe([SimpleNamespace(name=name, input=tool_input)], [result], url)
+    return router.choose()
+
+
+def test_reading_after_each_action_stays_on_the_fast_model():
+    """goto → read → click → read → click → read: re-reading the page is not being stuck"""
+    router = make_router()
+    assert router.choose() == ("strong", "first")
+    assert step(router, "goto_url", {"url": "http://shop.test/"}) == ("fast", "")
+    assert step(router, "get_page_content", {}) == ("fast", "")
+    assert step(router, "click", {"selector": "e12"}, url="http://shop.test/p/1") == ("fast", "")
+    assert step(router, "get_page_content", {}, url="http://shop.test/p/1") == ("fast", "")
+    assert step(router, "click", {"selector": "e40"}, url="http://shop.test/p/2") == ("fast", "")
+    assert step(router, "get_page_content", {}, url="http://shop.test/p/2") == ("fast", "")
+    assert step(router, "search_page", {"query": "price"}, url="http://shop.test/p/2") == ("fast", "")
+
+
+def test_scroll_and_keys_repeat_only_on_the_same_page():
+    router = make_router()
+    assert step(router, "scroll", {"direction": "down"}, url="http://shop.test/a") == ("fast", "")
+    assert step(router, "press_key", {"key": "Enter"}, url="http://shop.test/a") == ("fast", "")
+    assert step(router, "scroll", {"direction": "down"}, url="http://shop.test/b") == ("fast", "")
+    assert step(router, "press_key", {"key": "Enter"}, url="http://shop.test/b") == ("fast", "")
+    assert step(router, "scroll", {"direction": "down"}, url="http://shop.test/b") == ("strong", "repeat")
+
+
+def test_repeated_click_escalates():
+    router = make_router()
+    step(router, "click", {"selector": "#next"})
+    assert step(router, "click", {"selector": "#next"}) == ("strong", "repeat")
+
+
+def test_failure_escalates():
+    router = make_router()
+    assert step(router, "click", {"selector": "#buy"}, result="Error: element not found") == ("strong", "failure")
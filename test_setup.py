@@ -13,7 +13,7 @@ def test_imports():
 
     required = [
         ("anthropic", "Anthropic"),
-        ("playwright.sync_api", "sync_playwright"),
+        ("playwright.async_api", "async_playwright"),
         ("bs4", "BeautifulSoup"),
         ("rich", "print as rprint"),
     ]
@@ -72,6 +72,7 @@ def test_file_structure():
         "main.py",
         "agent/supervisor.py",
         "agent/tools.py",
+        "agent/engine.py",
         "requirements.txt",
     ]
 
@@ -91,9 +92,6 @@ def test_config():
     print("\n⚙️  Testing configuration...")
 
     try:
-        # Temporarily disable API key requirement for this test
-        os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
-
         sys.path.insert(0, os.path.dirname(__file__))
         from config import MODEL, BROWSER_WIDTH, BROWSER_HEIGHT
 